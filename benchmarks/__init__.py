@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""
+Bancs d'essai de l'application Mobile Money (exécutés hors appareil)
+"""
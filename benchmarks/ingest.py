@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Banc d'essai du serveur central (server.py)
+
+Lance le serveur dans un sous-processus sur une base vide, puis simule
+de nombreux appareils qui envoient leurs lots en parallèle, comme
+sync.SyncClient. Une part des envois est répétée (acquittement perdu)
+pour vérifier la déduplication sous charge.
+
+    python -m benchmarks.ingest --devices 500 --uploads 4000 --rows 50
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.ledger import iter_transactions, agent_names
+from benchmarks.startup import percentile
+from server import device_token
+from sync import COLUMNS
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER = os.path.join(ROOT, 'server.py')
+SECRET = 'banc-ingest'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def request(url, payload=None, token=None):
+    data = None
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    if payload is not None:
+        data = gzip.compress(json.dumps(payload, separators=(',', ':')).encode())
+        headers.update({'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+    req = urllib.request.Request(url, data=data, headers=headers)
+    with urllib.request.urlopen(req, timeout=60) as response:
+        return json.loads(response.read())
+
+
+def wait_ready(url, timeout=15):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return request(url + '/api/health')
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def build_uploads(devices, uploads, rows, resend, seed):
+    """Lots (device_id, rows) ; chaque appareil numérote ses lignes à partir de 1"""
+    rng = random.Random(seed)
+    agents = agent_names(devices)
+    source = iter_transactions(uploads * rows, agents, days=30, seed=seed)
+    next_seq = {}
+    batches = []
+    for _ in range(uploads):
+        device = f'device{rng.randrange(devices):05d}'
+        agent = agents[int(device[6:])]
+        start = next_seq.get(device, 1)
+        chunk = []
+        for seq in range(start, start + rows):
+            _, operator, trans_type, amount, timestamp = next(source)
+            chunk.append((seq, timestamp, agent, operator, trans_type, amount))
+        next_seq[device] = start + rows
+        batches.append((device, chunk))
+    # Renvois : mêmes lots, à dédupliquer
+    batches += rng.sample(batches, int(len(batches) * resend))
+    rng.shuffle(batches)
+    return batches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--devices', type=int, default=500)
+    parser.add_argument('--uploads', type=int, default=4000)
+    parser.add_argument('--rows', type=int, default=50, help='Lignes par envoi')
+    parser.add_argument('--clients', type=int, default=32, help='Envois simultanés')
+    parser.add_argument('--resend', type=float, default=0.05,
+                        help='Part des envois répétés (0-1)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='Fichier de résultats')
+    args = parser.parse_args(argv)
+
+    batches = build_uploads(args.devices, args.uploads, args.rows, args.resend, args.seed)
+    port = free_port()
+    url = f'http://127.0.0.1:{port}'
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server = subprocess.Popen(
+            [sys.executable, SERVER, '--db', os.path.join(workdir, 'central.db'),
+             '--port', str(port)],
+            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            env=dict(os.environ, MM_SERVER_SECRET=SECRET)
+        )
+        try:
+            wait_ready(url)
+
+            def upload(batch):
+                device, rows = batch
+                started = time.perf_counter()
+                result = request(url + '/sync/transactions',
+                                 {'device_id': device, 'columns': COLUMNS, 'rows': rows},
+                                 device_token(SECRET, device))
+                return (time.perf_counter() - started) * 1000, result
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.clients) as pool:
+                results = list(pool.map(upload, batches))
+            elapsed = time.perf_counter() - started
+            health = request(url + '/api/health')
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    samples = [ms for ms, _ in results]
+    accepted = sum(result['accepted'] for _, result in results)
+    duplicates = sum(result['duplicates'] for _, result in results)
+    report = {
+        'uploads': len(batches),
+        'rows_per_upload': args.rows,
+        'clients': args.clients,
+        'uploads_per_min': len(batches) / elapsed * 60,
+        'rows_per_s': accepted / elapsed,
+        'p50_ms': percentile(samples, 50),
+        'p90_ms': percentile(samples, 90),
+        'p99_ms': percentile(samples, 99),
+        'accepted': accepted,
+        'duplicates': duplicates,
+        'stored': health['rows'],
+    }
+    for key, value in report.items():
+        print(f'{key:<18}{value:>14,.1f}' if isinstance(value, float) else f'{key:<18}{value:>14,}')
+
+    expected = args.uploads * args.rows
+    if accepted != expected or health['rows'] != expected:
+        print(f'ERREUR : {expected:,} lignes attendues', file=sys.stderr)
+        return 1
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
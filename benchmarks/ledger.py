@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Générateur de registres synthétiques (utilisateurs + transactions)
+
+Produit, de façon déterministe (graine fixe), un jeu de données proche
+du terrain : répartition réaliste des opérateurs, plus de dépôts que de
+retraits, montants log-normaux, activité concentrée sur quelques agents
+et sur les heures ouvrables, étalée sur plusieurs mois.
+
+    python -m benchmarks.ledger bench.db --rows 1M --agents 200
+
+Les lignes passent par DatabaseManager.record_transactions : les agrégats
+(agent_balances, period_rollup) sont tenus à jour comme en production.
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from database import DatabaseManager, OPERATORS, TRANSACTION_TYPES, MAX_AMOUNT
+
+# Part de marché approximative de chaque opérateur
+OPERATOR_WEIGHTS = {
+    'Orange Money': 0.42,
+    'Moov Money': 0.24,
+    'Wave': 0.18,
+    'Telecel': 0.11,
+    'TNT': 0.05,
+}
+
+# Part des dépôts (le reste : retraits)
+DEPOSIT_RATIO = 0.56
+
+# Montants log-normaux : médiane ~ 10 000 XOF, longue traîne
+AMOUNT_MEDIAN = 10000
+AMOUNT_SIGMA = 1.3
+AMOUNT_STEP = 25
+
+# Poids de chaque heure de la journée (pic en fin de matinée et en soirée)
+HOUR_WEIGHTS = [
+    1, 1, 1, 1, 1, 2, 4, 8, 12, 14, 15, 14,
+    12, 11, 12, 13, 14, 15, 14, 11, 8, 5, 3, 2,
+]
+
+INSERT_BATCH = 50000
+
+SCALES = {'k': 10 ** 3, 'm': 10 ** 6, 'g': 10 ** 9}
+
+
+def parse_count(value):
+    """'10k' -> 10000, '1M' -> 1000000, '2500' -> 2500"""
+    value = str(value).strip().lower().replace('_', '')
+    if value and value[-1] in SCALES:
+        return int(float(value[:-1]) * SCALES[value[-1]])
+    return int(value)
+
+
+def agent_names(count):
+    return [f'agent{i:04d}' for i in range(1, count + 1)]
+
+
+def iter_transactions(rows, agent_ids, days=180, seed=42, end=None):
+    """Génère rows tuples (agent_id, operator, type, amount, timestamp)
+
+    Les horodatages (epoch UTC) sont croissants, comme une saisie réelle,
+    répartis sur les `days` jours qui précèdent `end` (UTC, maintenant par
+    défaut).
+    """
+    rng = random.Random(seed)
+    end = end or datetime.now(timezone.utc).replace(tzinfo=None)
+    start = (end - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    operators = [op for op in OPERATORS if op in OPERATOR_WEIGHTS]
+    operator_weights = [OPERATOR_WEIGHTS[op] for op in operators]
+    deposit, withdrawal = TRANSACTION_TYPES
+
+    # Loi de Zipf : quelques agents très actifs, beaucoup de petits
+    agent_weights = [1 / (rank + 1) for rank in range(len(agent_ids))]
+
+    choices = rng.choices
+    lognormal = rng.lognormvariate
+    mu = math.log(AMOUNT_MEDIAN)
+    hours = list(range(24))
+
+    origin = int(start.replace(tzinfo=timezone.utc).timestamp())
+    for day in range(days):
+        midnight = origin + day * 86400
+        count = rows * (day + 1) // days - rows * day // days
+        # Tirage groupé par jour : bien plus rapide que ligne à ligne
+        agents = choices(agent_ids, agent_weights, k=count)
+        ops = choices(operators, operator_weights, k=count)
+        hour_draw = sorted(choices(hours, HOUR_WEIGHTS, k=count))
+        for i in range(count):
+            amount = lognormal(mu, AMOUNT_SIGMA)
+            amount = min(MAX_AMOUNT, max(AMOUNT_STEP, round(amount / AMOUNT_STEP) * AMOUNT_STEP))
+            seconds = hour_draw[i] * 3600 + int(rng.random() * 3600)
+            timestamp = midnight + seconds
+            trans_type = deposit if rng.random() < DEPOSIT_RATIO else withdrawal
+            yield (agents[i], ops[i], trans_type, amount, timestamp)
+
+
+def build_ledger(path, rows, agents=50, days=180, seed=42, progress=None):
+    """Crée une base neuve à `path` et la remplit ; retourne les ids d'agents"""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    DatabaseManager.DB_NAME = path
+    DatabaseManager.init_database()
+    # Une seule empreinte pour tous les agents : PBKDF2 coûte ~0,5 s par
+    # appel et ne fait pas partie de ce qui est mesuré
+    hashed = DatabaseManager.hash_password('agent')
+    with DatabaseManager.transaction(write=True) as conn:
+        conn.executemany(
+            "INSERT INTO users (username, password, role) VALUES (?, ?, 'agent')",
+            [(name, hashed) for name in agent_names(agents)]
+        )
+    agent_ids = [agent_id for agent_id, _ in DatabaseManager.get_all_agents()]
+
+    batch = []
+    done = 0
+    for row in iter_transactions(rows, agent_ids, days=days, seed=seed):
+        batch.append(row)
+        if len(batch) >= INSERT_BATCH:
+            done += DatabaseManager.record_transactions(batch)
+            batch = []
+            if progress:
+                progress(done, rows)
+    if batch:
+        done += DatabaseManager.record_transactions(batch)
+        if progress:
+            progress(done, rows)
+    DatabaseManager.checkpoint('TRUNCATE')
+    return agent_ids
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path', help='Fichier SQLite à créer (écrasé)')
+    parser.add_argument('--rows', default='10k', help='Nombre de transactions (10k, 1M, 10M...)')
+    parser.add_argument('--agents', type=int, default=50)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    rows = parse_count(args.rows)
+    started = time.perf_counter()
+
+    def progress(done, total):
+        print(f'\r{done:>12,} / {total:,} lignes', end='', file=sys.stderr, flush=True)
+
+    build_ledger(args.path, rows, args.agents, args.days, args.seed, progress)
+    elapsed = time.perf_counter() - started
+    print(f'\n{rows:,} lignes en {elapsed:.1f} s ({rows / elapsed:,.0f} lignes/s)', file=sys.stderr)
+    DatabaseManager.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Banc d'essai du démarrage à froid
+
+Lance l'application N fois dans un sous-processus, avec le profil de
+démarrage activé (MM_STARTUP_PROFILE) et arrêt après la première frame
+(MM_STARTUP_EXIT=1), puis affiche les percentiles de chaque phase.
+
+    python -m benchmarks.startup -n 20
+    python -m benchmarks.startup -n 20 --json startup.json --budget first_frame=2500
+
+Par défaut le backend OpenGL factice de Kivy (KIVY_GL_BACKEND=mock) est
+utilisé ; sur une machine sans écran (CI), lancer sous xvfb-run.
+Chaque exécution part d'une base vide dans un dossier temporaire, sauf
+avec --warm-db.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, 'main.py')
+
+
+def percentile(values, q):
+    """Percentile par interpolation linéaire (q entre 0 et 100)"""
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def run_once(workdir, env, timeout):
+    """Un démarrage : retourne le profil JSON enrichi du temps de lancement"""
+    profile = os.path.join(workdir, 'startup_profile.json')
+    if os.path.exists(profile):
+        os.remove(profile)
+
+    spawned = time.monotonic()
+    subprocess.run(
+        [sys.executable, MAIN],
+        cwd=workdir,
+        env=dict(env, MM_STARTUP_PROFILE=profile, MM_STARTUP_EXIT='1'),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        timeout=timeout,
+        check=False
+    )
+    if not os.path.exists(profile):
+        raise RuntimeError("L'application n'a pas produit de profil (voir son journal)")
+
+    with open(profile, encoding='utf-8') as f:
+        data = json.load(f)
+    # CLOCK_MONOTONIC est commun aux processus : on mesure aussi le
+    # démarrage de l'interpréteur, avant la première ligne de main.py
+    data['interpreter_ms'] = round((data['t0_monotonic'] - spawned) * 1000, 3)
+    return data
+
+
+def collect(runs):
+    """Regroupe les durées par phase / instant sur toutes les exécutions"""
+    samples = {'interpreter': [run['interpreter_ms'] for run in runs]}
+    for run in runs:
+        for phase in run['phases']:
+            samples.setdefault(phase['name'], []).append(phase['duration_ms'])
+        for name, at in run['marks'].items():
+            samples.setdefault(name, []).append(at)
+    return samples
+
+
+def summarize(samples):
+    return {
+        name: {
+            'runs': len(values),
+            'p50': percentile(values, 50),
+            'p90': percentile(values, 90),
+            'p95': percentile(values, 95),
+            'max': max(values),
+        }
+        for name, values in samples.items()
+    }
+
+
+def parse_budgets(items):
+    budgets = {}
+    for item in items or []:
+        name, _, value = item.partition('=')
+        budgets[name] = float(value)
+    return budgets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--runs', type=int, default=10)
+    parser.add_argument('--json', help='Fichier de résultats (lisible par machine)')
+    parser.add_argument('--budget', action='append', metavar='PHASE=MS',
+                        help='Échec si le p50 de la phase dépasse MS (répétable)')
+    parser.add_argument('--warm-db', action='store_true',
+                        help='Réutiliser la même base entre les exécutions')
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env.setdefault('KIVY_GL_BACKEND', 'mock')
+    env.setdefault('KIVY_NO_ARGS', '1')
+    env.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+    runs = []
+    with tempfile.TemporaryDirectory() as shared:
+        for _ in range(args.runs):
+            if args.warm_db:
+                runs.append(run_once(shared, env, args.timeout))
+            else:
+                with tempfile.TemporaryDirectory() as workdir:
+                    runs.append(run_once(workdir, env, args.timeout))
+
+    summary = summarize(collect(runs))
+
+    print(f"{'phase':<24}{'p50':>10}{'p90':>10}{'p95':>10}{'max':>10}  (ms)")
+    for name, stats in summary.items():
+        print(f"{name:<24}{stats['p50']:>10.1f}{stats['p90']:>10.1f}"
+              f"{stats['p95']:>10.1f}{stats['max']:>10.1f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'runs': runs}, f, indent=2)
+
+    failures = []
+    for name, limit in parse_budgets(args.budget).items():
+        stats = summary.get(name)
+        if stats is None:
+            failures.append(f'{name}: phase absente')
+        elif stats['p50'] > limit:
+            failures.append(f"{name}: p50 {stats['p50']:.1f} ms > budget {limit:.1f} ms")
+    for failure in failures:
+        print(f'BUDGET DÉPASSÉ - {failure}', file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
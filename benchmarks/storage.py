@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Banc d'essai de la couche de données (DatabaseManager, sans Kivy)
+
+Construit un registre synthétique (benchmarks.ledger) puis mesure la
+latence et la mémoire des requêtes de l'application, et le débit
+d'écriture de record_transaction / record_transactions.
+
+    python -m benchmarks.storage --rows 1M --json before.json
+    python -m benchmarks.storage --rows 1M --json after.json
+    python -m benchmarks.storage compare before.json after.json
+
+La mémoire est le pic d'allocations Python (tracemalloc) d'un appel,
+mesuré à part pour ne pas fausser les temps. Avec --ledger, la base
+est conservée et réutilisée d'une exécution à l'autre (les écritures
+mesurées s'y ajoutent : la regénérer avec --rebuild pour comparer).
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from benchmarks.ledger import build_ledger, parse_count
+from benchmarks.startup import percentile
+from database import DatabaseManager, OPERATORS, TRANSACTION_TYPES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Requêtes de lecture : nom -> fonction(rng, agent_ids)
+READS = {
+    'get_agent_balance': lambda rng, agents: DatabaseManager.get_agent_balance(rng.choice(agents)),
+    'get_daily_summary': lambda rng, agents: DatabaseManager.get_daily_summary(7),
+    'get_daily_summary_30d': lambda rng, agents: DatabaseManager.get_daily_summary(30),
+    'get_operator_summary': lambda rng, agents: DatabaseManager.get_operator_summary(),
+    'get_period_summary_year': lambda rng, agents: DatabaseManager.get_period_summary(
+        DatabaseManager.local_today() - timedelta(days=364), max_points=60),
+    'get_period_summary_all': lambda rng, agents: DatabaseManager.get_period_summary(max_points=60),
+    'get_transactions_page': lambda rng, agents: DatabaseManager.get_transactions_page(),
+    'get_all_transactions': lambda rng, agents: DatabaseManager.get_all_transactions(),
+}
+
+# Requêtes qui chargent tout le registre : moins de répétitions
+HEAVY = {'get_all_transactions'}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def stats(samples_ms):
+    return {
+        'runs': len(samples_ms),
+        'mean_ms': sum(samples_ms) / len(samples_ms),
+        'p50_ms': percentile(samples_ms, 50),
+        'p90_ms': percentile(samples_ms, 90),
+        'max_ms': max(samples_ms),
+    }
+
+
+def peak_memory_kb(fn):
+    """Pic d'allocations Python pendant un appel (Ko)"""
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def bench_read(fn, repeat, rng, agents):
+    # Premier appel sur des connexions neuves : cache de pages SQLite froid
+    DatabaseManager.close()
+    started = time.perf_counter()
+    result = fn(rng, agents)
+    cold = (time.perf_counter() - started) * 1000
+
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(rng, agents)
+        samples.append((time.perf_counter() - started) * 1000)
+
+    entry = stats(samples)
+    entry['cold_ms'] = cold
+    entry['rows'] = len(result) if isinstance(result, list) else 1
+    entry['peak_kb'] = peak_memory_kb(lambda: fn(rng, agents))
+    return entry
+
+
+def bench_record_transaction(count, rng, agents):
+    """Écritures unitaires (saisie au guichet) : un commit par transaction"""
+    samples = []
+    for _ in range(count):
+        args = (rng.choice(agents), rng.choice(OPERATORS),
+                rng.choice(TRANSACTION_TYPES), rng.randint(1, 2000) * 25)
+        started = time.perf_counter()
+        DatabaseManager.record_transaction(*args)
+        samples.append((time.perf_counter() - started) * 1000)
+    entry = stats(samples)
+    entry['ops_per_s'] = count / (sum(samples) / 1000)
+    return entry
+
+
+def bench_concurrent_writes(count, threads, rng, agents, group_commit):
+    """record_transaction depuis plusieurs threads (guichet + sync + file
+    hors ligne), avec ou sans regroupement des commits"""
+    rows = [
+        (rng.choice(agents), rng.choice(OPERATORS), rng.choice(TRANSACTION_TYPES),
+         rng.randint(1, 2000) * 25)
+        for _ in range(count)
+    ]
+
+    def write(args):
+        started = time.perf_counter()
+        DatabaseManager.record_transaction(*args)
+        return (time.perf_counter() - started) * 1000
+
+    if group_commit:
+        DatabaseManager.enable_group_commit()
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            samples = list(pool.map(write, rows))
+        elapsed = time.perf_counter() - started
+    finally:
+        DatabaseManager.disable_group_commit()
+    entry = stats(samples)
+    entry['ops_per_s'] = count / elapsed
+    return entry
+
+
+def bench_record_transactions(count, batch, rng, agents):
+    """Écritures par lots (import de relevés)"""
+    now = DatabaseManager._now()
+    rows = [
+        (rng.choice(agents), rng.choice(OPERATORS), rng.choice(TRANSACTION_TYPES),
+         rng.randint(1, 2000) * 25, now)
+        for _ in range(count)
+    ]
+    samples = []
+    for start in range(0, count, batch):
+        chunk = rows[start:start + batch]
+        started = time.perf_counter()
+        DatabaseManager.record_transactions(chunk)
+        samples.append((time.perf_counter() - started) * 1000)
+    entry = stats(samples)
+    entry['rows_per_s'] = count / (sum(samples) / 1000)
+    return entry
+
+
+def run(args):
+    rows = parse_count(args.rows)
+    rng = random.Random(args.seed)
+    workdir = None
+    path = args.ledger
+    if path is None:
+        workdir = tempfile.TemporaryDirectory()
+        path = os.path.join(workdir.name, 'ledger.db')
+
+    results = {}
+    try:
+        if args.rebuild or not os.path.exists(path):
+            started = time.perf_counter()
+            build_ledger(path, rows, args.agents, args.days, args.seed)
+            results['build_ledger'] = {'rows_per_s': rows / (time.perf_counter() - started)}
+        else:
+            DatabaseManager.DB_NAME = path
+            DatabaseManager.init_database()
+        agents = [agent_id for agent_id, _ in DatabaseManager.get_all_agents()]
+
+        only = set(args.only or [])
+        for name, fn in READS.items():
+            if only and name not in only:
+                continue
+            repeat = args.heavy_repeat if name in HEAVY else args.repeat
+            results[name] = bench_read(fn, repeat, rng, agents)
+
+        # Écritures en dernier : elles modifient le registre
+        if not only or 'record_transaction' in only:
+            results['record_transaction'] = bench_record_transaction(args.writes, rng, agents)
+        for name, grouped in (('record_transaction_concurrent', False),
+                              ('record_transaction_grouped', True)):
+            if not only or name in only:
+                results[name] = bench_concurrent_writes(
+                    args.writes, args.threads, rng, agents, grouped
+                )
+        if not only or 'record_transactions' in only:
+            results['record_transactions'] = bench_record_transactions(
+                args.batch_writes, args.batch, rng, agents
+            )
+
+        with DatabaseManager.connection() as conn:
+            ledger_rows = conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+        file_size = os.path.getsize(path)
+    finally:
+        DatabaseManager.close()
+        if workdir is not None:
+            workdir.cleanup()
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'machine': platform.platform(),
+            'rows': rows,
+            'ledger_rows': ledger_rows,
+            'agents': args.agents,
+            'days': args.days,
+            'seed': args.seed,
+            'schema_version': DatabaseManager.SCHEMA_VERSION,
+            'file_size': file_size,
+        },
+        'results': results,
+    }
+
+
+# Métriques comparées : (clé, True si plus grand = meilleur)
+METRICS = (('p50_ms', False), ('p90_ms', False), ('peak_kb', False),
+           ('ops_per_s', True), ('rows_per_s', True))
+
+
+def compare(old_path, new_path, threshold):
+    """Affiche l'évolution entre deux résultats ; 1 si régression > threshold %"""
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+
+    if old['meta']['rows'] != new['meta']['rows']:
+        print(f"Attention : échelles différentes ({old['meta']['rows']:,} / "
+              f"{new['meta']['rows']:,} lignes)", file=sys.stderr)
+
+    print(f"{old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    regressions = []
+    for name, after in new['results'].items():
+        before = old['results'].get(name)
+        if before is None:
+            continue
+        for metric, higher_is_better in METRICS:
+            if metric not in after or not before.get(metric):
+                continue
+            change = (after[metric] - before[metric]) / before[metric] * 100
+            worse = -change if higher_is_better else change
+            flag = '  REGRESSION' if worse > threshold else ''
+            print(f"{name:<28}{metric:<12}{before[metric]:>14,.2f}{after[metric]:>14,.2f}"
+                  f"{change:>+9.1f} %{flag}")
+            if flag:
+                regressions.append((name, metric))
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['compare']:
+        parser = argparse.ArgumentParser(prog='benchmarks.storage compare')
+        parser.add_argument('old')
+        parser.add_argument('new')
+        parser.add_argument('--threshold', type=float, default=20,
+                            help='Régression tolérée en %% (défaut : 20)')
+        args = parser.parse_args(argv[1:])
+        return compare(args.old, args.new, args.threshold)
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', default='10k', help='Taille du registre (10k, 1M, 10M...)')
+    parser.add_argument('--agents', type=int, default=50)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--heavy-repeat', type=int, default=3,
+                        help='Répétitions des requêtes qui chargent tout le registre')
+    parser.add_argument('--writes', type=int, default=500,
+                        help='Nombre de record_transaction unitaires')
+    parser.add_argument('--threads', type=int, default=8,
+                        help='Threads des bancs d\'écriture concurrente')
+    parser.add_argument('--batch-writes', type=int, default=20000)
+    parser.add_argument('--batch', type=int, default=2000)
+    parser.add_argument('--only', action='append', metavar='NOM',
+                        help='Ne mesurer que ce banc (répétable)')
+    parser.add_argument('--ledger', help='Base à conserver et réutiliser')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Regénérer la base --ledger même si elle existe')
+    parser.add_argument('--json', help='Fichier de résultats (lisible par machine)')
+    args = parser.parse_args(argv)
+
+    report = run(args)
+
+    print(f"{'banc':<28}{'p50':>10}{'p90':>10}{'max':>10}{'Ko':>12}  (ms)")
+    for name, entry in report['results'].items():
+        if 'p50_ms' not in entry:
+            continue
+        print(f"{name:<28}{entry['p50_ms']:>10.2f}{entry['p90_ms']:>10.2f}"
+              f"{entry['max_ms']:>10.2f}{entry.get('peak_kb', 0):>12,.0f}")
+    for name, entry in report['results'].items():
+        for metric in ('ops_per_s', 'rows_per_s'):
+            if metric in entry:
+                print(f'{name:<28}{entry[metric]:>14,.0f} {metric}')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,7 +4,7 @@ package.domain = org.example
 source.dir = .
 source.include_exts = py,png,jpg,kv,atlas,ttf,db
 version = 1.0.0
-requirements = python3,kivy==2.2.1,pillow,pandas,numpy,pygal,cairosvg,lxml
+requirements = python3,kivy==2.2.1,pillow,openpyxl,et_xmlfile,xlrd
 orientation = portrait
 fullscreen = 0
 android.permissions = INTERNET,READ_EXTERNAL_STORAGE,WRITE_EXTERNAL_STORAGE
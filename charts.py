@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Graphiques natifs Kivy (camembert / anneau, barres groupées)
+
+Dessinés directement avec les instructions du canvas (Mesh, Rectangle,
+Line) : pas de SVG, pas de rastérisation PNG, pas de décodage d'image.
+L'API reprend les options pygal utilisées par l'application (title,
+legend_at_bottom, x_label_rotation, print_values, inner_radius...).
+"""
+
+import math
+
+from kivy.clock import Clock
+from kivy.core.text import Label as CoreLabel
+from kivy.graphics import (
+    Color, Line, Mesh, PopMatrix, PushMatrix, Rectangle, Rotate
+)
+from kivy.metrics import dp, sp
+from kivy.properties import (
+    BooleanProperty, ListProperty, NumericProperty, StringProperty
+)
+from kivy.uix.widget import Widget
+from kivy.utils import get_color_from_hex
+
+# Palette par défaut de pygal : mêmes couleurs qu'avant la migration
+PALETTE = [
+    get_color_from_hex(c) for c in (
+        '#F44336', '#3F51B5', '#009688', '#FFC107', '#FF5722', '#9C27B0',
+        '#03A9F4', '#8BC34A', '#FF9800', '#E91E63', '#2196F3', '#4CAF50',
+    )
+]
+
+TEXT_COLOR = [0.2, 0.2, 0.2, 1]
+GRID_COLOR = [0.85, 0.85, 0.85, 1]
+
+def format_value(value):
+    """Montant abrégé pour les étiquettes (1.2M, 350k)"""
+    value = float(value)
+    for threshold, suffix in ((1e9, 'G'), (1e6, 'M'), (1e3, 'k')):
+        if abs(value) >= threshold:
+            return f'{value / threshold:.1f}{suffix}'.replace('.0', '')
+    return f'{value:.0f}'
+
+class Chart(Widget):
+    """Base des graphiques : titre, légende et redessin différé"""
+    
+    title = StringProperty('')
+    legend_at_bottom = BooleanProperty(True)
+    legend_font_size = NumericProperty(10)
+    title_font_size = NumericProperty(16)
+    print_values = BooleanProperty(False)
+    
+    # Propriétés dont le changement impose un redessin
+    REDRAW_ON = ('pos', 'size', 'title', 'legend_at_bottom', 'legend_font_size',
+                 'title_font_size', 'print_values')
+    
+    def __init__(self, **kwargs):
+        self.series = []
+        self._label_cache = {}
+        super().__init__(**kwargs)
+        
+        # Un seul redessin par frame, quel que soit le nombre de changements
+        self._trigger_redraw = Clock.create_trigger(self.redraw)
+        self.bind(**{name: self._trigger_redraw for name in self.REDRAW_ON})
+    
+    def add(self, title, values):
+        """Ajoute une série (même signature que pygal)"""
+        self.series.append((title, values))
+        self._trigger_redraw()
+    
+    def color_for(self, index):
+        return PALETTE[index % len(PALETTE)]
+    
+    def text_texture(self, text, font_size, bold=False):
+        """Texture d'un texte, mise en cache (les étiquettes se répètent)"""
+        key = (text, font_size, bold)
+        texture = self._label_cache.get(key)
+        if texture is None:
+            label = CoreLabel(text=str(text), font_size=sp(font_size), bold=bold)
+            label.refresh()
+            texture = self._label_cache[key] = label.texture
+        return texture
+    
+    def draw_text(self, text, x, y, font_size, anchor='center', bold=False,
+                  color=TEXT_COLOR, angle=0):
+        """Dessine un texte ; (x, y) est le point d'ancrage"""
+        texture = self.text_texture(text, font_size, bold)
+        w, h = texture.size
+        if anchor == 'center':
+            left, bottom = x - w / 2, y - h / 2
+        elif anchor == 'right':
+            left, bottom = x - w, y - h / 2
+        else:
+            left, bottom = x, y - h / 2
+        
+        Color(*color)
+        if angle:
+            # Rotation autour du point d'ancrage (étiquettes d'abscisse)
+            PushMatrix()
+            Rotate(angle=angle, origin=(x, y))
+            Rectangle(texture=texture, pos=(x - w, y - h / 2), size=(w, h))
+            PopMatrix()
+        else:
+            Rectangle(texture=texture, pos=(left, bottom), size=(w, h))
+    
+    def draw_legend(self, names):
+        """Légende en bas ; retourne la hauteur occupée"""
+        if not self.legend_at_bottom or not names:
+            return 0
+        
+        box = dp(10)
+        gap = dp(6)
+        row_height = max(box, self.text_texture('Ag', self.legend_font_size).height) + gap
+        
+        # Répartition en lignes selon la largeur disponible
+        rows, row, row_width = [], [], 0
+        for index, name in enumerate(names):
+            width = box + gap + self.text_texture(name, self.legend_font_size).width + 2 * gap
+            if row and row_width + width > self.width:
+                rows.append((row, row_width))
+                row, row_width = [], 0
+            row.append((index, name, width))
+            row_width += width
+        if row:
+            rows.append((row, row_width))
+        
+        height = len(rows) * row_height
+        for line, (items, line_width) in enumerate(rows):
+            x = self.x + (self.width - line_width) / 2
+            y = self.y + height - (line + 0.5) * row_height
+            for index, name, width in items:
+                Color(*self.color_for(index))
+                Rectangle(pos=(x, y - box / 2), size=(box, box))
+                self.draw_text(name, x + box + gap, y, self.legend_font_size, anchor='left')
+                x += width
+        return height
+    
+    def redraw(self, *args):
+        self.canvas.clear()
+        with self.canvas:
+            top = self.top
+            if self.title:
+                title_height = self.text_texture(self.title, self.title_font_size, True).height
+                self.draw_text(
+                    self.title, self.center_x, top - title_height / 2 - dp(4),
+                    self.title_font_size, bold=True
+                )
+                top -= title_height + dp(12)
+            bottom = self.y + self.draw_legend([name for name, _ in self.series])
+            if bottom > self.y:
+                bottom += dp(8)
+            if top - bottom > dp(20) and self.series:
+                self.draw_plot(self.x, bottom, self.width, top - bottom)
+    
+    def draw_plot(self, x, y, width, height):
+        """Dessine les séries dans le rectangle (x, y, width, height)
+        
+        Sans effet ici (titre et légende seuls) : PieChart et BarChart la
+        redéfinissent.
+        """
+
+class PieChart(Chart):
+    """Camembert, ou anneau si inner_radius > 0 (fraction du rayon)"""
+    
+    inner_radius = NumericProperty(0)
+    
+    REDRAW_ON = Chart.REDRAW_ON + ('inner_radius',)
+    SEGMENTS = 64  # segments pour un tour complet
+    
+    def draw_plot(self, x, y, width, height):
+        values = [max(float(v), 0) for _, v in self.series]
+        total = sum(values)
+        if total <= 0:
+            return
+        
+        cx, cy = x + width / 2, y + height / 2
+        outer = min(width, height) / 2 - dp(4)
+        inner = outer * self.inner_radius
+        
+        start = math.pi / 2  # Départ à midi, sens horaire comme pygal
+        labels = []
+        for index, value in enumerate(values):
+            if value <= 0:
+                continue
+            sweep = 2 * math.pi * value / total
+            Color(*self.color_for(index))
+            self._draw_slice(cx, cy, inner, outer, start, sweep)
+            
+            middle = start - sweep / 2
+            radius = (inner + outer) / 2 if inner else outer * 0.65
+            labels.append((value, cx + radius * math.cos(middle), cy + radius * math.sin(middle)))
+            start -= sweep
+        
+        if self.print_values:
+            for value, lx, ly in labels:
+                self.draw_text(format_value(value), lx, ly, self.legend_font_size,
+                               bold=True, color=[1, 1, 1, 1])
+    
+    def _draw_slice(self, cx, cy, inner, outer, start, sweep):
+        steps = max(2, int(self.SEGMENTS * sweep / (2 * math.pi)) + 1)
+        vertices = []
+        for step in range(steps + 1):
+            angle = start - sweep * step / steps
+            cos, sin = math.cos(angle), math.sin(angle)
+            vertices.extend((cx + outer * cos, cy + outer * sin, 0, 0))
+            vertices.extend((cx + inner * cos, cy + inner * sin, 0, 0))
+        Mesh(vertices=vertices, indices=list(range(len(vertices) // 4)),
+             mode='triangle_strip')
+
+class BarChart(Chart):
+    """Barres groupées : une barre par série pour chaque étiquette x"""
+    
+    x_label_rotation = NumericProperty(0)
+    x_labels = ListProperty([])
+    
+    REDRAW_ON = Chart.REDRAW_ON + ('x_label_rotation', 'x_labels')
+    Y_TICKS = 4
+    
+    def draw_plot(self, x, y, width, height):
+        count = max([len(values) for _, values in self.series] + [len(self.x_labels)])
+        if not count:
+            return
+        peak = max([float(v) for _, values in self.series for v in values] + [0])
+        peak = peak or 1
+        
+        # Marges : valeurs de l'axe y à gauche, étiquettes x en bas
+        font = self.legend_font_size
+        y_label_width = max(
+            self.text_texture(format_value(peak * i / self.Y_TICKS), font).width
+            for i in range(self.Y_TICKS + 1)
+        ) + dp(6)
+        x_label_height = 0
+        if self.x_labels:
+            longest = max(self.text_texture(l, font).width for l in self.x_labels)
+            line = self.text_texture('Ag', font).height
+            angle = math.radians(self.x_label_rotation)
+            x_label_height = longest * math.sin(angle) + line * math.cos(angle) + dp(6)
+        
+        left = x + y_label_width
+        bottom = y + x_label_height
+        plot_width = width - y_label_width - dp(4)
+        plot_height = height - x_label_height - dp(4)
+        if plot_width <= 0 or plot_height <= 0:
+            return
+        
+        # Grille horizontale
+        for i in range(self.Y_TICKS + 1):
+            gy = bottom + plot_height * i / self.Y_TICKS
+            Color(*GRID_COLOR)
+            Line(points=[left, gy, left + plot_width, gy], width=1)
+            self.draw_text(format_value(peak * i / self.Y_TICKS), left - dp(4), gy, font, anchor='right')
+        
+        # Barres
+        slot = plot_width / count
+        bar = slot * 0.8 / len(self.series)
+        for index, (_, values) in enumerate(self.series):
+            Color(*self.color_for(index))
+            for i, value in enumerate(values):
+                value = float(value or 0)
+                if value <= 0:
+                    continue
+                bx = left + slot * i + slot * 0.1 + bar * index
+                Rectangle(pos=(bx, bottom), size=(bar, plot_height * value / peak))
+                if self.print_values:
+                    self.draw_text(format_value(value), bx + bar / 2,
+                                   bottom + plot_height * value / peak + dp(6), font)
+        
+        # Étiquettes x (pivotées comme x_label_rotation de pygal)
+        for i, label in enumerate(self.x_labels):
+            lx = left + slot * (i + 0.5)
+            if self.x_label_rotation:
+                self.draw_text(label, lx, bottom - dp(4), font, angle=self.x_label_rotation)
+            else:
+                self.draw_text(label, lx, bottom - dp(10), font)
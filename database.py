@@ -0,0 +1,2352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Couche de données Mobile Money (SQLite)
+
+Sans dépendance à Kivy : utilisée par l'application, les bancs d'essai
+(benchmarks/) et les outils en ligne de commande.
+"""
+
+import os
+import re
+import time
+import calendar
+import csv
+import json
+import logging
+import sqlite3
+import hashlib
+import hmac
+import queue
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from io import TextIOWrapper
+
+OPERATORS = ['Orange Money', 'Moov Money', 'Telecel', 'Wave', 'TNT']
+TRANSACTION_TYPES = ['Dépôt', 'Retrait']
+
+# Montant maximal d'une transaction (XOF)
+MAX_AMOUNT = 10000000
+
+logger = logging.getLogger('mobile_money.database')
+
+# =============================================================================
+# JOURNAL DES REQUÊTES LENTES
+# =============================================================================
+
+class QueryLog:
+    """Temps d'exécution de chaque requête SQL et journal des plus lentes
+    
+    Toutes les requêtes alimentent des statistiques par texte SQL (nombre,
+    temps total, maximum, lignes) ; celles qui dépassent threshold_ms sont
+    gardées dans un tampon circulaire avec leur plan (EXPLAIN QUERY PLAN).
+    Les listeners reçoivent (sql, durée_ms, lignes) pour chaque requête.
+    """
+    
+    def __init__(self, threshold_ms=50, capacity=200):
+        self.threshold_ms = threshold_ms
+        self.explain = True
+        self.listeners = []
+        self._entries = deque(maxlen=capacity)
+        self._stats = {}
+        self._plans = {}
+        self._keys = {}
+        self._lock = threading.Lock()
+    
+    def _key(self, sql):
+        # Texte SQL sur une ligne ; mis en cache, le même texte revient
+        key = self._keys.get(sql)
+        if key is None:
+            key = self._keys[sql] = ' '.join(sql.split())
+        return key
+    
+    def record(self, conn, sql, params, duration_ms, rows, many=False):
+        key = self._key(sql)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = [0, 0.0, 0.0, 0]
+            stats[0] += 1
+            stats[1] += duration_ms
+            stats[2] = max(stats[2], duration_ms)
+            stats[3] += rows
+        for listener in self.listeners:
+            listener(key, duration_ms, rows)
+        
+        if duration_ms < self.threshold_ms:
+            return
+        entry = {
+            'at': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+            'sql': key,
+            'duration_ms': round(duration_ms, 3),
+            'rows': rows,
+            'many': many,
+            'thread': threading.current_thread().name,
+            'plan': None,
+        }
+        if self.explain and not many:
+            entry['plan'] = self._plan(conn, key, sql, params)
+        with self._lock:
+            self._entries.append(entry)
+    
+    def _plan(self, conn, key, sql, params):
+        """Plan d'exécution (une fois par texte SQL) ; None hors SELECT"""
+        if key in self._plans:
+            return self._plans[key]
+        plan = None
+        if key.split(' ', 1)[0].upper() in ('SELECT', 'WITH'):
+            try:
+                # Curseur natif : le plan lui-même n'est pas chronométré
+                rows = sqlite3.Cursor(conn).execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = [detail for _, _, _, detail in rows]
+            except sqlite3.Error as e:
+                plan = [f'Erreur: {e}']
+        self._plans[key] = plan
+        return plan
+    
+    def entries(self):
+        """Requêtes lentes, de la plus récente à la plus ancienne"""
+        with self._lock:
+            return list(reversed(self._entries))
+    
+    def stats(self, limit=None):
+        """Statistiques par requête, triées par temps total décroissant"""
+        with self._lock:
+            items = [
+                {'sql': sql, 'count': count, 'total_ms': round(total, 3),
+                 'max_ms': round(peak, 3), 'mean_ms': round(total / count, 3), 'rows': rows}
+                for sql, (count, total, peak, rows) in self._stats.items()
+            ]
+        items.sort(key=lambda item: item['total_ms'], reverse=True)
+        return items[:limit] if limit else items
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stats.clear()
+            self._plans.clear()
+    
+    def export(self, path):
+        """Écrit le journal et les statistiques en JSON ; retourne path"""
+        report = {
+            'exported_at': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+            'sqlite': sqlite3.sqlite_version,
+            'schema_version': DatabaseManager.SCHEMA_VERSION,
+            'threshold_ms': self.threshold_ms,
+            'slow_queries': self.entries(),
+            'stats': self.stats(),
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return path
+
+query_log = QueryLog()
+
+class TimedCursor(sqlite3.Cursor):
+    """Curseur chronométré : exécution + lecture des lignes
+    
+    La mesure d'un SELECT court jusqu'à la fin de la lecture (fetchall,
+    itération épuisée, fetchmany incomplet, premier fetchone) ou jusqu'à
+    la requête suivante sur le même curseur.
+    """
+    
+    _pending = None
+    
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            query_log.record(self.connection, *pending)
+    
+    def execute(self, sql, parameters=()):
+        self._finish()
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        elapsed = (time.perf_counter() - started) * 1000
+        if self.description is None:
+            query_log.record(self.connection, sql, parameters, elapsed, max(self.rowcount, 0))
+        else:
+            self._pending = [sql, parameters, elapsed, 0]
+        return self
+    
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        elapsed = (time.perf_counter() - started) * 1000
+        query_log.record(self.connection, sql, (), elapsed, max(self.rowcount, 0), many=True)
+        return self
+    
+    def _fetched(self, started, count):
+        pending = self._pending
+        if pending is not None:
+            pending[2] += (time.perf_counter() - started) * 1000
+            pending[3] += count
+    
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None)
+        self._finish()
+        return row
+    
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._fetched(started, len(rows))
+        if len(rows) < size:
+            self._finish()
+        return rows
+    
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows))
+        self._finish()
+        return rows
+    
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._finish()
+            raise
+        self._fetched(started, 1)
+        return row
+    
+    def close(self):
+        self._finish()
+        super().close()
+
+class TimedConnection(sqlite3.Connection):
+    """Connexion dont tous les curseurs (y compris execute) sont chronométrés"""
+    
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+    
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+# =============================================================================
+# GESTION DE LA BASE DE DONNÉES
+# =============================================================================
+
+class ConnectionPool:
+    """Connexions SQLite persistantes, une par thread
+    
+    Chaque thread réutilise sa propre connexion au lieu d'ouvrir le fichier
+    à chaque requête ; le paramétrage (PRAGMA) n'est appliqué qu'une fois,
+    à la création de la connexion.
+    """
+    
+    def __init__(self, db_name, setup=None, factory=sqlite3.Connection):
+        self.db_name = db_name
+        self._setup = setup
+        self._factory = factory
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+    
+    def _connect(self):
+        conn = sqlite3.connect(self.db_name, check_same_thread=False, factory=self._factory)
+        if self._setup:
+            self._setup(conn)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+    
+    def get(self):
+        """Retourne la connexion du thread courant (créée au besoin)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            self._local.depth = 0
+        return conn
+    
+    @contextmanager
+    def connection(self):
+        """Emprunte la connexion du thread courant (lecture)"""
+        yield self.get()
+    
+    @contextmanager
+    def transaction(self, write=False):
+        """Emprunte la connexion dans une transaction (commit ou rollback)
+        
+        Les transactions imbriquées sont fusionnées dans la plus externe.
+        write : BEGIN IMMEDIATE, le verrou d'écriture est pris dès le
+        début. Indispensable si la transaction lit avant d'écrire : en
+        WAL, une transaction différée dont l'instantané de lecture a été
+        dépassé par le commit d'une autre connexion échoue aussitôt
+        (« database is locked ») à sa première écriture, sans attendre
+        busy_timeout.
+        """
+        conn = self.get()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+        
+        self._local.depth = 1
+        try:
+            with conn:
+                # BEGIN explicite : le DDL (migrations) devient lui aussi
+                # transactionnel
+                if not conn.in_transaction:
+                    conn.execute('BEGIN IMMEDIATE' if write else 'BEGIN')
+                yield conn
+        finally:
+            self._local.depth = 0
+    
+    def in_transaction(self):
+        """Vrai si le thread courant est dans transaction()"""
+        return getattr(self._local, 'depth', 0) > 0
+    
+    def close_all(self):
+        """Ferme toutes les connexions ouvertes par le pool"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+class GroupCommitWriter:
+    """Regroupe les écritures unitaires en un seul commit
+    
+    Chaque appel à submit() met une ligne en file et retourne un Future ;
+    un thread dédié écrit tout ce qui est en file (au plus max_batch
+    lignes) via write_batch, dans une seule transaction. Pendant un commit,
+    les lignes suivantes s'accumulent : plus le stockage est lent, plus
+    les groupes grossissent. max_delay ajoute une attente volontaire avant
+    chaque commit, utile seulement si le fsync coûte plusieurs ms.
+    
+    Le Future n'est résolu qu'après le commit : l'appelant qui attend son
+    résultat a la même garantie de durabilité qu'avec un commit par ligne.
+    Si write_batch retourne une liste (un résultat par ligne), chaque
+    Future reçoit le sien ; sinon True.
+    """
+    
+    def __init__(self, write_batch, max_delay=0, max_batch=500):
+        self._write_batch = write_batch
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+        self._thread.start()
+    
+    def submit(self, row):
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('GroupCommitWriter fermé')
+            self._queue.put((row, future))
+        return future
+    
+    def close(self):
+        """Écrit les lignes en attente puis arrête le thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+    
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+    
+    def _flush(self, batch):
+        try:
+            results = self._write_batch([row for row, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # Une ligne invalide ne doit pas faire échouer tout le groupe :
+            # on rejoue ligne par ligne pour isoler la fautive
+            for item in batch:
+                self._flush([item])
+            return
+        if not isinstance(results, list):
+            results = [True] * len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+class DatabaseManager:
+    
+    DB_NAME = 'mobile_money.db'
+    
+    # Profil de stockage appliqué à l'init et à chaque nouvelle connexion :
+    # WAL pour que les lectures (statistiques) ne bloquent jamais les
+    # écritures, synchronous=NORMAL pour un seul fsync par checkpoint
+    # au lieu d'un par transaction.
+    STORAGE_PROFILE = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -8000,              # Kio (valeur négative), soit 8 Mo
+        'mmap_size': 32 * 1024 * 1024,    # octets
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,             # ms
+        'wal_autocheckpoint': 1000,       # pages
+    }
+    
+    # Checkpoint WAL lancé à la mise en pause de l'application (Android
+    # peut tuer le processus en arrière-plan) : PASSIVE, FULL, RESTART
+    # ou TRUNCATE (ramène le fichier -wal à zéro). PASSIVE n'attend
+    # jamais le verrou d'écriture (import, export ou synchronisation en
+    # cours) : les autres modes peuvent bloquer jusqu'à busy_timeout.
+    PAUSE_CHECKPOINT = 'PASSIVE'
+    
+    # Version cible du schéma : chaque version N est appliquée par la
+    # méthode _migration_N (voir migrate)
+    SCHEMA_VERSION = 10
+    
+    # Décalage de l'heure locale sur UTC (minutes). Fixe le découpage en
+    # journées (local_day, period_rollup, filtres de dates).
+    # La zone XOF couvre UTC+0 (Côte d'Ivoire, Sénégal...) et UTC+1
+    # (Bénin, Niger). None : celui de l'appareil à la création de la base,
+    # enregistré ensuite (réglage 'utc_offset_minutes') ; un changement de
+    # fuseau ou d'heure d'été ne touche donc pas la base. Une valeur
+    # explicite différente de celle enregistrée est appliquée par
+    # set_utc_offset (voir pending_utc_offset), jamais par init_database.
+    UTC_OFFSET_MINUTES = None
+    
+    # Taille de page de l'historique (pagination par curseur)
+    PAGE_SIZE = 50
+    
+    # Regroupement des commits (désactivé par défaut, voir
+    # enable_group_commit) : attente avant commit (s) et taille d'un groupe
+    GROUP_COMMIT_DELAY = 0
+    GROUP_COMMIT_BATCH = 500
+    
+    # Chronométrage de chaque requête (query_log) ; coût de l'ordre de la
+    # microseconde par requête
+    QUERY_TIMING = True
+    
+    _pool = None
+    _writer = None
+    
+    @classmethod
+    def pool(cls):
+        """Pool partagé par toutes les méthodes (recréé si DB_NAME change)"""
+        if cls._pool is None or cls._pool.db_name != cls.DB_NAME:
+            if cls._pool is not None:
+                cls._pool.close_all()
+            cls._iterations = None
+            cls._references = {}
+            cls._pool = ConnectionPool(
+                cls.DB_NAME, cls._configure_connection,
+                TimedConnection if cls.QUERY_TIMING else sqlite3.Connection
+            )
+        return cls._pool
+    
+    @classmethod
+    def _configure_connection(cls, conn):
+        for name, value in cls.STORAGE_PROFILE.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+    
+    @classmethod
+    def configure_storage(cls, **settings):
+        """Modifie le profil de stockage (ex: synchronous='FULL')
+        
+        Les connexions existantes sont fermées pour que le nouveau profil
+        s'applique à la prochaine requête.
+        """
+        cls.STORAGE_PROFILE = {**cls.STORAGE_PROFILE, **settings}
+        cls.close()
+    
+    @classmethod
+    def checkpoint(cls, mode=None):
+        """Reporte le journal WAL dans la base
+        
+        Retourne (busy, pages du WAL, pages reportées).
+        """
+        mode = (mode or cls.PAUSE_CHECKPOINT).upper()
+        if mode not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+            raise ValueError(f'Mode de checkpoint inconnu: {mode}')
+        with cls.connection() as conn:
+            return conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+    
+    @classmethod
+    def connection(cls):
+        return cls.pool().connection()
+    
+    # Reconstruction en cours (set_utc_offset) : thread propriétaire et
+    # nombre de transactions d'écriture ouvertes par les autres threads
+    _rebuild_owner = None
+    _open_writes = 0
+    _rebuild_state = threading.Condition()
+    
+    @classmethod
+    @contextmanager
+    def transaction(cls, write=False):
+        pool = cls.pool()
+        if not write or pool.in_transaction():
+            with pool.transaction(write) as conn:
+                yield conn
+            return
+        
+        # Pendant une reconstruction, une écriture attend sa fin au lieu
+        # d'échouer sur busy_timeout (« database is locked »)
+        me = threading.get_ident()
+        with cls._rebuild_state:
+            while cls._rebuild_owner not in (None, me):
+                cls._rebuild_state.wait()
+            counted = cls._rebuild_owner is None
+            if counted:
+                cls._open_writes += 1
+        try:
+            with pool.transaction(write) as conn:
+                yield conn
+        finally:
+            if counted:
+                with cls._rebuild_state:
+                    cls._open_writes -= 1
+                    cls._rebuild_state.notify_all()
+    
+    @classmethod
+    @contextmanager
+    def _rebuilding(cls):
+        """Réserve les écritures à ce thread, après celles en cours"""
+        with cls._rebuild_state:
+            while cls._rebuild_owner is not None:
+                cls._rebuild_state.wait()
+            cls._rebuild_owner = threading.get_ident()
+            while cls._open_writes:
+                cls._rebuild_state.wait()
+        try:
+            yield
+        finally:
+            with cls._rebuild_state:
+                cls._rebuild_owner = None
+                cls._rebuild_state.notify_all()
+    
+    @classmethod
+    def rebuilding(cls):
+        """Vrai pendant set_utc_offset : les enregistrements attendent"""
+        return cls._rebuild_owner is not None
+    
+    @classmethod
+    def close(cls):
+        """Ferme les connexions (arrêt de l'application)"""
+        cls.disable_group_commit()
+        if cls._pool is not None:
+            cls._pool.close_all()
+            cls._pool = None
+    
+    @classmethod
+    def init_database(cls):
+        # La première connexion applique STORAGE_PROFILE ; le mode WAL est
+        # persistant et reste fixé dans le fichier
+        with cls.transaction(write=True) as conn:
+            c = conn.cursor()
+            
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT UNIQUE NOT NULL,
+                    password TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS transactions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    agent_id INTEGER,
+                    operator TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    amount REAL NOT NULL,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (agent_id) REFERENCES users(id)
+                )
+            ''')
+            
+            cls.migrate(c)
+            
+            # Admin par défaut. Son mot de passe étant public, l'empreinte
+            # sha256 historique suffit ici et évite un PBKDF2 au premier
+            # lancement ; elle est remplacée à la première connexion.
+            c.execute("SELECT * FROM users WHERE username='admin'")
+            if not c.fetchone():
+                hashed = hashlib.sha256('admin123'.encode()).hexdigest()
+                c.execute(
+                    "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+                    ('admin', hashed, 'admin')
+                )
+            
+            cls._apply_utc_offset(c)
+            version = cls._read_data_version(c)
+        cls.data_version = version
+    
+    @classmethod
+    def migrate(cls, c):
+        """Met à niveau le schéma jusqu'à SCHEMA_VERSION
+        
+        Appelé dans la transaction d'init_database : une installation
+        existante est mise à jour sur place, tout ou rien.
+        """
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        c.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        current = c.fetchone()[0]
+        
+        for version in range(current + 1, cls.SCHEMA_VERSION + 1):
+            migration = getattr(cls, f'_migration_{version}')
+            migration(c)
+            c.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, migration.__doc__.strip())
+            )
+    
+    @classmethod
+    def _migration_1(cls, c):
+        """Index couvrants sur transactions"""
+        # Solde par agent : get_agent_balance ne lit que l'index
+        c.execute('''
+            CREATE INDEX IF NOT EXISTS idx_transactions_agent_type
+            ON transactions (agent_id, type, amount)
+        ''')
+        # Historique d'un agent trié par date
+        c.execute('''
+            CREATE INDEX IF NOT EXISTS idx_transactions_agent_time
+            ON transactions (agent_id, timestamp)
+        ''')
+        # Résumé journalier : parcours d'intervalle sur timestamp
+        c.execute('''
+            CREATE INDEX IF NOT EXISTS idx_transactions_time
+            ON transactions (timestamp, operator, type, amount)
+        ''')
+        # Résumé par opérateur : GROUP BY sans tri temporaire
+        c.execute('''
+            CREATE INDEX IF NOT EXISTS idx_transactions_operator
+            ON transactions (operator, type, amount)
+        ''')
+    
+    @classmethod
+    def _migration_2(cls, c):
+        """Table agent_balances (soldes maintenus en continu)"""
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS agent_balances (
+                agent_id INTEGER PRIMARY KEY,
+                deposits REAL NOT NULL DEFAULT 0,
+                withdrawals REAL NOT NULL DEFAULT 0,
+                balance REAL NOT NULL DEFAULT 0,
+                count INTEGER NOT NULL DEFAULT 0,
+                last_tx_at TIMESTAMP,
+                FOREIGN KEY (agent_id) REFERENCES users(id)
+            )
+        ''')
+        # Remplie par _migration_7, qui reconstruit les agrégats
+    
+    @classmethod
+    def _migration_3(cls, c):
+        """Table daily_rollup (abandonnée, remplacée par period_rollup)"""
+        # Sans effet : conservée pour la numérotation des versions ;
+        # _migration_10 supprime la table des bases qui l'ont créée
+    
+    @classmethod
+    def _migration_4(cls, c):
+        """Table settings (paramètres propres à l'appareil)"""
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            ) WITHOUT ROWID
+        ''')
+    
+    @classmethod
+    def _migration_5(cls, c):
+        """Origine des transactions synchronisées (device_id, device_seq)"""
+        # Renseignées seulement sur la base centrale (voir server.py) ;
+        # l'index unique garantit qu'une ligne n'est chargée qu'une fois
+        c.execute("ALTER TABLE transactions ADD COLUMN device_id TEXT")
+        c.execute("ALTER TABLE transactions ADD COLUMN device_seq INTEGER")
+        c.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_device
+            ON transactions (device_id, device_seq)
+            WHERE device_id IS NOT NULL
+        ''')
+    
+    @classmethod
+    def _migration_6(cls, c):
+        """Montants entiers (XOF), tables de référence operators et tx_types"""
+        for table, names in (('operators', OPERATORS), ('tx_types', TRANSACTION_TYPES)):
+            c.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT UNIQUE NOT NULL
+                )
+            ''')
+            c.executemany(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)",
+                          [(name,) for name in names])
+        # Valeurs hors liste déjà présentes (base centrale)
+        c.execute("INSERT OR IGNORE INTO operators (name) SELECT DISTINCT operator FROM transactions")
+        c.execute("INSERT OR IGNORE INTO tx_types (name) SELECT DISTINCT type FROM transactions")
+        
+        # SQLite ne change pas le type d'une colonne : table reconstruite.
+        # Les id sont conservés (séquence de synchronisation, voir sync.py)
+        c.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name='transactions'")
+        last_id = c.fetchone()[0]
+        c.execute('''
+            CREATE TABLE transactions_v6 (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                agent_id INTEGER,
+                operator_id INTEGER NOT NULL,
+                type_id INTEGER NOT NULL,
+                amount INTEGER NOT NULL,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                device_id TEXT,
+                device_seq INTEGER,
+                FOREIGN KEY (agent_id) REFERENCES users(id),
+                FOREIGN KEY (operator_id) REFERENCES operators(id),
+                FOREIGN KEY (type_id) REFERENCES tx_types(id)
+            )
+        ''')
+        c.connection.create_function('round_xof', 1, cls.round_xof, deterministic=True)
+        c.execute('''
+            INSERT INTO transactions_v6
+                (id, agent_id, operator_id, type_id, amount, timestamp, device_id, device_seq)
+            SELECT t.id, t.agent_id, o.id, y.id, round_xof(t.amount),
+                   t.timestamp, t.device_id, t.device_seq
+            FROM transactions t
+            JOIN operators o ON o.name = t.operator
+            JOIN tx_types y ON y.name = t.type
+        ''')
+        c.execute("DROP TABLE transactions")
+        c.execute("ALTER TABLE transactions_v6 RENAME TO transactions")
+        c.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name='transactions'")
+        last_id = max(last_id, c.fetchone()[0])
+        c.execute("DELETE FROM sqlite_sequence WHERE name='transactions'")
+        c.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('transactions', ?)", (last_id,))
+        
+        # Index de _migration_1 et _migration_5, sur les nouvelles colonnes
+        c.execute('''
+            CREATE INDEX idx_transactions_agent_type
+            ON transactions (agent_id, type_id, amount)
+        ''')
+        c.execute('''
+            CREATE INDEX idx_transactions_agent_time
+            ON transactions (agent_id, timestamp)
+        ''')
+        c.execute('''
+            CREATE INDEX idx_transactions_time
+            ON transactions (timestamp, operator_id, type_id, amount)
+        ''')
+        c.execute('''
+            CREATE INDEX idx_transactions_operator
+            ON transactions (operator_id, type_id, amount)
+        ''')
+        c.execute('''
+            CREATE UNIQUE INDEX idx_transactions_device
+            ON transactions (device_id, device_seq)
+            WHERE device_id IS NOT NULL
+        ''')
+        
+        # Agrégats en entiers, remplis par _migration_7
+        c.execute("DROP TABLE IF EXISTS agent_balances")
+        c.execute('''
+            CREATE TABLE agent_balances (
+                agent_id INTEGER PRIMARY KEY,
+                deposits INTEGER NOT NULL DEFAULT 0,
+                withdrawals INTEGER NOT NULL DEFAULT 0,
+                balance INTEGER NOT NULL DEFAULT 0,
+                count INTEGER NOT NULL DEFAULT 0,
+                last_tx_at TIMESTAMP,
+                FOREIGN KEY (agent_id) REFERENCES users(id)
+            )
+        ''')
+    
+    @classmethod
+    def _migration_7(cls, c):
+        """Horodatages entiers (epoch UTC) et colonne local_day indexée"""
+        # Un horodatage illisible ne doit ni bloquer la mise à niveau ni
+        # devenir le 01/01/1970 : la ligne est mise à part, intacte, dans
+        # transactions_unreadable (hors soldes et agrégats)
+        c.execute('''
+            CREATE TABLE transactions_unreadable AS
+            SELECT * FROM transactions WHERE strftime('%s', timestamp) IS NULL
+        ''')
+        c.execute("SELECT COUNT(*) FROM transactions_unreadable")
+        unreadable = c.fetchone()[0]
+        if unreadable:
+            logger.warning("%d transaction(s) à l'horodatage illisible mise(s) à part "
+                           "dans transactions_unreadable", unreadable)
+            c.execute("DELETE FROM transactions WHERE strftime('%s', timestamp) IS NULL")
+        else:
+            c.execute("DROP TABLE transactions_unreadable")
+        cls._rebuild_transactions(
+            c, "CAST(strftime('%s', timestamp) AS INTEGER)", cls.utc_offset_minutes()
+        )
+        c.execute(
+            "INSERT OR REPLACE INTO settings (key, value) VALUES ('utc_offset_minutes', ?)",
+            (str(cls.utc_offset_minutes()),)
+        )
+        cls._rebuild_agent_balances(c)
+    
+    @classmethod
+    def _migration_8(cls, c):
+        """Table period_rollup (totaux par jour, semaine ISO, mois et année, par agent)"""
+        cls._create_period_rollup(c)
+        cls._rebuild_period_rollup(c)
+    
+    @classmethod
+    def _migration_9(cls, c):
+        """Suppression de daily_rollup (reportée dans _migration_10)"""
+        # Sans effet : conservée pour la numérotation des versions
+    
+    @classmethod
+    def _migration_10(cls, c):
+        """Dimension agent dans period_rollup (remplace daily_rollup)"""
+        # daily_rollup n'a jamais été livrée : supprimée des bases de
+        # développement qui l'ont encore
+        c.execute("DROP TABLE IF EXISTS daily_rollup")
+        # Bases créées avant que _migration_8 n'ait la colonne agent_id
+        c.execute("SELECT name FROM pragma_table_info('period_rollup')")
+        if 'agent_id' not in {name for name, in c.fetchall()}:
+            c.execute("DROP TABLE period_rollup")
+            cls._create_period_rollup(c)
+            cls._rebuild_period_rollup(c)
+    
+    @staticmethod
+    def _create_period_rollup(c):
+        # agent_id 0 : transactions sans agent
+        c.execute('''
+            CREATE TABLE period_rollup (
+                resolution TEXT NOT NULL,
+                period TEXT NOT NULL,
+                agent_id INTEGER NOT NULL,
+                operator_id INTEGER NOT NULL,
+                type_id INTEGER NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (resolution, period, agent_id, operator_id, type_id)
+            ) WITHOUT ROWID
+        ''')
+    
+    @classmethod
+    def _rebuild_transactions(cls, c, timestamp_sql, offset_minutes):
+        """Recrée transactions avec local_day décalé de offset_minutes
+        
+        Colonne générée : son expression fait partie du schéma, un autre
+        décalage impose de recopier la table. Les id et la séquence sont
+        conservés (séquence de synchronisation, voir sync.py).
+        """
+        c.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name='transactions'")
+        last_id = c.fetchone()[0]
+        c.execute(f'''
+            CREATE TABLE transactions_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                agent_id INTEGER,
+                operator_id INTEGER NOT NULL,
+                type_id INTEGER NOT NULL,
+                amount INTEGER NOT NULL,
+                timestamp INTEGER NOT NULL,
+                local_day TEXT GENERATED ALWAYS AS
+                    (date(timestamp + {int(offset_minutes) * 60}, 'unixepoch')) STORED,
+                device_id TEXT,
+                device_seq INTEGER,
+                FOREIGN KEY (agent_id) REFERENCES users(id),
+                FOREIGN KEY (operator_id) REFERENCES operators(id),
+                FOREIGN KEY (type_id) REFERENCES tx_types(id)
+            )
+        ''')
+        c.execute(f'''
+            INSERT INTO transactions_new
+                (id, agent_id, operator_id, type_id, amount, timestamp, device_id, device_seq)
+            SELECT id, agent_id, operator_id, type_id, amount, {timestamp_sql},
+                   device_id, device_seq
+            FROM transactions
+        ''')
+        c.execute("DROP TABLE transactions")
+        c.execute("ALTER TABLE transactions_new RENAME TO transactions")
+        c.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name='transactions'")
+        last_id = max(last_id, c.fetchone()[0])
+        c.execute("DELETE FROM sqlite_sequence WHERE name='transactions'")
+        c.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('transactions', ?)", (last_id,))
+        
+        # Historique d'un agent, puis de tous (pagination par (timestamp, id))
+        c.execute("CREATE INDEX idx_transactions_agent_time ON transactions (agent_id, timestamp)")
+        c.execute("CREATE INDEX idx_transactions_time ON transactions (timestamp)")
+        # Regroupements par jour local : parcours d'intervalle, sans table
+        c.execute('''
+            CREATE INDEX idx_transactions_day
+            ON transactions (local_day, operator_id, type_id, amount)
+        ''')
+        # Soldes (reconstruction, vérification)
+        c.execute('''
+            CREATE INDEX idx_transactions_agent_type
+            ON transactions (agent_id, type_id, amount)
+        ''')
+        # Exports filtrés par opérateur, dans l'ordre chronologique
+        c.execute('''
+            CREATE INDEX idx_transactions_operator
+            ON transactions (operator_id, timestamp)
+        ''')
+        c.execute('''
+            CREATE UNIQUE INDEX idx_transactions_device
+            ON transactions (device_id, device_seq)
+            WHERE device_id IS NOT NULL
+        ''')
+    
+    @classmethod
+    def _apply_utc_offset(cls, c):
+        """Adopte le décalage enregistré avec la base (sans reconstruction)"""
+        c.execute("SELECT value FROM settings WHERE key='utc_offset_minutes'")
+        row = c.fetchone()
+        if row is None:
+            offset = cls.utc_offset_minutes()
+            c.execute(
+                "INSERT INTO settings (key, value) VALUES ('utc_offset_minutes', ?)",
+                (str(offset),)
+            )
+        else:
+            offset = int(row[0])
+        cls._utc_offset = offset * 60
+    
+    @classmethod
+    def pending_utc_offset(cls):
+        """UTC_OFFSET_MINUTES explicite pas encore appliqué (None sinon)"""
+        if cls.UTC_OFFSET_MINUTES is None:
+            return None
+        offset = int(cls.UTC_OFFSET_MINUTES)
+        return offset if offset != cls.active_utc_offset() else None
+    
+    @classmethod
+    def set_utc_offset(cls, minutes, progress=None):
+        """Reconstruit local_day et les agrégats pour un nouveau décalage
+        
+        Réécrit tout le journal : à lancer dans un thread de travail.
+        progress(fraction) est appelé après chaque étape. Les écritures
+        des autres threads attendent la fin de la reconstruction
+        (rebuilding), même au-delà de busy_timeout.
+        """
+        steps = (
+            lambda c: cls._rebuild_transactions(c, 'timestamp', minutes),
+            cls._rebuild_period_rollup,
+        )
+        previous = cls._utc_offset
+        try:
+            with cls._rebuilding(), cls.transaction(write=True) as conn:
+                c = conn.cursor()
+                for done, step in enumerate(steps, 1):
+                    step(c)
+                    if progress:
+                        progress(done / len(steps))
+                c.execute(
+                    "INSERT OR REPLACE INTO settings (key, value) VALUES ('utc_offset_minutes', ?)",
+                    (str(int(minutes)),)
+                )
+                version = cls._read_data_version(c)
+                # Avant le commit, verrou d'écriture encore tenu : aucune
+                # insertion ne peut calculer ses jours avec l'ancien décalage
+                cls._utc_offset = int(minutes) * 60
+        except BaseException:
+            cls._utc_offset = previous
+            raise
+        cls._set_data_version(version)
+    
+    # -------------------------------------------------------------------------
+    # Paramètres
+    # -------------------------------------------------------------------------
+    
+    @classmethod
+    def get_setting(cls, key, default=None):
+        with cls.connection() as conn:
+            row = conn.execute("SELECT value FROM settings WHERE key=?", (key,)).fetchone()
+        return row[0] if row else default
+    
+    @classmethod
+    def set_setting(cls, key, value):
+        with cls.transaction(write=True) as conn:
+            conn.execute(
+                "INSERT INTO settings (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, str(value))
+            )
+    
+    # -------------------------------------------------------------------------
+    # Version des données
+    # -------------------------------------------------------------------------
+    
+    # Le journal n'est jamais modifié, seulement complété : le dernier id
+    # identifie l'état des données, y compris d'un lancement à l'autre
+    # (utilisé comme clé des caches de graphiques).
+    data_version = 0
+    _version_lock = threading.Lock()
+    
+    @staticmethod
+    def _read_data_version(c):
+        c.execute("SELECT COALESCE(MAX(id), 0) FROM transactions")
+        return c.fetchone()[0]
+    
+    @classmethod
+    def _set_data_version(cls, version):
+        # Appelé après le commit : un lecteur ne voit jamais une version
+        # dont les données ne sont pas encore visibles
+        with cls._version_lock:
+            cls.data_version = max(cls.data_version, version)
+    
+    # -------------------------------------------------------------------------
+    # Écriture des transactions et agrégats
+    # -------------------------------------------------------------------------
+    
+    @staticmethod
+    def _now():
+        """Horodatage courant (epoch UTC, secondes)"""
+        return int(time.time())
+    
+    # -------------------------------------------------------------------------
+    # Heure locale
+    # -------------------------------------------------------------------------
+    
+    # Décalage effectif (secondes), fixé par init_database
+    _utc_offset = 0
+    
+    @classmethod
+    def utc_offset_minutes(cls):
+        if cls.UTC_OFFSET_MINUTES is not None:
+            return int(cls.UTC_OFFSET_MINUTES)
+        return int(datetime.now().astimezone().utcoffset().total_seconds() // 60)
+    
+    @classmethod
+    def active_utc_offset(cls):
+        """Décalage (minutes) des colonnes local_day de la base ouverte"""
+        return cls._utc_offset // 60
+    
+    @classmethod
+    def local_day(cls, timestamp):
+        """Jour local AAAA-MM-JJ d'un horodatage (même calcul que local_day)"""
+        return time.strftime('%Y-%m-%d', time.gmtime(timestamp + cls._utc_offset))
+    
+    @classmethod
+    def local_time(cls, timestamp):
+        """Heure locale AAAA-MM-JJ HH:MM:SS d'un horodatage"""
+        return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(timestamp + cls._utc_offset))
+    
+    @classmethod
+    def local_today(cls):
+        return date.fromisoformat(cls.local_day(cls._now()))
+    
+    @classmethod
+    def local_epoch(cls, year, month, day, hour=0, minute=0, second=0):
+        """Horodatage (epoch UTC) d'une date et heure locales"""
+        return calendar.timegm((year, month, day, hour, minute, second)) - cls._utc_offset
+    
+    @classmethod
+    def _day_start(cls, day):
+        """Début (epoch UTC) d'un jour local AAAA-MM-JJ ou date"""
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        return cls.local_epoch(day.year, day.month, day.day)
+    
+    @staticmethod
+    def parse_utc(text):
+        """'AAAA-MM-JJ HH:MM:SS' (UTC, ancien format) -> epoch"""
+        return calendar.timegm(time.strptime(str(text).strip(), '%Y-%m-%d %H:%M:%S'))
+    
+    # -------------------------------------------------------------------------
+    # Périodes (agrégats multi-résolution)
+    # -------------------------------------------------------------------------
+    
+    # De la plus fine à la plus grossière. Clés de période (jours locaux),
+    # triables comme du texte : 2026-10-16, 2026-W42, 2026-10, 2026
+    RESOLUTIONS = ('day', 'week', 'month', 'year')
+    
+    @staticmethod
+    def period_key(resolution, day):
+        if resolution == 'day':
+            return day.isoformat()
+        if resolution == 'week':
+            year, week, _ = day.isocalendar()
+            return f'{year}-W{week:02d}'
+        if resolution == 'month':
+            return f'{day.year}-{day.month:02d}'
+        return str(day.year)
+    
+    @staticmethod
+    def period_start(resolution, day):
+        """Premier jour de la période qui contient day"""
+        if resolution == 'week':
+            return day - timedelta(days=day.weekday())
+        if resolution == 'month':
+            return day.replace(day=1)
+        if resolution == 'year':
+            return day.replace(month=1, day=1)
+        return day
+    
+    @staticmethod
+    def period_end(resolution, day):
+        """Dernier jour de la période qui commence à day"""
+        if resolution == 'week':
+            return day + timedelta(days=6)
+        if resolution == 'month':
+            return (day + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        if resolution == 'year':
+            return day.replace(month=12, day=31)
+        return day
+    
+    @classmethod
+    def periods(cls, resolution, start, end):
+        """Périodes [(clé, premier jour)] qui couvrent start..end inclus"""
+        result = []
+        day = cls.period_start(resolution, start)
+        while day <= end:
+            result.append((cls.period_key(resolution, day), day))
+            day = cls.period_end(resolution, day) + timedelta(days=1)
+        return result
+    
+    @classmethod
+    def plan_resolution(cls, start, end, max_points):
+        """Résolution la plus fine dont le nombre de périodes sur
+        start..end tient dans max_points (largeur du graphique)"""
+        days = (end - start).days + 1
+        # Estimation d'abord : inutile d'énumérer dix ans de jours
+        estimates = {'day': days, 'week': days / 7 + 1, 'month': days / 28 + 1,
+                     'year': days / 365 + 1}
+        for resolution in cls.RESOLUTIONS:
+            if estimates[resolution] <= max_points * 2 and \
+                    len(cls.periods(resolution, start, end)) <= max_points:
+                return resolution
+        return cls.RESOLUTIONS[-1]
+    
+    @staticmethod
+    def _to_xof(amount):
+        """Montant saisi en XOF entiers (le franc CFA n'a pas de subdivision
+        en usage) ; une fraction est refusée, jamais arrondie"""
+        try:
+            xof = int(amount)
+        except OverflowError as e:  # inf
+            raise ValueError(f'Montant invalide: {amount}') from e
+        if xof != amount:
+            raise ValueError(f'Montant non entier: {amount}')
+        return xof
+    
+    @staticmethod
+    def round_xof(amount):
+        """Montant hérité (REAL, avant la version 6) -> XOF entiers
+        
+        Seule règle d'arrondi : au franc, la demie vers le haut (1000,5 ->
+        1001), pour _migration_6 comme pour les appareils pas encore mis
+        à jour.
+        """
+        try:
+            return int(Decimal(str(amount)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+        except InvalidOperation as e:
+            raise ValueError(f'Montant invalide: {amount}') from e
+    
+    # Tables de référence (operators, tx_types) : nom -> id, par table
+    _references = {}
+    
+    @classmethod
+    def _reference_ids(cls, c, table, names):
+        """nom -> id dans une table de référence ; les noms inconnus sont ajoutés"""
+        known = cls._references.get(table)
+        if known is None:
+            c.execute(f"SELECT name, id FROM {table}")
+            known = cls._references[table] = dict(c.fetchall())
+        ids = {}
+        for name in names:
+            if name in known:
+                ids[name] = known[name]
+                continue
+            # Pas mis en cache : la transaction peut encore être annulée
+            c.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (name,))
+            c.execute(f"SELECT id FROM {table} WHERE name=?", (name,))
+            ids[name] = c.fetchone()[0]
+        return ids
+    
+    @classmethod
+    def _insert_transactions(cls, c, rows, origins=None):
+        """Insère des lignes (agent_id, operator, type, amount, timestamp)
+        
+        operator et type sont des noms, traduits en id des tables de
+        référence ; origins : (device_id, device_seq) de chaque ligne, pour
+        la base centrale. Les agrégats sont mis à jour dans la même
+        transaction : ils ne peuvent pas diverger du journal.
+        """
+        operators = cls._reference_ids(c, 'operators', {row[1] for row in rows})
+        types = cls._reference_ids(c, 'tx_types', {row[2] for row in rows})
+        rows = [
+            (agent_id, operator, trans_type, cls._to_xof(amount), timestamp)
+            for agent_id, operator, trans_type, amount, timestamp in rows
+        ]
+        encoded = [
+            (agent_id, operators[operator], types[trans_type], amount, timestamp)
+            for agent_id, operator, trans_type, amount, timestamp in rows
+        ]
+        c.executemany('''
+            INSERT INTO transactions
+                (agent_id, operator_id, type_id, amount, timestamp, device_id, device_seq)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            row + origin for row, origin in zip(encoded, origins or [(None, None)] * len(rows))
+        ])
+        cls._update_agent_balances(c, rows)
+        cls._update_period_rollup(c, encoded)
+    
+    @classmethod
+    def _update_agent_balances(cls, c, rows):
+        # Regroupement par agent : un seul UPSERT par agent et par lot
+        totals = {}
+        for agent_id, _operator, trans_type, amount, timestamp in rows:
+            if agent_id is None:
+                continue
+            deposits, withdrawals, count, last = totals.get(agent_id, (0, 0, 0, timestamp))
+            if trans_type == 'Dépôt':
+                deposits += amount
+            elif trans_type == 'Retrait':
+                withdrawals += amount
+            totals[agent_id] = (deposits, withdrawals, count + 1, max(last, timestamp))
+        
+        c.executemany('''
+            INSERT INTO agent_balances
+                (agent_id, deposits, withdrawals, balance, count, last_tx_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (agent_id) DO UPDATE SET
+                deposits = deposits + excluded.deposits,
+                withdrawals = withdrawals + excluded.withdrawals,
+                balance = balance + excluded.balance,
+                count = count + excluded.count,
+                last_tx_at = MAX(COALESCE(last_tx_at, 0), excluded.last_tx_at)
+        ''', [
+            (agent_id, dep, wd, dep - wd, count, last)
+            for agent_id, (dep, wd, count, last) in totals.items()
+        ])
+    
+    @classmethod
+    def _update_period_rollup(cls, c, rows):
+        """rows : (agent_id, operator_id, type_id, amount, timestamp) ;
+        agent_id 0 pour une ligne sans agent"""
+        offset = cls._utc_offset
+        days, totals = {}, {}
+        for agent_id, operator_id, type_id, amount, timestamp in rows:
+            number = (timestamp + offset) // 86400
+            day = days.get(number)
+            if day is None:
+                day = days[number] = cls.local_day(timestamp)
+            key = (day, agent_id or 0, operator_id, type_id)
+            total, count = totals.get(key, (0, 0))
+            totals[key] = (total + amount, count + 1)
+        
+        c.executemany('''
+            INSERT INTO period_rollup
+                (resolution, period, agent_id, operator_id, type_id, total, count)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (resolution, period, agent_id, operator_id, type_id) DO UPDATE SET
+                total = total + excluded.total,
+                count = count + excluded.count
+        ''', cls._roll_up(totals))
+    
+    @classmethod
+    def _roll_up(cls, day_totals):
+        """{(jour, agent_id, operator_id, type_id): (total, count)} ->
+        lignes de period_rollup pour chaque résolution"""
+        totals = {}
+        periods = {}
+        for (day, agent_id, operator_id, type_id), (total, count) in day_totals.items():
+            keys = periods.get(day)
+            if keys is None:
+                start = date.fromisoformat(day)
+                keys = periods[day] = [
+                    (resolution, cls.period_key(resolution, start))
+                    for resolution in cls.RESOLUTIONS
+                ]
+            for resolution, period in keys:
+                key = (resolution, period, agent_id, operator_id, type_id)
+                previous_total, previous_count = totals.get(key, (0, 0))
+                totals[key] = (previous_total + total, previous_count + count)
+        return [key + value for key, value in totals.items()]
+    
+    @classmethod
+    def _rebuild_period_rollup(cls, c):
+        # Jours par agent lus dans le journal, niveaux supérieurs
+        # calculés à partir des jours
+        c.execute("DELETE FROM period_rollup")
+        c.execute('''
+            SELECT local_day, COALESCE(agent_id, 0), operator_id, type_id,
+                   SUM(amount), COUNT(*)
+            FROM transactions
+            GROUP BY local_day, agent_id, operator_id, type_id
+        ''')
+        day_totals = {
+            (day, agent_id, operator_id, type_id): (total, count)
+            for day, agent_id, operator_id, type_id, total, count in c.fetchall()
+        }
+        c.executemany('''
+            INSERT INTO period_rollup
+                (resolution, period, agent_id, operator_id, type_id, total, count)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', cls._roll_up(day_totals))
+    
+    @classmethod
+    def rebuild_period_rollup(cls):
+        """Recalcule period_rollup à partir du journal"""
+        with cls.transaction(write=True) as conn:
+            cls._rebuild_period_rollup(conn.cursor())
+    
+    @classmethod
+    def _rebuild_agent_balances(cls, c):
+        c.execute("DELETE FROM agent_balances")
+        c.execute('''
+            INSERT INTO agent_balances
+                (agent_id, deposits, withdrawals, balance, count, last_tx_at)
+            SELECT
+                t.agent_id,
+                SUM(CASE WHEN y.name='Dépôt' THEN t.amount ELSE 0 END),
+                SUM(CASE WHEN y.name='Retrait' THEN t.amount ELSE 0 END),
+                SUM(CASE WHEN y.name='Dépôt' THEN t.amount
+                         WHEN y.name='Retrait' THEN -t.amount ELSE 0 END),
+                COUNT(*),
+                MAX(t.timestamp)
+            FROM transactions t
+            JOIN tx_types y ON y.id = t.type_id
+            WHERE t.agent_id IS NOT NULL
+            GROUP BY t.agent_id
+        ''')
+    
+    @classmethod
+    def rebuild_agent_balances(cls):
+        """Recalcule agent_balances à partir du journal des transactions"""
+        with cls.transaction(write=True) as conn:
+            cls._rebuild_agent_balances(conn.cursor())
+    
+    @classmethod
+    def verify_agent_balances(cls, repair=False):
+        """Compare agent_balances au journal
+        
+        Retourne la liste des agent_id divergents ; avec repair=True la
+        table est reconstruite si une divergence est trouvée.
+        """
+        with cls.transaction(write=True) as conn:
+            c = conn.execute('''
+                SELECT
+                    l.agent_id,
+                    l.deposits, l.withdrawals, l.count,
+                    b.deposits, b.withdrawals, b.count
+                FROM (
+                    SELECT
+                        t.agent_id,
+                        SUM(CASE WHEN y.name='Dépôt' THEN t.amount ELSE 0 END) AS deposits,
+                        SUM(CASE WHEN y.name='Retrait' THEN t.amount ELSE 0 END) AS withdrawals,
+                        COUNT(*) AS count
+                    FROM transactions t
+                    JOIN tx_types y ON y.id = t.type_id
+                    WHERE t.agent_id IS NOT NULL
+                    GROUP BY t.agent_id
+                ) l
+                LEFT JOIN agent_balances b ON b.agent_id = l.agent_id
+                UNION ALL
+                SELECT b.agent_id, 0, 0, 0, b.deposits, b.withdrawals, b.count
+                FROM agent_balances b
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM transactions t WHERE t.agent_id = b.agent_id
+                )
+            ''')
+            # Montants entiers : comparaison exacte
+            mismatches = [
+                row[0] for row in c.fetchall()
+                if row[4] is None or row[1:4] != (row[4], row[5], row[6])
+            ]
+            if mismatches and repair:
+                cls._rebuild_agent_balances(conn.cursor())
+        return mismatches
+    
+    # -------------------------------------------------------------------------
+    # Utilisateurs
+    # -------------------------------------------------------------------------
+    
+    # Mots de passe : PBKDF2-HMAC-SHA256, sel aléatoire par utilisateur,
+    # stockés sous la forme pbkdf2_sha256$itérations$sel$empreinte.
+    # Le nombre d'itérations est calibré une fois par appareil pour viser
+    # PASSWORD_TARGET_MS, sans descendre sous PASSWORD_MIN_ITERATIONS.
+    # Les anciennes empreintes sha256 (sans sel) et celles calculées avec
+    # moins d'itérations sont remplacées à la connexion suivante.
+    PASSWORD_ALGORITHM = 'pbkdf2_sha256'
+    PASSWORD_MIN_ITERATIONS = 600000
+    PASSWORD_TARGET_MS = 500
+    PASSWORD_SALT_BYTES = 16
+    
+    _iterations = None
+    
+    # Vérifications réussies récentes : HMAC(clé de session, identifiants)
+    # -> empreinte stockée. Ni le mot de passe ni un dérivé réutilisable
+    # hors du processus ne sont conservés.
+    _session_key = os.urandom(32)
+    _verified = OrderedDict()
+    _verified_lock = threading.Lock()
+    VERIFIED_CACHE_SIZE = 32
+    
+    @classmethod
+    def calibrate_iterations(cls, target_ms=None, probe=20000):
+        """Itérations PBKDF2 qui prennent environ target_ms sur cet appareil"""
+        target_ms = cls.PASSWORD_TARGET_MS if target_ms is None else target_ms
+        started = time.perf_counter()
+        hashlib.pbkdf2_hmac('sha256', b'calibration', os.urandom(16), probe)
+        elapsed_ms = max((time.perf_counter() - started) * 1000, 0.001)
+        calibrated = int(probe * target_ms / elapsed_ms) // 1000 * 1000
+        return max(cls.PASSWORD_MIN_ITERATIONS, calibrated)
+    
+    @classmethod
+    def password_iterations(cls):
+        """Coût courant (settings), calibré au premier appel sur l'appareil"""
+        if cls._iterations is None:
+            stored = cls.get_setting('pbkdf2_iterations')
+            if stored is None:
+                stored = cls.calibrate_iterations()
+                cls.set_setting('pbkdf2_iterations', stored)
+            cls._iterations = max(cls.PASSWORD_MIN_ITERATIONS, int(stored))
+        return cls._iterations
+    
+    @classmethod
+    def hash_password(cls, password, iterations=None):
+        iterations = iterations or cls.password_iterations()
+        salt = os.urandom(cls.PASSWORD_SALT_BYTES)
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+        return f'{cls.PASSWORD_ALGORITHM}${iterations}${salt.hex()}${digest.hex()}'
+    
+    @classmethod
+    def verify_password(cls, password, stored):
+        """Retourne (valide, à_mettre_à_niveau) ; opération coûteuse"""
+        if '$' not in stored:
+            # Ancienne empreinte sha256 sans sel
+            legacy = hashlib.sha256(password.encode()).hexdigest()
+            return hmac.compare_digest(legacy, stored), True
+        try:
+            algorithm, iterations, salt, expected = stored.split('$')
+            iterations = int(iterations)
+            salt = bytes.fromhex(salt)
+        except ValueError:
+            return False, False
+        if algorithm != cls.PASSWORD_ALGORITHM:
+            return False, False
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations).hex()
+        valid = hmac.compare_digest(digest, expected)
+        return valid, valid and iterations < cls.password_iterations()
+    
+    @classmethod
+    def _dummy_hash(cls):
+        """Empreinte au coût courant qui ne correspond à aucun mot de passe"""
+        salt = bytes(cls.PASSWORD_SALT_BYTES).hex()
+        return f'{cls.PASSWORD_ALGORITHM}${cls.password_iterations()}${salt}${"0" * 64}'
+    
+    @classmethod
+    def _credentials_key(cls, username, password):
+        message = username.encode() + b'\0' + password.encode()
+        return hmac.new(cls._session_key, message, hashlib.sha256).digest()
+    
+    @classmethod
+    def _remember_verified(cls, key, stored):
+        with cls._verified_lock:
+            cls._verified[key] = stored
+            cls._verified.move_to_end(key)
+            while len(cls._verified) > cls.VERIFIED_CACHE_SIZE:
+                cls._verified.popitem(last=False)
+    
+    @classmethod
+    def add_user(cls, username, password, role):
+        # Hachage hors transaction : le verrou d'écriture n'est pas tenu
+        # pendant le calcul
+        hashed = cls.hash_password(password)
+        try:
+            with cls.transaction(write=True) as conn:
+                conn.execute(
+                    "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+                    (username, hashed, role)
+                )
+            return True
+        except sqlite3.IntegrityError:
+            return False
+    
+    @classmethod
+    def get_user(cls, username, password):
+        """Utilisateur (id, username, password, role, ...) ou None
+        
+        Coûteux (PBKDF2) : à appeler hors du thread de l'interface. Une
+        reconnexion avec les mêmes identifiants pendant la session est
+        vérifiée sans recalcul, tant que l'empreinte stockée est inchangée.
+        """
+        with cls.connection() as conn:
+            user = conn.execute(
+                "SELECT * FROM users WHERE username=?", (username,)
+            ).fetchone()
+        if user is None:
+            # Même coût que pour un compte existant : le temps de réponse
+            # ne révèle pas quels noms d'utilisateur existent
+            cls.verify_password(password, cls._dummy_hash())
+            return None
+        
+        stored = user[2]
+        key = cls._credentials_key(username, password)
+        with cls._verified_lock:
+            cached = cls._verified.get(key)
+        if cached is not None and hmac.compare_digest(cached, stored):
+            return user
+        
+        valid, upgrade = cls.verify_password(password, stored)
+        if not valid:
+            return None
+        if upgrade:
+            stored = cls.hash_password(password)
+            with cls.transaction(write=True) as conn:
+                conn.execute(
+                    "UPDATE users SET password=? WHERE id=?", (stored, user[0])
+                )
+            user = (user[0], user[1], stored) + tuple(user[3:])
+        cls._remember_verified(key, stored)
+        return user
+    
+    @classmethod
+    def get_all_agents(cls):
+        with cls.connection() as conn:
+            c = conn.execute(
+                "SELECT id, username FROM users WHERE role='agent' ORDER BY username"
+            )
+            return c.fetchall()
+    
+    @classmethod
+    def record_transaction(cls, agent_id, operator, trans_type, amount):
+        """Enregistre une transaction ; retourne après le commit
+        
+        Avec le regroupement des commits activé, la ligne part dans le
+        prochain groupe et l'appel bloque jusqu'à son écriture.
+        """
+        # Vérifié avant le regroupement : une ligne refusée ne doit pas
+        # faire échouer tout le groupe
+        row = (agent_id, operator, trans_type, cls._to_xof(amount), cls._now())
+        writer = cls._writer
+        if writer is not None:
+            writer.submit(row).result()
+        else:
+            cls.record_transactions([row])
+    
+    @classmethod
+    def enable_group_commit(cls, max_delay=None, max_batch=None):
+        """Active le regroupement des record_transaction (GroupCommitWriter)"""
+        if cls._writer is None:
+            cls._writer = GroupCommitWriter(
+                cls.record_transactions,
+                max_delay=cls.GROUP_COMMIT_DELAY if max_delay is None else max_delay,
+                max_batch=cls.GROUP_COMMIT_BATCH if max_batch is None else max_batch
+            )
+        return cls._writer
+    
+    @classmethod
+    def disable_group_commit(cls):
+        """Écrit les lignes en attente et revient à un commit par appel"""
+        writer, cls._writer = cls._writer, None
+        if writer is not None:
+            writer.close()
+    
+    @classmethod
+    def record_transactions(cls, rows):
+        """Insère un lot (agent_id, operator, type, amount, timestamp)
+        
+        Un seul executemany et un seul commit pour tout le lot.
+        """
+        with cls.transaction(write=True) as conn:
+            c = conn.cursor()
+            cls._insert_transactions(c, rows)
+            version = cls._read_data_version(c)
+        cls._set_data_version(version)
+        return len(rows)
+    
+    # -------------------------------------------------------------------------
+    # Chargement centralisé (lots reçus des appareils)
+    # -------------------------------------------------------------------------
+    
+    @staticmethod
+    def central_username(device_id, username):
+        """Compte central d'un agent d'appareil : « device_id/username »
+        
+        Deux appareils peuvent avoir chacun leur « ali » ou leur « admin »
+        local : préfixés par l'appareil, ils ne sont ni fusionnés entre
+        eux ni confondus avec les comptes du siège. device_id ne contient
+        pas de « / » (voir server.py).
+        """
+        return f'{device_id}/{username}'
+    
+    @staticmethod
+    def _agent_ids(c, usernames):
+        """username -> id ; les agents inconnus de la base sont créés"""
+        usernames = [name for name in usernames if name]
+        agents = {}
+        for start in range(0, len(usernames), 500):
+            chunk = usernames[start:start + 500]
+            c.execute(
+                f"SELECT username, id FROM users WHERE username IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            agents.update(c.fetchall())
+        # Compte créé par la synchronisation : '!' n'est l'empreinte
+        # d'aucun mot de passe, la connexion reste impossible
+        missing = [name for name in usernames if name not in agents]
+        for name in missing:
+            c.execute(
+                "INSERT INTO users (username, password, role) VALUES (?, '!', 'agent')",
+                (name,)
+            )
+            agents[name] = c.lastrowid
+        return agents
+    
+    @classmethod
+    def device_last_seq(cls, device_id):
+        """Dernier seq chargé pour un appareil (0 si aucun)"""
+        with cls.connection() as conn:
+            return conn.execute(
+                "SELECT COALESCE(MAX(device_seq), 0) FROM transactions WHERE device_id=?",
+                (device_id,)
+            ).fetchone()[0]
+    
+    @classmethod
+    def ingest_transactions(cls, batches):
+        """Charge des lots reçus des appareils, tous dans une transaction
+        
+        batches : [(device_id, rows)], rows en (seq, timestamp, agent,
+        operator, type, amount) comme envoyées par sync.SyncClient. Les
+        lignes déjà chargées (même device_id et seq) sont ignorées. Les
+        agents sont rattachés à leur compte central (central_username).
+        Retourne, par lot, (acceptées, doublons, dernier seq de l'appareil).
+        """
+        with cls.transaction(write=True) as conn:
+            c = conn.cursor()
+            agents = cls._agent_ids(c, {
+                cls.central_username(device_id, row[2])
+                for device_id, rows in batches for row in rows if row[2]
+            })
+            inserted, origins, counts = [], [], []
+            for device_id, rows in batches:
+                known = set()
+                if rows:
+                    seqs = [row[0] for row in rows]
+                    c.execute('''
+                        SELECT device_seq FROM transactions
+                        WHERE device_id=? AND device_seq BETWEEN ? AND ?
+                    ''', (device_id, min(seqs), max(seqs)))
+                    known = {seq for seq, in c.fetchall()}
+                fresh = 0
+                for seq, timestamp, agent, operator, trans_type, amount in rows:
+                    if seq in known:
+                        continue
+                    known.add(seq)
+                    agent_id = agents[cls.central_username(device_id, agent)] if agent else None
+                    inserted.append((agent_id, operator, trans_type, amount, timestamp))
+                    origins.append((device_id, seq))
+                    fresh += 1
+                counts.append((device_id, fresh, len(rows) - fresh))
+            
+            cls._insert_transactions(c, inserted, origins)
+            
+            results = []
+            for device_id, accepted, duplicates in counts:
+                c.execute(
+                    "SELECT COALESCE(MAX(device_seq), 0) FROM transactions WHERE device_id=?",
+                    (device_id,)
+                )
+                results.append((accepted, duplicates, c.fetchone()[0]))
+            version = cls._read_data_version(c)
+        cls._set_data_version(version)
+        return results
+    
+    @classmethod
+    def get_transactions_by_agent(cls, agent_id):
+        with cls.connection() as conn:
+            c = conn.execute('''
+                SELECT o.name, y.name, t.amount, t.timestamp
+                FROM transactions t
+                JOIN operators o ON o.id = t.operator_id
+                JOIN tx_types y ON y.id = t.type_id
+                WHERE t.agent_id=?
+                ORDER BY t.timestamp DESC
+            ''', (agent_id,))
+            return c.fetchall()
+    
+    @classmethod
+    def get_all_transactions(cls):
+        with cls.connection() as conn:
+            c = conn.execute('''
+                SELECT o.name, y.name, t.amount, t.timestamp, u.username
+                FROM transactions t
+                JOIN users u ON t.agent_id = u.id
+                JOIN operators o ON o.id = t.operator_id
+                JOIN tx_types y ON y.id = t.type_id
+                ORDER BY t.timestamp DESC
+            ''')
+            return c.fetchall()
+    
+    @classmethod
+    def _transaction_filters(cls, start=None, end=None, agent_id=None, operator=None):
+        """Clause WHERE (et paramètres) ; start / end : jours locaux
+        AAAA-MM-JJ inclus, traduits en bornes d'horodatage (index)"""
+        clauses, params = [], []
+        if start:
+            clauses.append('t.timestamp >= ?')
+            params.append(cls._day_start(start))
+        if end:
+            clauses.append('t.timestamp < ?')
+            params.append(cls._day_start(end) + 86400)
+        if agent_id is not None:
+            clauses.append('t.agent_id = ?')
+            params.append(agent_id)
+        if operator:
+            clauses.append('t.operator_id = (SELECT id FROM operators WHERE name = ?)')
+            params.append(operator)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        return where, params
+    
+    @classmethod
+    def count_transactions(cls, start=None, end=None, agent_id=None, operator=None):
+        where, params = cls._transaction_filters(start, end, agent_id, operator)
+        with cls.connection() as conn:
+            return conn.execute(
+                f'SELECT COUNT(*) FROM transactions t {where}', params
+            ).fetchone()[0]
+    
+    @classmethod
+    def iter_transactions(cls, start=None, end=None, agent_id=None, operator=None,
+                          batch_size=5000):
+        """Produit par lots (timestamp, username, operator, type, amount)
+        
+        timestamp : epoch UTC (voir local_time pour l'affichage).
+        
+        Ordre chronologique, lu au fil du curseur SQLite (fetchmany) : la
+        mémoire ne dépend que de batch_size, pas du nombre de lignes.
+        """
+        where, params = cls._transaction_filters(start, end, agent_id, operator)
+        with cls.connection() as conn:
+            c = conn.execute(f'''
+                SELECT t.timestamp, u.username, o.name, y.name, t.amount
+                FROM transactions t
+                LEFT JOIN users u ON t.agent_id = u.id
+                JOIN operators o ON o.id = t.operator_id
+                JOIN tx_types y ON y.id = t.type_id
+                {where}
+                ORDER BY t.timestamp, t.id
+            ''', params)
+            try:
+                while True:
+                    rows = c.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                c.close()
+    
+    @classmethod
+    def get_transactions_page(cls, agent_id=None, after_timestamp=None,
+                              after_id=None, limit=None, newer=False):
+        """Page de l'historique, de la plus récente à la plus ancienne
+        
+        Pagination par curseur : passer le (timestamp, id) de la dernière
+        ligne reçue pour obtenir la page suivante (plus ancienne), ou celui
+        de la première ligne avec newer=True pour la page précédente. Le
+        coût d'une page ne dépend pas de sa position dans l'historique.
+        
+        Retourne des lignes (id, operator, type, amount, timestamp, username),
+        timestamp en epoch UTC : le curseur est (timestamp, id) tel quel.
+        """
+        where, params = [], []
+        if agent_id is not None:
+            where.append('t.agent_id = ?')
+            params.append(agent_id)
+        if after_timestamp is not None:
+            where.append('(t.timestamp, t.id) {} (?, ?)'.format('>' if newer else '<'))
+            params.extend([after_timestamp, after_id])
+        params.append(limit or cls.PAGE_SIZE)
+        order = 'ASC' if newer else 'DESC'
+        
+        with cls.connection() as conn:
+            c = conn.execute('''
+                SELECT t.id, o.name, y.name, t.amount, t.timestamp, u.username
+                FROM transactions t
+                LEFT JOIN users u ON t.agent_id = u.id
+                JOIN operators o ON o.id = t.operator_id
+                JOIN tx_types y ON y.id = t.type_id
+                {}
+                ORDER BY t.timestamp {order}, t.id {order}
+                LIMIT ?
+            '''.format('WHERE ' + ' AND '.join(where) if where else '', order=order), params)
+            rows = c.fetchall()
+        
+        if newer:
+            rows.reverse()
+        return rows
+    
+    @classmethod
+    def _read_periods(cls, resolution, first, last, agent_id=None, by_operator=True):
+        """Lignes (period, operator, type, total, count) de period_rollup,
+        tous agents confondus ou pour agent_id ; sans by_operator,
+        (period, type, total, count) : opérateurs additionnés par SQLite"""
+        agent_filter = '' if agent_id is None else 'AND r.agent_id = ?'
+        params = (resolution, first, last) + (() if agent_id is None else (agent_id,))
+        with cls.connection() as conn:
+            if by_operator:
+                c = conn.execute(f'''
+                    SELECT r.period, o.name, y.name, SUM(r.total), SUM(r.count)
+                    FROM period_rollup r
+                    JOIN operators o ON o.id = r.operator_id
+                    JOIN tx_types y ON y.id = r.type_id
+                    WHERE r.resolution = ? AND r.period BETWEEN ? AND ? {agent_filter}
+                    GROUP BY r.period, r.operator_id, r.type_id
+                    ORDER BY r.period, o.name, y.name
+                ''', params)
+            else:
+                c = conn.execute(f'''
+                    SELECT r.period, y.name, SUM(r.total), SUM(r.count)
+                    FROM period_rollup r
+                    JOIN tx_types y ON y.id = r.type_id
+                    WHERE r.resolution = ? AND r.period BETWEEN ? AND ? {agent_filter}
+                    GROUP BY r.period, r.type_id
+                    ORDER BY r.period, y.name
+                ''', params)
+            return c.fetchall()
+    
+    @classmethod
+    def get_daily_summary(cls, days=7, agent_id=None):
+        """Totaux par jour, opérateur et type (period_rollup, jours locaux),
+        tous agents confondus ou pour agent_id"""
+        today = cls.local_today()
+        rows = cls._read_periods(
+            'day', (today - timedelta(days=int(days))).isoformat(), today.isoformat(), agent_id
+        )
+        rows.sort(key=lambda row: row[0], reverse=True)
+        return rows
+    
+    @classmethod
+    def first_day(cls):
+        """Premier jour local avec des transactions (None si aucune)"""
+        with cls.connection() as conn:
+            row = conn.execute(
+                "SELECT MIN(period) FROM period_rollup WHERE resolution = 'day'"
+            ).fetchone()
+        return date.fromisoformat(row[0]) if row[0] else None
+    
+    @classmethod
+    def get_period_summary(cls, start=None, end=None, max_points=60, resolution=None,
+                           agent_id=None, by_operator=True):
+        """Totaux par période sur start..end (dates locales incluses), tous
+        agents confondus ou pour agent_id
+        
+        Sans resolution, plan_resolution choisit la plus fine qui tient
+        dans max_points : une année sur un téléphone se lit en 12 ou 53
+        lignes pré-agrégées. Les totaux s'arrêtent exactement aux bornes :
+        la première et la dernière période, si elles débordent, sont
+        recalculées à partir des jours. Retourne {'resolution', 'periods':
+        [(clé, premier jour dans start..end)], 'rows': [(period, operator,
+        type, total, count)]}, vide si start > end (bornes inversées, ou
+        données toutes postérieures à aujourd'hui). Sans by_operator, les
+        lignes sont (period, type, total, count), regroupées par SQLite.
+        """
+        end = end or cls.local_today()
+        start = start or cls.first_day() or end
+        if start > end:
+            return {'resolution': resolution or cls.RESOLUTIONS[0], 'periods': [], 'rows': []}
+        resolution = resolution or cls.plan_resolution(start, end, max_points)
+        periods = cls.periods(resolution, start, end)
+        
+        rows, full = [], []
+        for key, first in periods:
+            if first >= start and cls.period_end(resolution, first) <= end:
+                full.append(key)
+            else:
+                rows += cls._read_partial_period(resolution, key, max(first, start),
+                                                 min(cls.period_end(resolution, first), end),
+                                                 agent_id, by_operator)
+        if full:
+            rows += cls._read_periods(resolution, full[0], full[-1], agent_id, by_operator)
+        rows.sort(key=lambda row: row[:-2])
+        
+        periods[0] = (periods[0][0], max(periods[0][1], start))
+        return {'resolution': resolution, 'periods': periods, 'rows': rows}
+    
+    @classmethod
+    def _read_partial_period(cls, resolution, key, first, last, agent_id=None,
+                             by_operator=True):
+        """Lignes de la période key limitées aux jours first..last"""
+        totals = {}
+        for row in cls._read_periods('day', first.isoformat(), last.isoformat(),
+                                     agent_id, by_operator):
+            names, total, count = row[1:-2], row[-2], row[-1]
+            previous_total, previous_count = totals.get(names, (0, 0))
+            totals[names] = (previous_total + total, previous_count + count)
+        return [(key,) + names + value for names, value in totals.items()]
+    
+    @classmethod
+    def get_operator_summary(cls, start=None, end=None, by_type=True):
+        """Totaux par opérateur et type (period_rollup), regroupés par SQLite
+        
+        Sans bornes, lus dans les lignes annuelles ; avec start et end
+        (dates locales incluses), dans les lignes journalières. Sans
+        by_type : (operator, total, count) par opérateur.
+        """
+        if start is None and end is None:
+            where, params = "resolution = 'year'", ()
+        else:
+            end = end or cls.local_today()
+            start = start or cls.first_day() or end
+            where = "resolution = 'day' AND period BETWEEN ? AND ?"
+            params = (start.isoformat(), end.isoformat())
+        type_column, type_join, type_group = (
+            (', y.name', 'JOIN tx_types y ON y.id = r.type_id', ', type_id') if by_type
+            else ('', '', '')
+        )
+        with cls.connection() as conn:
+            c = conn.execute(f'''
+                SELECT o.name{type_column}, r.total, r.count
+                FROM (
+                    SELECT operator_id{type_group},
+                           SUM(total) AS total, SUM(count) AS count
+                    FROM period_rollup
+                    WHERE {where}
+                    GROUP BY operator_id{type_group}
+                ) r
+                JOIN operators o ON o.id = r.operator_id
+                {type_join}
+                ORDER BY o.name{type_column}
+            ''', params)
+            return c.fetchall()
+    
+    @classmethod
+    def get_agent_balances(cls):
+        """Soldes de tous les agents : (username, deposits, withdrawals,
+        balance, count, last_tx_at)"""
+        with cls.connection() as conn:
+            c = conn.execute('''
+                SELECT u.username, b.deposits, b.withdrawals, b.balance, b.count, b.last_tx_at
+                FROM agent_balances b
+                JOIN users u ON u.id = b.agent_id
+                ORDER BY u.username
+            ''')
+            return c.fetchall()
+    
+    @classmethod
+    def get_agent_balance(cls, agent_id):
+        """Solde d'un agent lu dans agent_balances (O(1))"""
+        with cls.connection() as conn:
+            c = conn.execute('''
+                SELECT deposits, withdrawals, balance, count, last_tx_at
+                FROM agent_balances
+                WHERE agent_id=?
+            ''', (agent_id,))
+            result = c.fetchone()
+        
+        if result is None:
+            return {
+                'deposits': 0,
+                'withdrawals': 0,
+                'balance': 0,
+                'count': 0,
+                'last_tx_at': None
+            }
+        deposits, withdrawals, balance, count, last_tx_at = result
+        return {
+            'deposits': deposits,
+            'withdrawals': withdrawals,
+            'balance': balance,
+            'count': count,
+            'last_tx_at': last_tx_at
+        }
+
+# =============================================================================
+# IMPORTATION DE RELEVÉS (EXCEL / CSV)
+# =============================================================================
+
+class TransactionImporter:
+    """Import en flux de relevés .xlsx / .xls / .csv
+    
+    Le fichier est lu ligne à ligne, chaque ligne est validée puis insérée
+    par lots de BATCH_SIZE (executemany, un commit par lot) : la mémoire
+    reste constante quelle que soit la taille du relevé. Progression et
+    annulation sont vérifiées toutes les CHECK_EVERY lignes lues,
+    acceptées ou non ; une annulation abandonne le lot pas encore écrit.
+    
+    Colonnes reconnues (en-tête, casse et accents ignorés) : opérateur,
+    type, montant, et en option agent et date. Sans colonne agent, les
+    lignes sont attribuées à default_agent_id.
+    """
+    
+    BATCH_SIZE = 20000
+    CHECK_EVERY = 1000
+    MAX_ERRORS = 20
+    
+    COLUMNS = {
+        'agent': ('agent', 'username', 'utilisateur', "nom d'utilisateur"),
+        'operator': ('operateur', 'operator'),
+        'type': ('type', 'type de transaction'),
+        'amount': ('montant', 'amount', 'montant (xof)'),
+        'timestamp': ('date', 'timestamp', 'date/heure', 'datetime'),
+    }
+    
+    TYPES = {
+        'depot': 'Dépôt',
+        'deposit': 'Dépôt',
+        'retrait': 'Retrait',
+        'withdrawal': 'Retrait',
+    }
+    
+    # AAAA-MM-JJ ou JJ/MM/AAAA, heure optionnelle (HH:MM[:SS])
+    DATE_PATTERNS = (
+        (re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})(?:[ T](\d{1,2}):(\d{2})(?::(\d{2}))?)?'), (0, 1, 2)),
+        (re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})(?: (\d{1,2}):(\d{2})(?::(\d{2}))?)?'), (2, 1, 0)),
+    )
+    
+    def __init__(self, filepath, default_agent_id=None, progress=None, cancel_event=None):
+        self.filepath = filepath
+        self.default_agent_id = default_agent_id
+        self.progress = progress
+        self.cancel_event = cancel_event
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+        self._operators = {self._normalize(op): op for op in OPERATORS}
+        self._agents = {}
+        # Les relevés répètent les mêmes libellés : on mémorise les
+        # correspondances déjà résolues
+        self._operator_cache = {}
+        self._type_cache = {}
+    
+    @staticmethod
+    def _normalize(value):
+        text = str(value).strip().lower()
+        for accented, plain in (('é', 'e'), ('è', 'e'), ('ê', 'e'), ('ô', 'o')):
+            text = text.replace(accented, plain)
+        return text
+    
+    # -------------------------------------------------------------------------
+    # Lecture en flux
+    # -------------------------------------------------------------------------
+    
+    def _iter_rows(self):
+        """Produit (valeurs de la ligne, fraction du fichier lue)"""
+        ext = os.path.splitext(self.filepath)[1].lower()
+        if ext == '.csv':
+            return self._iter_csv()
+        if ext == '.xlsx':
+            return self._iter_xlsx()
+        if ext == '.xls':
+            return self._iter_xls()
+        raise ValueError(f'Format non supporté: {ext or self.filepath}')
+    
+    def _iter_csv(self):
+        size = os.path.getsize(self.filepath) or 1
+        with open(self.filepath, 'rb') as raw:
+            sample = raw.read(4096).decode('utf-8-sig', errors='replace')
+            raw.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+            except csv.Error:
+                dialect = csv.excel
+            text = TextIOWrapper(raw, encoding='utf-8-sig', errors='replace', newline='')
+            for row in csv.reader(text, dialect):
+                yield row, raw.tell() / size
+    
+    def _iter_xlsx(self):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError("Le module openpyxl est requis pour les fichiers .xlsx")
+        workbook = load_workbook(self.filepath, read_only=True, data_only=True)
+        try:
+            sheet = workbook.active
+            total = sheet.max_row or 0
+            for index, row in enumerate(sheet.iter_rows(values_only=True), 1):
+                yield row, index / total if total else 0
+        finally:
+            workbook.close()
+    
+    def _iter_xls(self):
+        try:
+            import xlrd
+        except ImportError:
+            raise ValueError("Le module xlrd est requis pour les fichiers .xls")
+        workbook = xlrd.open_workbook(self.filepath, on_demand=True)
+        try:
+            sheet = workbook.sheet_by_index(0)
+            total = sheet.nrows or 1
+            for index in range(sheet.nrows):
+                values = []
+                for cell in sheet.row(index):
+                    if cell.ctype == xlrd.XL_CELL_DATE:
+                        values.append(xlrd.xldate_as_datetime(cell.value, workbook.datemode))
+                    else:
+                        values.append(cell.value)
+                yield values, (index + 1) / total
+        finally:
+            workbook.release_resources()
+    
+    # -------------------------------------------------------------------------
+    # Validation
+    # -------------------------------------------------------------------------
+    
+    def _map_header(self, header):
+        aliases = {
+            self._normalize(alias): field
+            for field, names in self.COLUMNS.items()
+            for alias in names
+        }
+        columns = {}
+        for index, name in enumerate(header):
+            field = aliases.get(self._normalize(name)) if name is not None else None
+            if field and field not in columns:
+                columns[field] = index
+        
+        missing = [f for f in ('operator', 'type', 'amount') if f not in columns]
+        if missing:
+            raise ValueError('Colonnes manquantes: ' + ', '.join(missing))
+        if 'agent' not in columns and self.default_agent_id is None:
+            raise ValueError('Colonne agent manquante')
+        return columns
+    
+    def _parse_amount(self, value):
+        if isinstance(value, (int, float)):
+            amount = float(value)
+        else:
+            text = str(value).replace('\u00a0', '').replace(' ', '').replace(',', '.')
+            amount = float(text)
+        if not 0 < amount <= MAX_AMOUNT:
+            raise ValueError(f'montant hors limites ({value})')
+        if amount != int(amount):
+            raise ValueError(f'montant non entier ({value})')
+        return int(amount)
+    
+    def _parse_timestamp(self, value):
+        """Date et heure locales du relevé -> horodatage (epoch UTC)"""
+        if value in (None, ''):
+            return DatabaseManager._now()
+        if isinstance(value, datetime):
+            return DatabaseManager.local_epoch(*value.timetuple()[:6])
+        
+        # Analyse par expression régulière : bien plus rapide que strptime
+        # sur des centaines de milliers de lignes
+        text = str(value).strip()
+        for pattern, (y, m, d) in self.DATE_PATTERNS:
+            match = pattern.fullmatch(text)
+            if match is None:
+                continue
+            parts = match.groups()
+            year, month, day = int(parts[y]), int(parts[m]), int(parts[d])
+            hour, minute, second = (int(p or 0) for p in parts[3:])
+            try:
+                # date() refuse les jours impossibles (31/02) que timegm
+                # reporterait silencieusement sur le mois suivant
+                date(year, month, day)
+            except ValueError:
+                break
+            if hour < 24 and minute < 60 and second < 60:
+                return DatabaseManager.local_epoch(year, month, day, hour, minute, second)
+            break
+        raise ValueError(f'date invalide ({value})')
+    
+    def _lookup(self, cache, mapping, value):
+        try:
+            return cache[value]
+        except KeyError:
+            result = cache[value] = mapping.get(self._normalize(value or ''))
+            return result
+    
+    def _parse_row(self, values, columns):
+        def cell(field):
+            index = columns.get(field)
+            if index is None or index >= len(values):
+                return None
+            return values[index]
+        
+        operator = self._lookup(self._operator_cache, self._operators, cell('operator'))
+        if operator is None:
+            raise ValueError(f"opérateur inconnu ({cell('operator')})")
+        
+        trans_type = self._lookup(self._type_cache, self.TYPES, cell('type'))
+        if trans_type is None:
+            raise ValueError(f"type inconnu ({cell('type')})")
+        
+        amount = self._parse_amount(cell('amount'))
+        
+        agent_id = self.default_agent_id
+        if 'agent' in columns:
+            agent = cell('agent')
+            agent_id = self._agents.get(str(agent).strip()) if agent is not None else None
+            if agent_id is None:
+                raise ValueError(f'agent inconnu ({agent})')
+        
+        return (agent_id, operator, trans_type, amount, self._parse_timestamp(cell('timestamp')))
+    
+    def _reject(self, line, error):
+        self.rejected += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append(f'Ligne {line}: {error}')
+    
+    # -------------------------------------------------------------------------
+    # Import
+    # -------------------------------------------------------------------------
+    
+    def _flush(self, batch, fraction):
+        if batch:
+            self.imported += DatabaseManager.record_transactions(batch)
+        if self.progress:
+            self.progress(fraction, self.imported, self.rejected)
+    
+    def run(self):
+        """Importe le fichier ; retourne un résumé (imported, rejected, errors, cancelled)"""
+        with DatabaseManager.connection() as conn:
+            self._agents = dict(conn.execute("SELECT username, id FROM users"))
+        
+        columns = None
+        batch = []
+        fraction = 0
+        cancelled = False
+        
+        for line, (values, fraction) in enumerate(self._iter_rows(), 1):
+            if not any(v not in (None, '') for v in values):
+                continue
+            if columns is None:
+                columns = self._map_header(values)
+                continue
+            
+            try:
+                batch.append(self._parse_row(values, columns))
+            except (ValueError, TypeError, OverflowError) as e:
+                self._reject(line, e)
+            
+            if len(batch) >= self.BATCH_SIZE:
+                self._flush(batch, fraction)
+                batch = []
+            elif line % self.CHECK_EVERY == 0 and self.progress:
+                self.progress(fraction, self.imported, self.rejected)
+            
+            if line % self.CHECK_EVERY == 0 and \
+                    self.cancel_event is not None and self.cancel_event.is_set():
+                cancelled = True
+                break
+        
+        if columns is None:
+            raise ValueError('Fichier vide')
+        if not cancelled:
+            self._flush(batch, 1)
+        
+        return {
+            'imported': self.imported,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'cancelled': cancelled
+        }
+
+# =============================================================================
+# EXPORTATION DES TRANSACTIONS (CSV / EXCEL)
+# =============================================================================
+
+class TransactionExporter:
+    """Export en flux des transactions vers .csv ou .xlsx
+    
+    Les lignes passent directement du curseur SQLite au fichier, lot par
+    lot (DatabaseManager.iter_transactions) ; les classeurs Excel sont
+    écrits en mode write-only. L'en-tête reprend les colonnes reconnues
+    par TransactionImporter : un export peut être réimporté tel quel.
+    
+    Le fichier est écrit sous un nom temporaire puis renommé : un export
+    annulé ou en erreur ne laisse pas de fichier partiel.
+    """
+    
+    HEADER = ('date', 'agent', 'opérateur', 'type', 'montant')
+    BATCH_SIZE = 5000
+    
+    def __init__(self, filepath, start=None, end=None, agent_id=None, operator=None,
+                 progress=None, cancel_event=None):
+        self.filepath = filepath
+        self.filters = {'start': start, 'end': end, 'agent_id': agent_id, 'operator': operator}
+        self.progress = progress
+        self.cancel_event = cancel_event
+        self.exported = 0
+    
+    def _open_writer(self, path):
+        """Retourne (écrire_lot(rows), terminer(), abandonner())"""
+        ext = os.path.splitext(self.filepath)[1].lower()
+        if ext == '.csv':
+            # utf-8-sig : Excel reconnaît l'encodage (accents)
+            f = open(path, 'w', encoding='utf-8-sig', newline='')
+            writer = csv.writer(f)
+            writer.writerow(self.HEADER)
+            return writer.writerows, f.close, f.close
+        if ext == '.xlsx':
+            try:
+                from openpyxl import Workbook
+            except ImportError:
+                raise ValueError("Le module openpyxl est requis pour les fichiers .xlsx")
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet('Transactions')
+            sheet.append(self.HEADER)
+            
+            def write(rows):
+                for row in rows:
+                    sheet.append(row)
+            return write, lambda: workbook.save(path), workbook.close
+        raise ValueError(f'Format non supporté: {ext or self.filepath}')
+    
+    def run(self):
+        """Exporte ; retourne un résumé (exported, total, cancelled, path)"""
+        total = DatabaseManager.count_transactions(**self.filters)
+        partial = self.filepath + '.part'
+        write, finish, discard = self._open_writer(partial)
+        completed = False
+        try:
+            local_time = DatabaseManager.local_time
+            for rows in DatabaseManager.iter_transactions(batch_size=self.BATCH_SIZE,
+                                                          **self.filters):
+                # Heure locale, au format relu par TransactionImporter
+                write([(local_time(row[0]),) + row[1:] for row in rows])
+                self.exported += len(rows)
+                if self.progress:
+                    self.progress(self.exported / total if total else 1, self.exported)
+                if self.cancel_event is not None and self.cancel_event.is_set():
+                    break
+            else:
+                completed = True
+        finally:
+            if completed:
+                finish()
+                os.replace(partial, self.filepath)
+            else:
+                # Annulé ou en erreur : pas de fichier partiel
+                discard()
+                if os.path.exists(partial):
+                    os.remove(partial)
+        
+        return {
+            'exported': self.exported,
+            'total': total,
+            'cancelled': not completed,
+            'path': self.filepath
+        }
@@ -5,12 +5,19 @@ Application Mobile Money - Version Responsive & Mobile Optimisée
 Compatible Android/iOS avec gestion dynamique des tailles d'écran
 """
 
+import time
+
+# Origine du profil de démarrage : avant tout import lourd
+_STARTUP_T0 = time.monotonic()
+
+import os
+import json
 import sqlite3
-import hashlib
-from datetime import datetime
-import pandas as pd
-import pygal
-from io import BytesIO
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 
 from kivy.app import App
 from kivy.lang import Builder
@@ -22,20 +29,105 @@ from kivy.uix.textinput import TextInput
 from kivy.uix.button import Button
 from kivy.uix.spinner import Spinner
 from kivy.uix.popup import Popup
-from kivy.uix.filechooser import FileChooserIconView
 from kivy.uix.progressbar import ProgressBar
-from kivy.uix.tabbedpanel import TabbedPanel, TabbedPanelItem
 from kivy.uix.scrollview import ScrollView
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
 from kivy.uix.widget import Widget
 from kivy.core.window import Window
 from kivy.metrics import dp, sp
 from kivy.graphics import Color, Rectangle, RoundedRectangle
 from kivy.properties import ListProperty, StringProperty, ObjectProperty, NumericProperty
-from kivy.core.image import Image as CoreImage
-from kivy.uix.image import Image
+from kivy.event import EventDispatcher
 from kivy.clock import Clock
+from kivy.logger import Logger
 from kivy.utils import platform
 
+from database import (
+    DatabaseManager, TransactionImporter, TransactionExporter, query_log,
+    OPERATORS, TRANSACTION_TYPES, MAX_AMOUNT
+)
+
+# charts et le sélecteur de fichiers sont importés à la première
+# utilisation : ils pèsent au démarrage sur les téléphones d'entrée de
+# gamme.
+
+# =============================================================================
+# PROFIL DE DÉMARRAGE (OPTIONNEL)
+# =============================================================================
+
+class StartupProfiler:
+    """Phases nommées du démarrage, horodatées en temps monotone
+    
+    Inactif par défaut. MM_STARTUP_PROFILE=<fichier.json> l'active : les
+    phases (imports, init DB, construction de chaque écran, premier
+    on_enter, première frame) sont écrites dans ce fichier après la
+    première frame. Avec MM_STARTUP_EXIT=1 l'application s'arrête
+    ensuite (utilisé par benchmarks/startup.py).
+    """
+    
+    def __init__(self, t0, output=None, exit_after=False):
+        self.t0 = t0
+        self.output = output
+        self.enabled = bool(output)
+        self.exit_after = exit_after
+        self.phases = []
+        self.marks = {}
+    
+    def _ms(self, t):
+        return round((t - self.t0) * 1000, 3)
+    
+    def record(self, name, start, end=None):
+        if not self.enabled:
+            return
+        end = time.monotonic() if end is None else end
+        self.phases.append({
+            'name': name,
+            'start_ms': self._ms(start),
+            'end_ms': self._ms(end),
+            'duration_ms': round((end - start) * 1000, 3)
+        })
+    
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(name, start)
+    
+    def mark(self, name):
+        """Instant ponctuel ; seule la première occurrence est gardée"""
+        if self.enabled and name not in self.marks:
+            self.marks[name] = self._ms(time.monotonic())
+    
+    def to_dict(self):
+        return {
+            't0_monotonic': self.t0,
+            'pid': os.getpid(),
+            'platform': platform,
+            'phases': self.phases,
+            'marks': self.marks
+        }
+    
+    def dump(self):
+        if not self.enabled:
+            return
+        with open(self.output, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+# Instance globale
+startup = StartupProfiler(
+    _STARTUP_T0,
+    output=os.environ.get('MM_STARTUP_PROFILE'),
+    exit_after=os.environ.get('MM_STARTUP_EXIT') == '1'
+)
+startup.record('import', _STARTUP_T0)
+_MODULE_T0 = time.monotonic()
+
 # =============================================================================
 # CONFIGURATION GLOBALE ET CONSTANTES RESPONSIVES
 # =============================================================================
@@ -52,78 +144,103 @@ COLORS = {
     'WHITE': [1, 1, 1, 1],
     'ERROR': [0.9, 0.1, 0.1, 1],             # Rouge
     'SUCCESS': [0.2, 0.7, 0.2, 1],           # Vert
-    'GRAY': [0.5, 0.5, 0.5, 1]
+    'GRAY': [0.5, 0.5, 0.5, 1],
+    'BORDER': [0.8, 0.8, 0.8, 1]             # Bordure des champs
 }
 
-OPERATORS = ['Orange Money', 'Moov Money', 'Telecel', 'Wave', 'TNT']
-
 # =============================================================================
 # GESTION RESPONSIVE DES DIMENSIONS
 # =============================================================================
 
-class ResponsiveHelper:
-    """Classe utilitaire pour gérer les dimensions adaptatives"""
-    
-    _instance = None
-    
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance._init()
-        return cls._instance
-    
-    def _init(self):
-        self.screen_width = Window.width
-        self.screen_height = Window.height
-        self.is_small_screen = self.screen_width < dp(360)
-        self.is_tablet = self.screen_width > dp(600)
+class ResponsiveHelper(EventDispatcher):
+    """Dimensions adaptatives, précalculées par classe de taille d'écran
+    
+    Les valeurs (dp/sp) de chaque classe ('small', 'normal', 'tablet')
+    sont calculées une seule fois. Un redimensionnement (rotation, écran
+    partagé) ne déclenche qu'un seul événement on_metrics_changed, une
+    fois la fenêtre stabilisée (RESIZE_DELAY) : écrans et composants s'y
+    abonnent au lieu de Window.on_resize.
+    """
+    
+    __events__ = ('on_metrics_changed',)
+    
+    size_class = StringProperty('normal')
+    
+    RESIZE_DELAY = 0.1
+    
+    # Classe de taille -> (padding, spacing, hauteur bouton, hauteur
+    # saisie, facteur de police), en dp
+    SIZE_CLASSES = {
+        'small': (10, 8, 44, 40, 0.85),
+        'normal': (20, 12, 50, 45, 1.0),
+        'tablet': (40, 20, 60, 55, 1.1),
+    }
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._table = {
+            name: {
+                'padding': [dp(padding), dp(padding)],
+                'spacing': dp(spacing),
+                'button_height': dp(button),
+                'input_height': dp(field),
+                'font_scale': scale,
+            }
+            for name, (padding, spacing, button, field, scale) in self.SIZE_CLASSES.items()
+        }
+        self._font_sizes = {}
+        self._trigger_metrics = Clock.create_trigger(self._apply_size, self.RESIZE_DELAY)
+        self._apply_size(dispatch=False)
         Window.bind(on_resize=self._on_resize)
     
+    def _classify(self, width):
+        if width < dp(360):
+            return 'small'
+        if width > dp(600):
+            return 'tablet'
+        return 'normal'
+    
     def _on_resize(self, window, width, height):
-        self.screen_width = width
-        self.screen_height = height
-        self.is_small_screen = width < dp(360)
-        self.is_tablet = width > dp(600)
+        # Anti-rebond : la mise à jour n'a lieu qu'après la dernière
+        # taille reçue
+        self._trigger_metrics.cancel()
+        self._trigger_metrics()
+    
+    def _apply_size(self, *args, dispatch=True):
+        self.screen_width, self.screen_height = Window.size
+        self.size_class = self._classify(self.screen_width)
+        self.metrics = self._table[self.size_class]
+        self.is_small_screen = self.size_class == 'small'
+        self.is_tablet = self.size_class == 'tablet'
+        if dispatch:
+            self.dispatch('on_metrics_changed')
+    
+    def on_metrics_changed(self, *args):
+        pass
     
     def get_padding(self):
         """Retourne le padding adaptatif"""
-        if self.is_small_screen:
-            return [dp(10), dp(10)]
-        elif self.is_tablet:
-            return [dp(40), dp(40)]
-        return [dp(20), dp(20)]
+        return list(self.metrics['padding'])
     
     def get_spacing(self):
         """Retourne l'espacement adaptatif"""
-        if self.is_small_screen:
-            return dp(8)
-        elif self.is_tablet:
-            return dp(20)
-        return dp(12)
+        return self.metrics['spacing']
     
     def get_font_size(self, base_size):
         """Retourne la taille de police adaptative"""
-        if self.is_small_screen:
-            return sp(base_size * 0.85)
-        elif self.is_tablet:
-            return sp(base_size * 1.1)
-        return sp(base_size)
+        key = (self.size_class, base_size)
+        size = self._font_sizes.get(key)
+        if size is None:
+            size = self._font_sizes[key] = sp(base_size * self.metrics['font_scale'])
+        return size
     
     def get_button_height(self):
         """Retourne la hauteur de bouton adaptative"""
-        if self.is_small_screen:
-            return dp(44)
-        elif self.is_tablet:
-            return dp(60)
-        return dp(50)
+        return self.metrics['button_height']
     
     def get_input_height(self):
         """Retourne la hauteur de champ de saisie adaptative"""
-        if self.is_small_screen:
-            return dp(40)
-        elif self.is_tablet:
-            return dp(55)
-        return dp(45)
+        return self.metrics['input_height']
 
 # Instance globale
 responsive = ResponsiveHelper()
@@ -132,12 +249,22 @@ responsive = ResponsiveHelper()
 # COMPOSANTS PERSONNALISÉS RESPONSIFS
 # =============================================================================
 
+# Rayons d'arrondi partagés par tous les composants (calculés une fois).
+# Chaque widget garde ses propres instructions de canvas (Kivy ne les
+# partage pas entre widgets) : un changement de couleur ne fait que
+# modifier Color.rgba, sans recréer d'instructions.
+RADIUS = {
+    'button': [dp(12)],
+    'input': [dp(8)],
+    'card': [dp(15)],
+}
+
 class ResponsiveButton(Button):
     """Bouton avec style moderne et taille adaptive"""
     
+    bg_color = ListProperty(COLORS['PRIMARY'])
+    
     def __init__(self, **kwargs):
-        # Extraire la couleur personnalisée avant l'init parent
-        bg_color = kwargs.pop('bg_color', COLORS['PRIMARY'])
         super().__init__(**kwargs)
         
         self.background_color = [0, 0, 0, 0]  # Transparent pour canvas
@@ -146,21 +273,31 @@ class ResponsiveButton(Button):
         self.bold = True
         self.color = COLORS['WHITE']
         
-        # Taille adaptative
+        # Taille adaptative (hauteur fixe sauf si fournie par l'appelant)
         self.size_hint_y = None
-        self.height = responsive.get_button_height()
-        self.font_size = responsive.get_font_size(16)
+        self._auto_height = 'height' not in kwargs
+        self._apply_metrics()
+        responsive.bind(on_metrics_changed=self._apply_metrics)
         
         # Canvas pour arrondi
         with self.canvas.before:
-            Color(*bg_color)
+            self.bg = Color(rgba=self.bg_color)
             self.rect = RoundedRectangle(
                 pos=self.pos, 
                 size=self.size,
-                radius=[dp(12),]
+                radius=RADIUS['button']
             )
         
         self.bind(pos=self._update_rect, size=self._update_rect)
+        self.bind(bg_color=self._update_color)
+    
+    def _apply_metrics(self, *args):
+        if self._auto_height:
+            self.height = responsive.get_button_height()
+        self.font_size = responsive.get_font_size(16)
+    
+    def _update_color(self, instance, value):
+        self.bg.rgba = value
     
     def _update_rect(self, *args):
         self.rect.pos = self.pos
@@ -174,9 +311,8 @@ class ResponsiveInput(TextInput):
         
         self.multiline = False
         self.size_hint_y = None
-        self.height = responsive.get_input_height()
-        self.font_size = responsive.get_font_size(16)
-        self.padding = [dp(15), (self.height - self.font_size) / 2]
+        self._apply_metrics()
+        responsive.bind(on_metrics_changed=self._apply_metrics)
         self.background_color = COLORS['WHITE']
         self.foreground_color = COLORS['TEXT']
         self.cursor_color = COLORS['PRIMARY']
@@ -184,239 +320,235 @@ class ResponsiveInput(TextInput):
         
         # Bordure
         with self.canvas.before:
-            Color(0.8, 0.8, 0.8, 1)
+            self.frame_color = Color(rgba=COLORS['BORDER'])
             self.rect = RoundedRectangle(
                 pos=self.pos,
                 size=self.size,
-                radius=[dp(8),]
+                radius=RADIUS['input']
             )
         
         self.bind(pos=self._update_rect, size=self._update_rect, focus=self._on_focus)
     
+    def _apply_metrics(self, *args):
+        self.height = responsive.get_input_height()
+        self.font_size = responsive.get_font_size(16)
+        self.padding = [dp(15), (self.height - self.font_size) / 2]
+    
     def _update_rect(self, *args):
         self.rect.pos = self.pos
         self.rect.size = self.size
     
     def _on_focus(self, instance, value):
         # Changer la couleur de bordure selon le focus
-        self.canvas.before.clear()
-        with self.canvas.before:
-            if value:
-                Color(*COLORS['PRIMARY'])
-            else:
-                Color(0.8, 0.8, 0.8, 1)
-            self.rect = RoundedRectangle(
-                pos=self.pos,
-                size=self.size,
-                radius=[dp(8),]
-            )
+        self.frame_color.rgba = COLORS['PRIMARY'] if value else COLORS['BORDER']
 
 class Card(BoxLayout):
     """Carte avec ombre et bords arrondis"""
     
+    bg_color = ListProperty(COLORS['WHITE'])
+    
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.orientation = 'vertical'
-        self.padding = responsive.get_padding()
-        self.spacing = responsive.get_spacing()
+        self._apply_metrics()
+        responsive.bind(on_metrics_changed=self._apply_metrics)
         
         with self.canvas.before:
-            Color(*COLORS['WHITE'])
+            self.bg = Color(rgba=self.bg_color)
             self.rect = RoundedRectangle(
                 pos=self.pos,
                 size=self.size,
-                radius=[dp(15),]
+                radius=RADIUS['card']
             )
         
         self.bind(pos=self._update_rect, size=self._update_rect)
+        self.bind(bg_color=self._update_color)
+    
+    def _apply_metrics(self, *args):
+        self.padding = responsive.get_padding()
+        self.spacing = responsive.get_spacing()
+    
+    def _update_color(self, instance, value):
+        self.bg.rgba = value
     
     def _update_rect(self, *args):
         self.rect.pos = self.pos
         self.rect.size = self.size
 
 # =============================================================================
-# GESTION DE LA BASE DE DONNÉES (inchangée mais optimisée)
+# TÂCHES EN ARRIÈRE-PLAN
 # =============================================================================
 
-class DatabaseManager:
-    
-    DB_NAME = 'mobile_money.db'
-    
-    @classmethod
-    def init_database(cls):
-        conn = sqlite3.connect(cls.DB_NAME)
-        c = conn.cursor()
-        
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                role TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                agent_id INTEGER,
-                operator TEXT NOT NULL,
-                type TEXT NOT NULL,
-                amount REAL NOT NULL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (agent_id) REFERENCES users(id)
-            )
-        ''')
-        
-        # Admin par défaut
-        c.execute("SELECT * FROM users WHERE username='admin'")
-        if not c.fetchone():
-            hashed = hashlib.sha256('admin123'.encode()).hexdigest()
-            c.execute(
-                "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-                ('admin', hashed, 'admin')
-            )
+class Task:
+    """Tâche soumise au TaskRunner (future + propriétaire + annulation)"""
+    
+    def __init__(self, future, owner, cancel_event=None):
+        self.future = future
+        self.owner = owner
+        self.cancel_event = cancel_event
+        self.cancelled = False
+    
+    def cancel(self):
+        """Annule la tâche : si elle tourne déjà, son résultat est ignoré
+        et cancel_event lui demande de s'arrêter"""
+        self.cancelled = True
+        self.future.cancel()
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+    
+    def done(self):
+        return self.future.done()
+
+class TaskRunner:
+    """Exécute requêtes SQLite et rendus hors du thread Kivy
+    
+    Les résultats (ou erreurs) sont toujours livrés sur le thread
+    principal via Clock.schedule_once. Les tâches rattachées à un écran
+    (owner) sont annulées quand l'utilisateur le quitte. cancel_event
+    (threading.Event lu par la tâche) lui demande de s'arrêter à
+    l'annulation et à l'arrêt de l'application.
+    """
+    
+    SHUTDOWN_TIMEOUT = 5  # secondes laissées aux tâches en cours à l'arrêt
+    
+    def __init__(self, max_workers=2, name='mm-worker'):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=name
+        )
+        self._lock = threading.Lock()
+        self._tasks = {}  # id(owner) -> liste de Task
+        self._active = set()  # Tâches pas encore terminées
+    
+    def submit(self, fn, *args, on_success=None, on_error=None, owner=None,
+               cancel_event=None, **kwargs):
+        """Lance fn(*args, **kwargs) dans un thread de travail"""
+        future = self._executor.submit(fn, *args, **kwargs)
+        task = Task(future, owner, cancel_event)
+        with self._lock:
+            self._active.add(task)
+            if owner is not None:
+                self._tasks.setdefault(id(owner), []).append(task)
+        
+        def done(f):
+            with self._lock:
+                self._active.discard(task)
+            Clock.schedule_once(lambda dt: self._deliver(task, on_success, on_error))
+        
+        future.add_done_callback(done)
+        return task
+    
+    def _deliver(self, task, on_success, on_error):
+        self._forget(task)
+        if task.cancelled or task.future.cancelled():
+            return
         
-        conn.commit()
-        conn.close()
-    
-    @classmethod
-    def add_user(cls, username, password, role):
-        conn = sqlite3.connect(cls.DB_NAME)
-        c = conn.cursor()
-        hashed = hashlib.sha256(password.encode()).hexdigest()
+        # Une exception dans un callback ne doit pas remonter dans Clock
         try:
-            c.execute(
-                "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-                (username, hashed, role)
-            )
-            conn.commit()
-            return True
-        except sqlite3.IntegrityError:
-            return False
-        finally:
-            conn.close()
-    
-    @classmethod
-    def get_user(cls, username, password):
-        conn = sqlite3.connect(cls.DB_NAME)
-        c = conn.cursor()
-        hashed = hashlib.sha256(password.encode()).hexdigest()
-        c.execute(
-            "SELECT * FROM users WHERE username=? AND password=?",
-            (username, hashed)
-        )
-        user = c.fetchone()
-        conn.close()
-        return user
-    
-    @classmethod
-    def get_all_agents(cls):
-        conn = sqlite3.connect(cls.DB_NAME)
-        c = conn.cursor()
-        c.execute("SELECT id, username FROM users WHERE role='agent' ORDER BY username")
-        agents = c.fetchall()
-        conn.close()
-        return agents
-    
-    @classmethod
-    def record_transaction(cls, agent_id, operator, trans_type, amount):
-        conn = sqlite3.connect(cls.DB_NAME)
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO transactions (agent_id, operator, type, amount)
-            VALUES (?, ?, ?, ?)
-        ''', (agent_id, operator, trans_type, amount))
-        conn.commit()
-        conn.close()
-    
-    @classmethod
-    def get_transactions_by_agent(cls, agent_id):
-        conn = sqlite3.connect(cls.DB_NAME)
-        c = conn.cursor()
-        c.execute('''
-            SELECT operator, type, amount, timestamp 
-            FROM transactions WHERE agent_id=?
-            ORDER BY timestamp DESC
-        ''', (agent_id,))
-        trans = c.fetchall()
-        conn.close()
-        return trans
-    
-    @classmethod
-    def get_all_transactions(cls):
-        conn = sqlite3.connect(cls.DB_NAME)
-        c = conn.cursor()
-        c.execute('''
-            SELECT t.operator, t.type, t.amount, t.timestamp, u.username 
-            FROM transactions t 
-            JOIN users u ON t.agent_id = u.id
-            ORDER BY t.timestamp DESC
-        ''')
-        trans = c.fetchall()
-        conn.close()
-        return trans
-    
-    @classmethod
-    def get_daily_summary(cls, days=7):
-        conn = sqlite3.connect(cls.DB_NAME)
-        c = conn.cursor()
-        c.execute('''
-            SELECT 
-                DATE(timestamp) AS date,
-                operator,
-                type,
-                SUM(amount) AS total,
-                COUNT(*) AS count
-            FROM transactions
-            WHERE timestamp >= date('now', '-{} days')
-            GROUP BY date, operator, type
-            ORDER BY date DESC
-        '''.format(days))
-        summary = c.fetchall()
-        conn.close()
-        return summary
+            error = task.future.exception()
+            if error is not None:
+                if on_error is not None:
+                    on_error(error)
+                else:
+                    Logger.error(f'TaskRunner: {error!r}')
+            elif on_success is not None:
+                on_success(task.future.result())
+        except Exception as e:
+            Logger.exception(f'TaskRunner: callback en échec: {e!r}')
     
-    @classmethod
-    def get_operator_summary(cls):
-        conn = sqlite3.connect(cls.DB_NAME)
-        c = conn.cursor()
-        c.execute('''
-            SELECT
-                operator,
-                type,
-                SUM(amount) AS total,
-                COUNT(*) AS count
-            FROM transactions
-            GROUP BY operator, type
-            ORDER BY operator, type
-        ''')
-        summary = c.fetchall()
-        conn.close()
-        return summary
+    def _forget(self, task):
+        if task.owner is None:
+            return
+        with self._lock:
+            tasks = self._tasks.get(id(task.owner), [])
+            if task in tasks:
+                tasks.remove(task)
+            if not tasks:
+                self._tasks.pop(id(task.owner), None)
+    
+    def cancel(self, owner):
+        """Annule toutes les tâches en cours d'un propriétaire"""
+        with self._lock:
+            tasks = self._tasks.pop(id(owner), [])
+        for task in tasks:
+            task.cancel()
+    
+    def cancel_all(self):
+        """Annule toutes les tâches ; retourne celles pas encore terminées"""
+        with self._lock:
+            active = list(self._active)
+        for task in active:
+            task.cancel()
+        return active
+    
+    def shutdown(self, timeout=None):
+        """Annule toutes les tâches et attend celles qui tournent encore
+        (au plus timeout secondes) ; False si certaines n'ont pas fini"""
+        active = self.cancel_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        
+        timeout = self.SHUTDOWN_TIMEOUT if timeout is None else timeout
+        # Une future annulée avant d'avoir démarré n'est jamais notifiée
+        _, running = wait(
+            [task.future for task in active if not task.future.cancelled()], timeout=timeout
+        )
+        if running:
+            Logger.warning(f'TaskRunner: {len(running)} tâche(s) encore en cours à l\'arrêt')
+        return not running
+
+# Instances globales : tasks pour les requêtes courtes de l'interface
+# (connexion, solde, graphiques, saisie, checkpoint), jobs pour les
+# traitements longs (synchronisation, import, export, reconstruction).
+# Un traitement long n'occupe jamais un thread dont dépend l'interface.
+tasks = TaskRunner()
+jobs = TaskRunner(max_workers=2, name='mm-job')
+
+# =============================================================================
+# CACHE DES GRAPHIQUES
+# =============================================================================
+
+class ChartCache:
+    """Cache des graphiques (séries prêtes à dessiner), indexé par
+    version des données
+    
+    LRU en mémoire (max_items). Toute écriture dans le journal change
+    DatabaseManager.data_version, donc la clé : pas d'invalidation
+    explicite. Les périodes relatives (« 7 jours ») dépendent aussi du
+    jour local et du décalage UTC, qui font partie de la clé.
+    """
+    
+    def __init__(self, max_items=6):
+        self.max_items = max_items
+        self._items = OrderedDict()
+    
+    def key(self, kind, params=()):
+        return (
+            kind,
+            tuple(params),
+            DatabaseManager.data_version,
+            DatabaseManager.local_today().isoformat(),
+            DatabaseManager.active_utc_offset(),
+            tuple(Window.size)
+        )
     
-    @classmethod
-    def get_agent_balance(cls, agent_id):
-        conn = sqlite3.connect(cls.DB_NAME)
-        c = conn.cursor()
-        c.execute('''
-            SELECT 
-                SUM(CASE WHEN type='Dépôt' THEN amount ELSE 0 END) as deposits,
-                SUM(CASE WHEN type='Retrait' THEN amount ELSE 0 END) as withdrawals
-            FROM transactions
-            WHERE agent_id=?
-        ''', (agent_id,))
-        result = c.fetchone()
-        conn.close()
-        
-        deposits = result[0] or 0
-        withdrawals = result[1] or 0
-        return {
-            'deposits': deposits,
-            'withdrawals': withdrawals,
-            'balance': deposits - withdrawals
-        }
+    def get(self, key):
+        """Graphique en mémoire, False si « aucune donnée », None si absent"""
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+    
+    def put(self, key, value):
+        self._items[key] = value if value is not None else False
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+    
+    def clear(self):
+        self._items.clear()
+
+# Instance globale
+chart_cache = ChartCache()
 
 # =============================================================================
 # ÉCRANS DE L'APPLICATION
@@ -428,7 +560,7 @@ class BaseScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._setup_background()
-        Window.bind(on_resize=self._on_resize)
+        responsive.bind(on_metrics_changed=self._refresh_layout)
     
     def _setup_background(self):
         with self.canvas.before:
@@ -440,12 +572,32 @@ class BaseScreen(Screen):
         self.bg_rect.pos = self.pos
         self.bg_rect.size = self.size
     
-    def _on_resize(self, window, width, height):
-        # Rafraîchir l'affichage lors du redimensionnement
-        Clock.schedule_once(self._refresh_layout, 0.1)
+    def _refresh_layout(self, *args):
+        pass  # À surcharger : appelé une fois par redimensionnement
+    
+    def on_leave(self):
+        # Les résultats destinés à un écran quitté sont abandonnés
+        tasks.cancel(self)
+    
+    def run_task(self, fn, *args, on_success=None, on_error=None, **kwargs):
+        """Lance fn en arrière-plan ; les callbacks reviennent sur le thread UI"""
+        if on_error is None:
+            on_error = lambda e: self.show_popup('Erreur', str(e))
+        return tasks.submit(
+            fn, *args,
+            on_success=on_success,
+            on_error=on_error,
+            owner=self,
+            **kwargs
+        )
     
-    def _refresh_layout(self, dt):
-        pass  # À surcharger dans les classes filles
+    def loading_label(self, text='Chargement...'):
+        """Indicateur affiché pendant une tâche d'arrière-plan"""
+        return Label(
+            text=text,
+            font_size=responsive.get_font_size(14),
+            color=COLORS['GRAY']
+        )
     
     def show_popup(self, title, message, msg_type='ERROR', auto_dismiss=True):
         """Affiche une popup moderne"""
@@ -500,6 +652,55 @@ class BaseScreen(Screen):
         popup.open()
         
         return popup
+    
+    def _progress_popup(self, title, cancellable=True):
+        """Popup d'attente avec barre de progression et bouton ANNULER
+        
+        Retourne (popup, update, cancel_event). update(fraction, texte)
+        peut être appelé depuis un thread de travail ; ANNULER lève
+        cancel_event.
+        """
+        content = BoxLayout(
+            orientation='vertical',
+            padding=dp(30),
+            spacing=dp(20)
+        )
+        
+        status = Label(
+            text=title,
+            font_size=responsive.get_font_size(16)
+        )
+        content.add_widget(status)
+        
+        progress = ProgressBar(max=100, value=0)
+        content.add_widget(progress)
+        
+        cancel_event = threading.Event()
+        if cancellable:
+            btn_cancel = ResponsiveButton(
+                text='ANNULER',
+                bg_color=[0.6, 0.6, 0.6, 1],
+                on_press=lambda x: cancel_event.set()
+            )
+            content.add_widget(btn_cancel)
+        
+        popup = Popup(
+            title='Veuillez patienter',
+            content=content,
+            size_hint=(0.8, 0.4),
+            auto_dismiss=False
+        )
+        popup.open()
+        
+        def show(fraction, text):
+            progress.value = fraction * 100
+            status.text = text
+        
+        def update(fraction, text):
+            # Appelé depuis le thread de travail : retour au thread principal
+            Clock.schedule_once(lambda dt: show(fraction, text))
+        
+        return popup, update, cancel_event
 
 class LoginScreen(BaseScreen):
     """Écran de connexion optimisé pour mobile"""
@@ -513,7 +714,7 @@ class LoginScreen(BaseScreen):
         root = ScrollView(size_hint=(1, 1))
         
         # Container centré
-        container = BoxLayout(
+        self.container = container = BoxLayout(
             orientation='vertical',
             size_hint_y=None,
             height=max(dp(500), Window.height * 0.8),
@@ -591,12 +792,12 @@ class LoginScreen(BaseScreen):
         form_layout.add_widget(Widget(size_hint_y=0.3))
         
         # Bouton connexion
-        btn_login = ResponsiveButton(
+        self.btn_login = ResponsiveButton(
             text='SE CONNECTER',
             bg_color=COLORS['PRIMARY'],
             on_press=self.authenticate
         )
-        form_layout.add_widget(btn_login)
+        form_layout.add_widget(self.btn_login)
         
         # Version
         version_label = Label(
@@ -613,6 +814,11 @@ class LoginScreen(BaseScreen):
         root.add_widget(container)
         self.add_widget(root)
     
+    def _refresh_layout(self, *args):
+        self.container.height = max(dp(500), Window.height * 0.8)
+        self.container.padding = responsive.get_padding()
+        self.container.spacing = responsive.get_spacing()
+    
     def authenticate(self, instance):
         username = self.username.text.strip()
         password = self.password.text.strip()
@@ -621,8 +827,24 @@ class LoginScreen(BaseScreen):
             self.show_popup('Erreur', 'Veuillez remplir tous les champs')
             return
         
-        user = DatabaseManager.get_user(username, password)
-        
+        self.btn_login.disabled = True
+        self.btn_login.text = 'CONNEXION...'
+        self.run_task(
+            DatabaseManager.get_user, username, password,
+            on_success=self._on_authenticated,
+            on_error=self._on_auth_error
+        )
+    
+    def _on_auth_error(self, error):
+        self._reset_login_button()
+        self.show_popup('Erreur', str(error))
+    
+    def _reset_login_button(self):
+        self.btn_login.disabled = False
+        self.btn_login.text = 'SE CONNECTER'
+    
+    def _on_authenticated(self, user):
+        self._reset_login_button()
         if user:
             app = App.get_running_app()
             app.current_user = {
@@ -640,6 +862,8 @@ class LoginScreen(BaseScreen):
             # Réinitialiser les champs
             self.username.text = ''
             self.password.text = ''
+            
+            app.prewarm(user[3])
         else:
             self.show_popup('Erreur', 'Identifiants incorrects')
 
@@ -697,7 +921,7 @@ class MenuScreen(BaseScreen):
         container.add_widget(header)
         
         # Grille de boutons
-        grid = GridLayout(
+        self.grid = grid = GridLayout(
             cols=2 if responsive.screen_width > dp(400) else 1,
             spacing=responsive.get_spacing(),
             size_hint_y=None,
@@ -708,6 +932,7 @@ class MenuScreen(BaseScreen):
             ('💰 DÉPÔT', COLORS['PRIMARY'], self.go_deposit),
             ('💸 RETRAIT', COLORS['SECONDARY'], self.go_withdrawal),
             ('📊 STATISTIQUES', COLORS['PRIMARY'], self.go_stats),
+            ('📜 HISTORIQUE', COLORS['SECONDARY'], self.go_history),
             ('🚪 DÉCONNEXION', [0.6, 0.6, 0.6, 1], self.logout)
         ]
         
@@ -729,6 +954,11 @@ class MenuScreen(BaseScreen):
         if app.current_user:
             self.user_label.text = app.current_user['username']
     
+    def _refresh_layout(self, *args):
+        # Deux colonnes dès que la largeur le permet (paysage, tablette)
+        self.grid.cols = 2 if responsive.screen_width > dp(400) else 1
+        self.grid.spacing = responsive.get_spacing()
+    
     def go_deposit(self, instance):
         screen = self.manager.get_screen('transaction')
         screen.transaction_type = 'Dépôt'
@@ -742,6 +972,9 @@ class MenuScreen(BaseScreen):
     def go_stats(self, instance):
         self.manager.current = 'stats'
     
+    def go_history(self, instance):
+        self.manager.current = 'history'
+    
     def logout(self, instance):
         App.get_running_app().current_user = None
         self.manager.current = 'login'
@@ -819,7 +1052,7 @@ class TransactionScreen(BaseScreen):
         
         self.amount_input = ResponsiveInput(
             hint_text='0',
-            input_filter='float'
+            input_filter='int'
         )
         form.add_widget(self.amount_input)
         
@@ -833,7 +1066,7 @@ class TransactionScreen(BaseScreen):
             spacing=dp(10)
         )
         
-        btn_save = ResponsiveButton(
+        self.btn_save = ResponsiveButton(
             text='VALIDER',
             bg_color=COLORS['PRIMARY'],
             on_press=self.save_transaction
@@ -845,7 +1078,7 @@ class TransactionScreen(BaseScreen):
             on_press=self.go_back
         )
         
-        btn_layout.add_widget(btn_save)
+        btn_layout.add_widget(self.btn_save)
         btn_layout.add_widget(btn_cancel)
         form.add_widget(btn_layout)
         
@@ -872,34 +1105,46 @@ class TransactionScreen(BaseScreen):
             return
         
         try:
-            amount = float(amount_str)
+            amount = int(amount_str)  # XOF : pas de décimales
             if amount <= 0:
                 raise ValueError("Montant négatif")
-            if amount > 10000000:  # Limite 10 millions
+            if amount > MAX_AMOUNT:  # Limite 10 millions
                 raise ValueError("Montant trop élevé")
         except ValueError:
             self.show_popup('Erreur', 'Veuillez entrer un montant valide (max 10 000 000 XOF)')
             return
         
-        # Enregistrement
+        # Enregistrement en arrière-plan ; une écriture n'est pas annulée
+        # si l'agent quitte l'écran entre-temps
         app = App.get_running_app()
-        DatabaseManager.record_transaction(
+        trans_type = self.transaction_type
+        self.btn_save.disabled = True
+        
+        def on_saved(result):
+            self.btn_save.disabled = False
+            self.show_popup(
+                'Succès',
+                f'{trans_type} de {amount:,.0f} XOF\nenregistré avec succès!',
+                'SUCCESS'
+            )
+            
+            # Réinitialiser
+            self.amount_input.text = ''
+            self.operator_spinner.text = 'Sélectionnez un opérateur'
+        
+        def on_error(error):
+            self.btn_save.disabled = False
+            self.show_popup('Erreur', f"Échec de l'enregistrement:\n{error}")
+        
+        tasks.submit(
+            DatabaseManager.record_transaction,
             app.current_user['id'],
             operator,
-            self.transaction_type,
-            amount
+            trans_type,
+            amount,
+            on_success=on_saved,
+            on_error=on_error
         )
-        
-        # Succès
-        self.show_popup(
-            'Succès',
-            f'{self.transaction_type} de {amount:,.0f} XOF\nenregistré avec succès!',
-            'SUCCESS'
-        )
-        
-        # Réinitialiser
-        self.amount_input.text = ''
-        self.operator_spinner.text = 'Sélectionnez un opérateur'
     
     def go_back(self, instance):
         self.manager.current = 'menu'
@@ -907,8 +1152,30 @@ class TransactionScreen(BaseScreen):
 class StatsScreen(BaseScreen):
     """Écran de statistiques avec graphiques"""
     
+    # Périodes proposées (jours jusqu'à aujourd'hui inclus, None : tout)
+    PERIODS = {
+        '7 jours': 7,
+        '30 jours': 30,
+        'Trimestre': 91,
+        'Année': 365,
+        'Tout': None,
+    }
+    # Largeur minimale d'une barre (dp) : fixe le nombre de périodes
+    # affichables, donc la résolution lue dans period_rollup
+    MIN_SLOT_WIDTH = 8
+    RESOLUTION_TITLES = {
+        'day': 'par jour',
+        'week': 'par semaine',
+        'month': 'par mois',
+        'year': 'par année',
+    }
+    MONTHS = ('janv.', 'févr.', 'mars', 'avr.', 'mai', 'juin',
+              'juil.', 'août', 'sept.', 'oct.', 'nov.', 'déc.')
+    
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.chart_height = dp(350)
+        self.view = 'operators'
         self.setup_ui()
     
     def setup_ui(self):
@@ -953,15 +1220,25 @@ class StatsScreen(BaseScreen):
             on_press=lambda x: self.show_operator_stats()
         )
         
-        btn_daily = ResponsiveButton(
-            text='Journalier',
+        btn_periods = ResponsiveButton(
+            text='Évolution',
             bg_color=COLORS['SECONDARY'],
-            on_press=lambda x: self.show_daily_stats()
+            on_press=lambda x: self.show_period_stats()
         )
         
         selector.add_widget(btn_operators)
-        selector.add_widget(btn_daily)
+        selector.add_widget(btn_periods)
         container.add_widget(selector)
+        
+        self.period_spinner = Spinner(
+            text='7 jours',
+            values=list(self.PERIODS),
+            size_hint_y=None,
+            height=responsive.get_input_height(),
+            font_size=responsive.get_font_size(14)
+        )
+        self.period_spinner.bind(text=lambda *args: self.refresh())
+        container.add_widget(self.period_spinner)
         container.add_widget(self.content_area)
         
         # Bouton retour
@@ -978,85 +1255,194 @@ class StatsScreen(BaseScreen):
     def on_enter(self):
         self.show_operator_stats()
     
+    def refresh(self):
+        if self.view == 'operators':
+            self.show_operator_stats()
+        else:
+            self.show_period_stats()
+    
+    def period_params(self):
+        """Période choisie (thread principal) : {'label', 'days'}"""
+        label = self.period_spinner.text
+        return {'label': label, 'days': self.PERIODS.get(label, 7)}
+    
     def show_operator_stats(self):
+        self.view = 'operators'
+        self._load_chart('operators', **self.period_params())
+    
+    def show_period_stats(self):
+        self.view = 'periods'
+        # Avant la première mise en page, content_area n'a pas encore sa largeur
+        width = self.content_area.width if self.content_area.width > 100 else Window.width
+        max_points = max(1, int(width / dp(self.MIN_SLOT_WIDTH)))
+        self._load_chart('periods', max_points=max_points, **self.period_params())
+    
+    def _load_chart(self, kind, **params):
+        """Affiche le graphique depuis le cache, sinon le prépare en arrière-plan"""
+        tasks.cancel(self)  # Un seul graphique à la fois
+        key = chart_cache.key(kind, sorted(params.items()))
+        
+        cached = chart_cache.get(key)
+        if cached is not None:
+            self._show_chart(cached)
+            return
+        
         self.content_area.clear_widgets()
+        self.content_area.add_widget(self.loading_label())
         
-        data = DatabaseManager.get_operator_summary()
+        self.run_task(
+            lambda: self._chart_spec(kind, **params),
+            on_success=lambda result: self.display_chart(result, key),
+            on_error=self._show_chart_error
+        )
+    
+    def _chart_spec(self, kind, **params):
+        """Thread de travail : séries du graphique (ou None sans données)
+        
+        Aucun widget n'est lu ici : le libellé de la période est passé
+        par le thread principal (period_params).
+        Description dessinée par charts.py :
+        {'kind': 'pie'|'bar', 'title', 'series': [(nom, valeurs)], 'x_labels'}
+        """
+        if kind == 'operators':
+            return self._operator_chart_spec(**params)
+        return self._period_chart_spec(**params)
+    
+    def _period_bounds(self, days):
+        """(premier jour, aujourd'hui) ; premier jour None : depuis le début"""
+        today = DatabaseManager.local_today()
+        if days is None:
+            return None, today
+        return today - timedelta(days=days - 1), today
+    
+    def _operator_chart_spec(self, label, days=None):
+        # Totaux par opérateur calculés par SQLite ; jours exacts : la
+        # répartition ne doit pas déborder de la période
+        start, end = self._period_bounds(days)
+        if days is None:
+            data = DatabaseManager.get_operator_summary(by_type=False)
+        else:
+            data = DatabaseManager.get_operator_summary(start, end, by_type=False)
         if not data:
-            self.content_area.add_widget(Label(
-                text='Aucune donnée disponible',
-                color=COLORS['GRAY']
-            ))
-            return
+            return None
         
-        # Créer graphique circulaire
-        chart = pygal.Pie(
-            print_values=True,
-            inner_radius=0.4,
-            legend_at_bottom=True,
-            legend_font_size=10
+        return {
+            'kind': 'pie',
+            'title': f'Répartition par Opérateur ({label})',
+            'series': [(operator, float(total)) for operator, total, _count in data],
+            'x_labels': []
+        }
+    
+    def _period_chart_spec(self, label, days, max_points):
+        """Barres par période ; la résolution (jour, semaine, mois, année)
+        est la plus fine qui tient dans max_points"""
+        start, end = self._period_bounds(days)
+        summary = DatabaseManager.get_period_summary(
+            start, end, max_points=max_points, by_operator=False
         )
-        chart.title = 'Répartition par Opérateur'
+        if not summary['rows']:
+            return None
         
-        df = pd.DataFrame(data, columns=['operator', 'type', 'amount', 'count'])
-        totals = df.groupby('operator')['amount'].sum()
+        # Une ligne par (période, type) : opérateurs additionnés par SQLite
+        totals = {
+            (period, trans_type): amount
+            for period, trans_type, amount, _count in summary['rows']
+        }
+        found = {trans_type for _, trans_type in totals}
+        types = [t for t in TRANSACTION_TYPES if t in found]
+        types += sorted(found.difference(types))
         
-        for operator, total in totals.items():
-            chart.add(operator, total)
+        # Périodes denses : celles sans transaction apparaissent à zéro
+        resolution, periods = summary['resolution'], summary['periods']
+        return {
+            'kind': 'bar',
+            'title': f'{label} ({self.RESOLUTION_TITLES[resolution]})',
+            'series': [
+                (trans_type, [float(max(0, totals.get((key, trans_type), 0)))
+                              for key, _ in periods])
+                for trans_type in types
+            ],
+            'x_labels': self._thin_labels([
+                self._period_label(resolution, key, first_day)
+                for key, first_day in periods
+            ])
+        }
+    
+    @classmethod
+    def _period_label(cls, resolution, key, first_day):
+        if resolution == 'day':
+            return first_day.strftime('%d/%m')
+        if resolution == 'week':
+            return 'S' + key.split('W')[1]
+        if resolution == 'month':
+            return f'{cls.MONTHS[first_day.month - 1]} {first_day:%y}'
+        return key
+    
+    @staticmethod
+    def _thin_labels(labels, max_labels=15):
+        """Garde au plus max_labels étiquettes lisibles (une sur k)"""
+        step = -(-len(labels) // max_labels)  # division arrondie au supérieur
+        if step <= 1:
+            return labels
+        last = len(labels) - 1
+        return [
+            label if (last - i) % step == 0 else ''
+            for i, label in enumerate(labels)
+        ]
+    
+    def _build_native_chart(self, spec):
+        """Graphique dessiné directement sur le canvas Kivy"""
+        from charts import BarChart, PieChart
         
-        self.display_chart(chart)
+        options = dict(
+            title=spec['title'],
+            legend_at_bottom=True,
+            legend_font_size=10,
+            size_hint_y=None,
+            height=self.chart_height
+        )
+        if spec['kind'] == 'pie':
+            chart = PieChart(print_values=True, inner_radius=0.4, **options)
+        else:
+            chart = BarChart(
+                x_label_rotation=45,
+                print_values=False,
+                x_labels=spec['x_labels'],
+                **options
+            )
+        
+        for name, values in spec['series']:
+            chart.add(name, values)
+        return chart
     
-    def show_daily_stats(self):
-        self.content_area.clear_widgets()
+    def display_chart(self, result, key=None):
+        """Affiche le résultat d'une tâche (thread principal)
         
-        data = DatabaseManager.get_daily_summary(days=7)
-        if not data:
+        result : description des séries, ou None sans données. Ce qui
+        est affiché est mis en cache.
+        """
+        cached = result if result is not None else False
+        if key is not None:
+            chart_cache.put(key, cached)
+        self._show_chart(cached)
+    
+    def _show_chart(self, cached):
+        self.content_area.clear_widgets()
+        if cached is False:
             self.content_area.add_widget(Label(
                 text='Aucune donnée disponible',
                 color=COLORS['GRAY']
             ))
             return
         
-        # Graphique barres
-        chart = pygal.Bar(
-            x_label_rotation=45,
-            print_values=False,
-            legend_at_bottom=True,
-            legend_font_size=10
-        )
-        chart.title = '7 Derniers Jours'
-        
-        df = pd.DataFrame(data, columns=['date', 'operator', 'type', 'amount', 'count'])
-        df['date'] = pd.to_datetime(df['date'])
-        
-        dates = sorted(df['date'].unique())
-        chart.x_labels = [d.strftime('%d/%m') for d in dates]
-        
-        for trans_type in df['type'].unique():
-            amounts = []
-            for date in dates:
-                mask = (df['date'] == date) & (df['type'] == trans_type)
-                total = df[mask]['amount'].sum()
-                amounts.append(total if total > 0 else 0)
-            chart.add(trans_type, amounts)
-        
-        self.display_chart(chart)
+        self.content_area.add_widget(self._build_native_chart(cached))
     
-    def display_chart(self, chart):
-        """Affiche un graphique pygal"""
-        try:
-            buf = BytesIO(chart.render_to_png(dpi=72))
-            img = Image()
-            img.texture = CoreImage(buf, ext='png').texture
-            img.allow_stretch = True
-            img.size_hint_y = None
-            img.height = dp(350)
-            self.content_area.add_widget(img)
-        except Exception as e:
-            self.content_area.add_widget(Label(
-                text=f'Erreur graphique: {str(e)}',
-                color=COLORS['ERROR']
-            ))
+    def _show_chart_error(self, error):
+        self.content_area.clear_widgets()
+        self.content_area.add_widget(Label(
+            text=f'Erreur graphique: {str(error)}',
+            color=COLORS['ERROR']
+        ))
     
     def go_back(self, instance):
         app = App.get_running_app()
@@ -1091,13 +1477,17 @@ class AdminMenuScreen(BaseScreen):
             spacing=dp(5)
         )
         
-        header.add_widget(Label(
+        title = Label(
             text='ADMINISTRATION',
             font_size=responsive.get_font_size(28),
             bold=True,
             color=COLORS['PRIMARY'],
             size_hint_y=0.6
-        ))
+        )
+        # Accès caché aux diagnostics : cinq touches rapides sur le titre
+        self._title_taps = []
+        title.bind(on_touch_down=self._on_title_touch)
+        header.add_widget(title)
         
         header.add_widget(Label(
             text='Espace Gestionnaire',
@@ -1112,15 +1502,17 @@ class AdminMenuScreen(BaseScreen):
         grid = GridLayout(
             cols=1,
             spacing=responsive.get_spacing(),
-            size_hint_y=None,
-            height=dp(400)
+            size_hint_y=None
         )
+        grid.bind(minimum_height=grid.setter('height'))
         
         buttons = [
             ('👤 NOUVEL AGENT', COLORS['PRIMARY'], self.show_register),
             ('💼 SOLDES AGENTS', COLORS['SECONDARY'], self.go_balance),
             ('📥 IMPORT EXCEL', [0.2, 0.6, 0.2, 1], self.show_import),
+            ('📤 EXPORT', [0.2, 0.6, 0.2, 1], self.show_export),
             ('📊 STATISTIQUES', COLORS['PRIMARY'], self.go_stats),
+            ('📜 HISTORIQUE', COLORS['SECONDARY'], self.go_history),
             ('🚪 DÉCONNEXION', [0.6, 0.6, 0.6, 1], self.logout)
         ]
         
@@ -1136,6 +1528,17 @@ class AdminMenuScreen(BaseScreen):
         root.add_widget(container)
         self.add_widget(root)
     
+    def _on_title_touch(self, label, touch):
+        if not label.collide_point(*touch.pos):
+            return False
+        now = time.monotonic()
+        self._title_taps = [tap for tap in self._title_taps if now - tap < 3] + [now]
+        if len(self._title_taps) >= 5:
+            self._title_taps = []
+            self.manager.current = 'diagnostics'
+            return True
+        return False
+    
     def show_register(self, instance):
         """Popup d'enregistrement d'agent"""
         content = BoxLayout(
@@ -1225,21 +1628,32 @@ class AdminMenuScreen(BaseScreen):
             self.error_label.text = 'Mot de passe trop court (min 4 caractères)'
             return
         
-        if DatabaseManager.add_user(username, password, 'agent'):
-            self.popup.dismiss()
-            self.show_popup('Succès', f'Agent {username} créé avec succès!', 'SUCCESS')
-        else:
-            self.error_label.text = "Ce nom d'utilisateur existe déjà"
+        self.error_label.text = ''
+        
+        def on_added(created):
+            if created:
+                self.popup.dismiss()
+                self.show_popup('Succès', f'Agent {username} créé avec succès!', 'SUCCESS')
+            else:
+                self.error_label.text = "Ce nom d'utilisateur existe déjà"
+        
+        tasks.submit(
+            DatabaseManager.add_user, username, password, 'agent',
+            on_success=on_added,
+            on_error=lambda e: setattr(self.error_label, 'text', str(e))
+        )
     
     def go_balance(self, instance):
         self.manager.current = 'balance'
     
     def show_import(self, instance):
         """Popup d'importation de fichier"""
+        from kivy.uix.filechooser import FileChooserIconView
+        
         content = BoxLayout(orientation='vertical', padding=dp(10))
         
         content.add_widget(Label(
-            text='Sélectionner un fichier Excel',
+            text='Sélectionner un fichier Excel ou CSV',
             font_size=responsive.get_font_size(16),
             color=COLORS['PRIMARY'],
             size_hint_y=None,
@@ -1247,7 +1661,7 @@ class AdminMenuScreen(BaseScreen):
         ))
         
         filechooser = FileChooserIconView(
-            filters=['*.xlsx', '*.xls'],
+            filters=['*.xlsx', '*.xls', '*.csv'],
             path='/sdcard' if IS_MOBILE else '~',
             size_hint_y=0.7
         )
@@ -1261,7 +1675,8 @@ class AdminMenuScreen(BaseScreen):
         
         def do_import(x):
             if filechooser.selection:
-                self.simulate_import(filechooser.selection[0])
+                popup.dismiss()
+                self.run_import(filechooser.selection[0])
         
         btn_import = ResponsiveButton(
             text='IMPORTER',
@@ -1286,48 +1701,186 @@ class AdminMenuScreen(BaseScreen):
         )
         popup.open()
     
-    def simulate_import(self, filepath):
-        """Simule l'importation avec barre de progression"""
+    def run_import(self, filepath):
+        """Importe le fichier dans un thread, avec barre de progression"""
+        popup, update, cancel_event = self._progress_popup('Importation en cours...')
+        
+        def on_progress(fraction, imported, rejected):
+            update(fraction, f'{imported:,} lignes importées, {rejected:,} rejetées')
+        
+        def on_done(result, error):
+            popup.dismiss()
+            filename = os.path.basename(filepath)
+            if error is not None:
+                self.show_popup('Erreur', f'{filename}:\n{error}')
+                return
+            message = (
+                f'{filename}\n{result["imported"]:,} lignes importées, '
+                f'{result["rejected"]:,} rejetées'
+            )
+            if result['cancelled']:
+                self.show_popup('Import interrompu', message)
+            else:
+                self.show_popup('Succès', message, 'SUCCESS')
+        
+        app = App.get_running_app()
+        importer = TransactionImporter(
+            filepath,
+            default_agent_id=app.current_user['id'] if app.current_user else None,
+            progress=on_progress,
+            cancel_event=cancel_event
+        )
+        
+        # Sans propriétaire : l'import continue si l'admin change d'écran.
+        # Pool des traitements longs : connexion et saisie restent libres
+        jobs.submit(
+            importer.run,
+            cancel_event=cancel_event,
+            on_success=lambda result: on_done(result, None),
+            on_error=lambda error: on_done(None, error)
+        )
+    
+    # Périodes d'export : libellé -> nombre de jours (None : tout)
+    EXPORT_PERIODS = {
+        'Tout': None,
+        '7 derniers jours': 7,
+        '30 derniers jours': 30,
+        '90 derniers jours': 90,
+        '12 derniers mois': 365,
+    }
+    EXPORT_FORMATS = {'CSV': '.csv', 'Excel (.xlsx)': '.xlsx'}
+    
+    def show_export(self, instance):
+        """Popup d'export : période, agent, opérateur et format"""
         content = BoxLayout(
             orientation='vertical',
-            padding=dp(30),
-            spacing=dp(20)
+            padding=dp(20),
+            spacing=responsive.get_spacing()
         )
         
         content.add_widget(Label(
-            text='Importation en cours...',
-            font_size=responsive.get_font_size(16)
+            text='Exporter les transactions',
+            font_size=responsive.get_font_size(18),
+            bold=True,
+            color=COLORS['PRIMARY'],
+            size_hint_y=None,
+            height=dp(40)
         ))
         
-        progress = ProgressBar(max=100, value=0)
-        content.add_widget(progress)
+        spinner_height = responsive.get_button_height()
+        period = Spinner(
+            text='Tout', values=list(self.EXPORT_PERIODS),
+            size_hint_y=None, height=spinner_height
+        )
+        agent = Spinner(
+            text='Tous les agents', values=['Tous les agents'],
+            size_hint_y=None, height=spinner_height
+        )
+        operator = Spinner(
+            text='Tous les opérateurs', values=['Tous les opérateurs'] + OPERATORS,
+            size_hint_y=None, height=spinner_height
+        )
+        file_format = Spinner(
+            text='CSV', values=list(self.EXPORT_FORMATS),
+            size_hint_y=None, height=spinner_height
+        )
+        for spinner in (period, agent, operator, file_format):
+            content.add_widget(spinner)
+        
+        agents = {}
+        
+        def fill_agents(rows):
+            agents.update({username: agent_id for agent_id, username in rows})
+            agent.values = ['Tous les agents'] + list(agents)
+        
+        self.run_task(DatabaseManager.get_all_agents, on_success=fill_agents)
+        
+        btn_layout = BoxLayout(
+            size_hint_y=None,
+            height=responsive.get_button_height(),
+            spacing=dp(10)
+        )
+        
+        def do_export(x):
+            popup.dismiss()
+            days = self.EXPORT_PERIODS[period.text]
+            start = None
+            if days:
+                # Jours locaux (DatabaseManager.UTC_OFFSET_MINUTES)
+                today = DatabaseManager.local_today()
+                start = (today - timedelta(days=days - 1)).isoformat()
+            self.run_export(
+                self.EXPORT_FORMATS[file_format.text],
+                start=start,
+                agent_id=agents.get(agent.text),
+                operator=operator.text if operator.text in OPERATORS else None
+            )
+        
+        btn_layout.add_widget(ResponsiveButton(
+            text='EXPORTER',
+            bg_color=COLORS['PRIMARY'],
+            on_press=do_export
+        ))
+        btn_layout.add_widget(ResponsiveButton(
+            text='ANNULER',
+            bg_color=[0.6, 0.6, 0.6, 1],
+            on_press=lambda x: popup.dismiss()
+        ))
+        content.add_widget(btn_layout)
         
         popup = Popup(
-            title='Veuillez patienter',
+            title='Export',
             content=content,
-            size_hint=(0.8, 0.3),
-            auto_dismiss=False
+            size_hint=(0.9, 0.7)
         )
         popup.open()
+    
+    def run_export(self, extension, **filters):
+        """Exporte dans un thread, avec barre de progression"""
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filepath = os.path.join(
+            App.get_running_app().export_dir(), f'transactions_{stamp}{extension}'
+        )
+        
+        popup, update, cancel_event = self._progress_popup('Export en cours...')
+        
+        def on_progress(fraction, exported):
+            update(fraction, f'{exported:,} lignes exportées')
         
-        def update_progress(dt):
-            if progress.value < 100:
-                progress.value += 20
-                return True
+        def on_done(result, error):
+            popup.dismiss()
+            if error is not None:
+                self.show_popup('Erreur', str(error))
+            elif result['cancelled']:
+                self.show_popup('Export interrompu', f'{result["exported"]:,} lignes, fichier supprimé')
             else:
-                popup.dismiss()
                 self.show_popup(
                     'Succès',
-                    f'Fichier importé:\n{filepath.split("/")[-1]}',
+                    f'{result["exported"]:,} lignes\n{os.path.basename(result["path"])}',
                     'SUCCESS'
                 )
-                return False
         
-        Clock.schedule_interval(update_progress, 0.3)
+        exporter = TransactionExporter(
+            filepath,
+            progress=on_progress,
+            cancel_event=cancel_event,
+            **filters
+        )
+        
+        # Sans propriétaire et sur le pool des traitements longs, comme l'import
+        jobs.submit(
+            exporter.run,
+            cancel_event=cancel_event,
+            on_success=lambda result: on_done(result, None),
+            on_error=lambda error: on_done(None, error)
+        )
     
     def go_stats(self, instance):
         self.manager.current = 'stats'
     
+    def go_history(self, instance):
+        self.manager.current = 'history'
+    
     def logout(self, instance):
         App.get_running_app().current_user = None
         self.manager.current = 'login'
@@ -1337,6 +1890,7 @@ class BalanceScreen(BaseScreen):
     
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.agents_map = {}
         self.setup_ui()
     
     def setup_ui(self):
@@ -1395,11 +1949,11 @@ class BalanceScreen(BaseScreen):
         )
         
         with self.balance_card.canvas.before:
-            Color(*COLORS['PRIMARY'])
+            self.balance_color = Color(rgba=COLORS['PRIMARY'])
             self.balance_rect = RoundedRectangle(
                 pos=self.balance_card.pos,
                 size=self.balance_card.size,
-                radius=[dp(12),]
+                radius=RADIUS['button']
             )
         
         self.balance_card.bind(pos=self._update_balance_rect, size=self._update_balance_rect)
@@ -1443,79 +1997,699 @@ class BalanceScreen(BaseScreen):
     
     def on_enter(self):
         """Chargement de la liste des agents"""
-        agents = DatabaseManager.get_all_agents()
+        self.agents_map = {}
+        self.agent_spinner.values = []
+        self.agent_spinner.text = 'Choisir un agent'
+        self.balance_label.text = 'Chargement...'
+        self.details_label.text = ''
+        self.run_task(DatabaseManager.get_all_agents, on_success=self._show_agents)
+    
+    def _show_agents(self, agents):
         self.agents_map = {name: id for id, name in agents}
         self.agent_spinner.values = list(self.agents_map.keys())
-        self.agent_spinner.text = 'Choisir un agent'
         self.balance_label.text = 'Sélectionnez un agent'
-        self.details_label.text = ''
     
     def on_agent_select(self, spinner, text):
         if text == 'Choisir un agent' or text not in self.agents_map:
             return
         
         agent_id = self.agents_map[text]
-        balance_info = DatabaseManager.get_agent_balance(agent_id)
-        
+        tasks.cancel(self)  # Seul le dernier agent choisi compte
+        self.balance_label.text = 'Chargement...'
+        self.details_label.text = ''
+        self.run_task(
+            DatabaseManager.get_agent_balance, agent_id,
+            on_success=self._show_balance
+        )
+    
+    def _show_balance(self, balance_info):
         balance = balance_info['balance']
         deposits = balance_info['deposits']
         withdrawals = balance_info['withdrawals']
         
-        # Animation de changement de couleur selon le solde
+        # Couleur de la carte selon le solde (mêmes instructions, seule
+        # la couleur change)
         if balance < 0:
             color = COLORS['ERROR']
         elif balance > 1000000:
             color = COLORS['SUCCESS']
         else:
             color = COLORS['PRIMARY']
-        
-        self.balance_card.canvas.before.clear()
-        with self.balance_card.canvas.before:
-            Color(*color)
-            self.balance_rect = RoundedRectangle(
-                pos=self.balance_card.pos,
-                size=self.balance_card.size,
-                radius=[dp(12),]
-            )
+        self.balance_color.rgba = color
         
         self.balance_label.text = f'{balance:,.0f} XOF'
         self.details_label.text = f'Dépôts: {deposits:,.0f} | Retraits: {withdrawals:,.0f}'
 
+class HistoryRow(BoxLayout):
+    """Ligne de l'historique (vue recyclée par RecycleView)"""
+    
+    title = StringProperty('')
+    subtitle = StringProperty('')
+    amount = StringProperty('')
+    amount_color = ListProperty(COLORS['TEXT'])
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.padding = [dp(12), dp(6)]
+        self.spacing = dp(10)
+        
+        with self.canvas.before:
+            Color(*COLORS['WHITE'])
+            self.rect = Rectangle(pos=self.pos, size=self.size)
+            Color(*COLORS['BACKGROUND'])
+            self.separator = Rectangle(pos=self.pos, size=(self.width, dp(1)))
+        self.bind(pos=self._update_rect, size=self._update_rect)
+        
+        texts = BoxLayout(orientation='vertical')
+        self.title_label = Label(
+            font_size=responsive.get_font_size(15),
+            bold=True,
+            color=COLORS['TEXT'],
+            halign='left',
+            valign='middle'
+        )
+        self.subtitle_label = Label(
+            font_size=responsive.get_font_size(12),
+            color=COLORS['GRAY'],
+            halign='left',
+            valign='middle'
+        )
+        for label in (self.title_label, self.subtitle_label):
+            label.bind(size=label.setter('text_size'))
+            texts.add_widget(label)
+        
+        self.amount_label = Label(
+            font_size=responsive.get_font_size(15),
+            bold=True,
+            size_hint_x=0.4,
+            halign='right',
+            valign='middle'
+        )
+        self.amount_label.bind(size=self.amount_label.setter('text_size'))
+        
+        self.add_widget(texts)
+        self.add_widget(self.amount_label)
+        
+        self.bind(
+            title=self.title_label.setter('text'),
+            subtitle=self.subtitle_label.setter('text'),
+            amount=self.amount_label.setter('text'),
+            amount_color=self.amount_label.setter('color')
+        )
+    
+    def _update_rect(self, *args):
+        self.rect.pos = self.pos
+        self.rect.size = self.size
+        self.separator.pos = self.pos
+        self.separator.size = (self.width, dp(1))
+
+class HistoryScreen(BaseScreen):
+    """Historique des transactions, chargé page par page au défilement
+    
+    Seule une fenêtre de MAX_PAGES pages est gardée en mémoire : les pages
+    qui sortent d'un côté sont rechargées par curseur si l'utilisateur
+    revient en arrière.
+    """
+    
+    MAX_PAGES = 6
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.row_height = dp(64)
+        self._reset_state()
+        self.setup_ui()
+    
+    def _reset_state(self):
+        self.agent_id = None
+        self._cursors = []          # (timestamp, id) de chaque ligne affichée
+        self._pages = deque()       # nombre de lignes de chaque page
+        self._has_older = True
+        self._has_newer = False
+        self._loading = False
+    
+    def setup_ui(self):
+        root = BoxLayout(
+            orientation='vertical',
+            padding=responsive.get_padding(),
+            spacing=responsive.get_spacing()
+        )
+        
+        root.add_widget(Label(
+            text='HISTORIQUE',
+            font_size=responsive.get_font_size(24),
+            bold=True,
+            color=COLORS['PRIMARY'],
+            size_hint_y=None,
+            height=dp(50)
+        ))
+        
+        self.rv = RecycleView(viewclass=HistoryRow, bar_width=dp(4))
+        rv_layout = RecycleBoxLayout(
+            orientation='vertical',
+            default_size=(None, self.row_height),
+            default_size_hint=(1, None),
+            size_hint_y=None
+        )
+        rv_layout.bind(minimum_height=rv_layout.setter('height'))
+        self.rv.add_widget(rv_layout)
+        self.rv.bind(scroll_y=self._on_scroll)
+        root.add_widget(self.rv)
+        
+        self.status_label = Label(
+            text='',
+            font_size=responsive.get_font_size(12),
+            color=COLORS['GRAY'],
+            size_hint_y=None,
+            height=dp(24)
+        )
+        root.add_widget(self.status_label)
+        
+        btn_back = ResponsiveButton(
+            text='RETOUR',
+            bg_color=[0.6, 0.6, 0.6, 1],
+            on_press=self.go_back
+        )
+        root.add_widget(btn_back)
+        
+        self.add_widget(root)
+    
+    def on_enter(self):
+        app = App.get_running_app()
+        self._reset_state()
+        if app.current_user and app.current_user['role'] != 'admin':
+            self.agent_id = app.current_user['id']
+        self.rv.data = []
+        self.rv.scroll_y = 1
+        self.load_page(newer=False)
+    
+    def on_leave(self):
+        super().on_leave()
+        # Libère la fenêtre de lignes en quittant l'écran
+        self.rv.data = []
+        self._reset_state()
+    
+    def _on_scroll(self, rv, scroll_y):
+        if self._loading or not self.rv.data:
+            return
+        if scroll_y <= 0.05 and self._has_older:
+            self.load_page(newer=False)
+        elif scroll_y >= 0.95 and self._has_newer:
+            self.load_page(newer=True)
+    
+    def load_page(self, newer):
+        self._loading = True
+        cursor = (None, None)
+        if self._cursors:
+            cursor = self._cursors[0] if newer else self._cursors[-1]
+        self.status_label.text = 'Chargement...'
+        self.run_task(
+            DatabaseManager.get_transactions_page,
+            self.agent_id, *cursor, newer=newer,
+            on_success=lambda rows: self._show_page(rows, newer),
+            on_error=self._on_page_error
+        )
+    
+    def _on_page_error(self, error):
+        self._loading = False
+        self.status_label.text = f'Erreur: {error}'
+    
+    def _show_page(self, rows, newer):
+        limit = DatabaseManager.PAGE_SIZE
+        if newer:
+            self._has_newer = len(rows) == limit
+        else:
+            self._has_older = len(rows) == limit
+        
+        if not rows:
+            self._loading = False
+            self._update_status()
+            return
+        
+        # Position de la vue, mesurée depuis le haut du contenu
+        view_height = self.rv.height
+        content_height = len(self.rv.data) * self.row_height
+        offset = (1 - self.rv.scroll_y) * max(content_height - view_height, 0)
+        
+        items = [self._row_to_item(row) for row in rows]
+        cursors = [(row[4], row[0]) for row in rows]
+        data = list(self.rv.data)
+        
+        if newer:
+            data[:0] = items
+            self._cursors[:0] = cursors
+            self._pages.appendleft(len(rows))
+            offset += len(rows) * self.row_height
+        else:
+            data.extend(items)
+            self._cursors.extend(cursors)
+            self._pages.append(len(rows))
+        
+        # Fenêtre glissante : on oublie la page du côté opposé
+        if len(self._pages) > self.MAX_PAGES:
+            if newer:
+                dropped = self._pages.pop()
+                del data[-dropped:]
+                del self._cursors[-dropped:]
+                self._has_older = True
+            else:
+                dropped = self._pages.popleft()
+                del data[:dropped]
+                del self._cursors[:dropped]
+                self._has_newer = True
+                offset -= dropped * self.row_height
+        
+        self.rv.data = data
+        
+        new_content_height = len(data) * self.row_height
+        scrollable = new_content_height - view_height
+        scroll_y = 1 - offset / scrollable if scrollable > 0 else 1
+        Clock.schedule_once(
+            lambda dt: self._restore_scroll(min(max(scroll_y, 0), 1)), 0
+        )
+    
+    def _restore_scroll(self, scroll_y):
+        self.rv.scroll_y = scroll_y
+        self._loading = False
+        self._update_status()
+    
+    def _update_status(self):
+        if not self.rv.data:
+            self.status_label.text = 'Aucune transaction'
+        elif self._has_older:
+            self.status_label.text = 'Faites défiler pour charger la suite'
+        else:
+            self.status_label.text = "Fin de l'historique"
+    
+    def _row_to_item(self, row):
+        _tx_id, operator, trans_type, amount, timestamp, username = row
+        is_deposit = trans_type == 'Dépôt'
+        subtitle = DatabaseManager.local_time(timestamp)
+        if self.agent_id is None and username:
+            subtitle = f'{subtitle} · {username}'
+        return {
+            'title': f'{trans_type} · {operator}',
+            'subtitle': subtitle,
+            'amount': f'{"+" if is_deposit else "-"}{amount:,.0f} XOF',
+            'amount_color': COLORS['PRIMARY'] if is_deposit else COLORS['SECONDARY']
+        }
+    
+    def go_back(self, instance):
+        app = App.get_running_app()
+        if app.current_user['role'] == 'admin':
+            self.manager.current = 'admin_menu'
+        else:
+            self.manager.current = 'menu'
+
+class DiagnosticsScreen(BaseScreen):
+    """Diagnostics (caché) : requêtes SQL lentes et temps par requête
+    
+    Accessible en touchant cinq fois le titre du menu administrateur ;
+    l'export JSON est destiné au support.
+    """
+    
+    THRESHOLDS = ['10 ms', '50 ms', '100 ms', '250 ms', '1000 ms']
+    VIEWS = ['Requêtes lentes', 'Temps par requête']
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.setup_ui()
+    
+    def setup_ui(self):
+        root = BoxLayout(
+            orientation='vertical',
+            padding=responsive.get_padding(),
+            spacing=responsive.get_spacing()
+        )
+        
+        root.add_widget(Label(
+            text='DIAGNOSTICS',
+            font_size=responsive.get_font_size(24),
+            bold=True,
+            color=COLORS['PRIMARY'],
+            size_hint_y=None,
+            height=dp(50)
+        ))
+        
+        filters = BoxLayout(
+            size_hint_y=None,
+            height=responsive.get_button_height(),
+            spacing=dp(10)
+        )
+        self.view_spinner = Spinner(text=self.VIEWS[0], values=self.VIEWS)
+        self.view_spinner.bind(text=lambda *args: self.refresh())
+        self.threshold_spinner = Spinner(
+            text=f'{query_log.threshold_ms:g} ms',
+            values=self.THRESHOLDS,
+            size_hint_x=0.5
+        )
+        self.threshold_spinner.bind(text=self._on_threshold)
+        filters.add_widget(self.view_spinner)
+        filters.add_widget(self.threshold_spinner)
+        root.add_widget(filters)
+        
+        self.rv = RecycleView(viewclass=HistoryRow, bar_width=dp(4))
+        rv_layout = RecycleBoxLayout(
+            orientation='vertical',
+            default_size=(None, dp(64)),
+            default_size_hint=(1, None),
+            size_hint_y=None
+        )
+        rv_layout.bind(minimum_height=rv_layout.setter('height'))
+        self.rv.add_widget(rv_layout)
+        root.add_widget(self.rv)
+        
+        self.status_label = Label(
+            text='',
+            font_size=responsive.get_font_size(12),
+            color=COLORS['GRAY'],
+            size_hint_y=None,
+            height=dp(24)
+        )
+        root.add_widget(self.status_label)
+        
+        actions = BoxLayout(
+            size_hint_y=None,
+            height=responsive.get_button_height(),
+            spacing=dp(10)
+        )
+        for text, color, callback in (
+            ('ACTUALISER', COLORS['PRIMARY'], lambda *args: self.refresh()),
+            ('EXPORTER', COLORS['SUCCESS'], self.export),
+            ('VIDER', COLORS['SECONDARY'], self.clear),
+        ):
+            actions.add_widget(ResponsiveButton(text=text, bg_color=color, on_press=callback))
+        root.add_widget(actions)
+        
+        root.add_widget(ResponsiveButton(
+            text='RETOUR',
+            bg_color=[0.6, 0.6, 0.6, 1],
+            on_press=self.go_back
+        ))
+        
+        self.add_widget(root)
+    
+    def on_enter(self):
+        self.refresh()
+    
+    def _on_threshold(self, spinner, text):
+        query_log.threshold_ms = float(text.split()[0])
+    
+    def refresh(self):
+        if self.view_spinner.text == self.VIEWS[0]:
+            entries = query_log.entries()
+            self.rv.data = [self._slow_row(entry) for entry in entries]
+            self.status_label.text = (
+                f'{len(entries)} requête(s) > {query_log.threshold_ms:g} ms'
+            )
+        else:
+            stats = query_log.stats(limit=50)
+            self.rv.data = [self._stats_row(item) for item in stats]
+            self.status_label.text = f'{len(stats)} requête(s) distincte(s)'
+    
+    @staticmethod
+    def _short(sql, length=60):
+        return sql if len(sql) <= length else sql[:length - 1] + '…'
+    
+    def _slow_row(self, entry):
+        plan = (entry['plan'] or ['-'])[0]
+        return {
+            'title': self._short(entry['sql']),
+            'subtitle': f"{entry['at']} · {entry['rows']} ligne(s) · {plan}",
+            'amount': f"{entry['duration_ms']:,.1f} ms",
+            'amount_color': COLORS['ERROR']
+        }
+    
+    def _stats_row(self, item):
+        return {
+            'title': self._short(item['sql']),
+            'subtitle': (f"{item['count']}× · moy. {item['mean_ms']:,.2f} ms · "
+                         f"max {item['max_ms']:,.1f} ms · {item['rows']:,} lignes"),
+            'amount': f"{item['total_ms']:,.0f} ms",
+            'amount_color': COLORS['PRIMARY']
+        }
+    
+    def export(self, instance):
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        path = os.path.join(App.get_running_app().export_dir(), f'diagnostics_{stamp}.json')
+        self.run_task(
+            query_log.export, path,
+            on_success=lambda path: self.show_popup('Export', path, 'SUCCESS')
+        )
+    
+    def clear(self, instance):
+        query_log.clear()
+        self.refresh()
+    
+    def go_back(self, instance):
+        self.manager.current = 'admin_menu'
+
 # =============================================================================
 # APPLICATION PRINCIPALE
 # =============================================================================
 
+class LazyScreenManager(ScreenManager):
+    """ScreenManager dont les écrans sont construits à la première navigation
+    
+    register() enregistre une fabrique ; l'écran est instancié lorsque
+    get_screen() (donc current = nom) le demande pour la première fois.
+    """
+    
+    def __init__(self, **kwargs):
+        self._factories = {}
+        super().__init__(**kwargs)
+    
+    def register(self, name, factory):
+        self._factories[name] = factory
+    
+    def add_widget(self, screen, *args, **kwargs):
+        if startup.enabled:
+            screen.bind(on_enter=lambda s: startup.mark(f'enter:{s.name}'))
+        super().add_widget(screen, *args, **kwargs)
+    
+    def get_screen(self, name):
+        factory = self._factories.pop(name, None)
+        if factory is not None:
+            with startup.phase(f'screen:{name}'):
+                screen = factory(name=name)
+            self.add_widget(screen)
+        return super().get_screen(name)
+    
+    def has_screen(self, name):
+        return name in self._factories or super().has_screen(name)
+    
+    def prewarm(self, names, delay=0.5):
+        """Construit les écrans en attente, un par frame, pendant les temps morts"""
+        pending = [name for name in names if name in self._factories]
+        
+        def build_next(dt):
+            if not pending:
+                return
+            self.get_screen(pending.pop(0))
+            Clock.schedule_once(build_next, 0)
+        
+        Clock.schedule_once(build_next, delay)
+
 class MobileMoneyApp(App):
     
     current_user = ObjectProperty(None, allownone=True)
     
+    # Écrans construits à la demande (nom -> classe)
+    SCREENS = {
+        'menu': MenuScreen,
+        'transaction': TransactionScreen,
+        'stats': StatsScreen,
+        'admin_menu': AdminMenuScreen,
+        'balance': BalanceScreen,
+        'history': HistoryScreen,
+        'diagnostics': DiagnosticsScreen,
+    }
+    
+    # Préchauffage après connexion, selon le rôle
+    PREWARM = True
+    PREWARM_SCREENS = {
+        'agent': ['transaction', 'stats', 'history'],
+        'admin': ['stats', 'balance', 'history'],
+    }
+    
+    # Synchronisation avec le siège (désactivée sans URL : MM_SYNC_URL ou
+    # réglage 'sync_url' ; jeton de l'appareil : MM_SYNC_TOKEN ou 'sync_token')
+    SYNC_INTERVAL = 15 * 60     # secondes entre deux passages
+    SYNC_BACKOFF_MAX = 6 * 3600 # plafond après des échecs répétés
+    
     def build(self):
+        with startup.phase('build'):
+            return self._build()
+    
+    def _build(self):
         # Configuration fenêtre
         Window.clearcolor = COLORS['BACKGROUND']
         
         # Initialisation DB
-        DatabaseManager.init_database()
+        with startup.phase('db_init'):
+            DatabaseManager.init_database()
         
         # Gestionnaire d'écrans avec transition fluide
-        sm = ScreenManager(transition=FadeTransition(duration=0.3))
+        sm = LazyScreenManager(transition=FadeTransition(duration=0.3))
         
-        # Ajout des écrans
-        sm.add_widget(LoginScreen(name='login'))
-        sm.add_widget(MenuScreen(name='menu'))
-        sm.add_widget(TransactionScreen(name='transaction'))
-        sm.add_widget(StatsScreen(name='stats'))
-        sm.add_widget(AdminMenuScreen(name='admin_menu'))
-        sm.add_widget(BalanceScreen(name='balance'))
+        # Seul l'écran de connexion est construit au démarrage ; les autres
+        # le sont à la première navigation
+        with startup.phase('screen:login'):
+            login = LoginScreen(name='login')
+        sm.add_widget(login)
+        for name, factory in self.SCREENS.items():
+            sm.register(name, factory)
         
         return sm
     
+    def prewarm(self, role):
+        """Après connexion : prépare les écrans en temps mort"""
+        if not self.PREWARM:
+            return
+        names = self.PREWARM_SCREENS.get(role, [])
+        self.root.prewarm(names)
+    
+    def export_dir(self):
+        """Dossier des exports (créé au besoin)"""
+        try:
+            folder = os.path.join(self.user_data_dir, 'exports')
+            os.makedirs(folder, exist_ok=True)
+        except OSError:
+            folder = os.getcwd()
+        return folder
+    
+    # -------------------------------------------------------------------------
+    # Synchronisation
+    # -------------------------------------------------------------------------
+    
+    _sync_task = None
+    _sync_event = None
+    _sync_failures = 0
+    _sync_cancel = None
+    
+    @staticmethod
+    def sync_url():
+        return os.environ.get('MM_SYNC_URL') or DatabaseManager.get_setting('sync_url')
+    
+    @staticmethod
+    def sync_token():
+        return os.environ.get('MM_SYNC_TOKEN') or DatabaseManager.get_setting('sync_token')
+    
+    def schedule_sync(self, delay):
+        if self._sync_event is not None:
+            self._sync_event.cancel()
+        self._sync_event = Clock.schedule_once(lambda dt: self.sync_now(), delay)
+    
+    def sync_now(self):
+        """Lance un passage de synchronisation en arrière-plan"""
+        if self._sync_task is not None and not self._sync_task.future.done():
+            return
+        url = self.sync_url()
+        if not url:
+            return
+        from sync import SyncClient
+        
+        # Une seule tentative par passage : le backoff se fait ici, avec
+        # Clock, sans bloquer un thread de travail pendant les attentes.
+        # Pool des traitements longs : un envoi peut durer des minutes en 2G
+        self._sync_cancel = threading.Event()
+        self._sync_task = jobs.submit(
+            SyncClient(url, self.sync_token(), max_attempts=1).run, self._sync_cancel,
+            cancel_event=self._sync_cancel,
+            on_success=self._on_sync_done,
+            on_error=self._on_sync_error
+        )
+    
+    def _on_sync_done(self, result):
+        self._sync_failures = 0
+        if result['sent']:
+            Logger.info(f"Sync: {result['sent']} transaction(s), seq {result['last_seq']}")
+        self.schedule_sync(self.SYNC_INTERVAL)
+    
+    def _on_sync_error(self, error):
+        self._sync_failures += 1
+        delay = min(self.SYNC_BACKOFF_MAX, self.SYNC_INTERVAL * 2 ** (self._sync_failures - 1))
+        Logger.warning(f'Sync: {error} (nouvel essai dans {delay // 60:.0f} min)')
+        self.schedule_sync(delay)
+    
+    def on_start(self):
+        if startup.enabled:
+            Window.bind(on_draw=self._on_first_frame)
+        # Calibrage PBKDF2 (premier lancement) avant la première connexion,
+        # une fois l'écran affiché
+        Clock.schedule_once(lambda dt: tasks.submit(DatabaseManager.password_iterations), 1)
+        self.schedule_sync(5)
+        self.apply_utc_offset()
+    
+    def apply_utc_offset(self):
+        """Applique un UTC_OFFSET_MINUTES modifié
+        
+        La reconstruction réécrit tout le journal : elle passe par le pool
+        des traitements longs, derrière une popup de progression, jamais
+        dans build() (l'écran resterait figé au lancement). Les
+        enregistrements lancés entre-temps attendent qu'elle se termine
+        (DatabaseManager.rebuilding).
+        """
+        offset = DatabaseManager.pending_utc_offset()
+        if offset is None:
+            return
+        screen = self.root.current_screen
+        popup, update, _ = screen._progress_popup('Mise à jour des journées...', cancellable=False)
+        
+        def on_done(result, error):
+            popup.dismiss()
+            if error is not None:
+                screen.show_popup('Erreur', f'Décalage UTC non appliqué :\n{error}')
+        
+        jobs.submit(
+            DatabaseManager.set_utc_offset, offset,
+            progress=lambda fraction: update(fraction, 'Mise à jour des journées...'),
+            on_success=lambda result: on_done(result, None),
+            on_error=lambda error: on_done(None, error)
+        )
+    
+    def _on_first_frame(self, *args):
+        Window.unbind(on_draw=self._on_first_frame)
+        startup.mark('first_frame')
+        startup.dump()
+        if startup.exit_after:
+            Clock.schedule_once(lambda dt: self.stop())
+    
     def on_pause(self):
-        """Gestion de la mise en pause (Android)"""
+        """Gestion de la mise en pause (Android)
+        
+        Le checkpoint part sur un thread de travail : le thread Kivy doit
+        rendre la main tout de suite, sinon Android peut tuer l'application.
+        """
+        def on_error(error):
+            # Le checkpoint automatique prendra le relais
+            if not isinstance(error, sqlite3.Error):
+                Logger.error(f'Checkpoint: {error!r}')
+        
+        tasks.submit(DatabaseManager.checkpoint, on_error=on_error)
         return True
     
     def on_resume(self):
-        """Gestion de la reprise"""
-        pass
+        """Gestion de la reprise : le réseau est peut-être revenu"""
+        self.schedule_sync(2)
+    
+    def on_stop(self):
+        """Arrêt des tâches et fermeture propre des connexions SQLite
+        
+        Import, export et synchronisation s'arrêtent à leur prochain lot
+        (cancel_event) ; les connexions ne sont fermées qu'ensuite, pour
+        qu'aucun lot ne reste à moitié écrit.
+        """
+        if self._sync_event is not None:
+            self._sync_event.cancel()
+        # Les deux d'abord annulés, puis attendus : les délais ne s'ajoutent pas
+        for runner in (jobs, tasks):
+            runner.cancel_all()
+        if not all([runner.shutdown() for runner in (jobs, tasks)]):
+            # Un thread utilise encore le pool : SQLite annulera sa
+            # transaction non validée au prochain lancement
+            return
+        DatabaseManager.close()
 
 if __name__ == '__main__':
+    startup.record('module', _MODULE_T0)
     MobileMoneyApp().run()
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Serveur central : agrégation des transactions de tous les appareils
+
+Même schéma (DatabaseManager) que l'application, sur une base centrale.
+Les lots envoyés par sync.SyncClient sont reçus en parallèle (asyncio),
+puis chargés par un seul thread d'écriture qui regroupe les envois
+simultanés de plusieurs appareils dans une même transaction
+(GroupCommitWriter) : le débit croît avec la charge au lieu de
+s'effondrer sur le verrou d'écriture de SQLite.
+    
+    MM_SERVER_SECRET=... python server.py --db central.db --port 8765
+
+Authentification : chaque appareil présente « Authorization: Bearer
+<jeton> », où le jeton est HMAC-SHA256(secret, device_id). Le siège le
+remet à l'installation (réglage 'sync_token' de l'appareil) :
+    
+    MM_SERVER_SECRET=... python server.py --print-token <device_id>
+
+Un jeton n'autorise que son propre device_id. Pour un envoi, il est
+vérifié sur le device_id de l'URL avant de lire le corps : un client
+sans jeton valide ne fait rien décompresser ni décoder. L'API de
+consultation demande le jeton d'administration (--print-admin-token).
+Les agents d'un appareil ont un compte central « <device_id>/<agent> » :
+des homonymes sur deux appareils ne sont jamais fusionnés.
+
+Protocole de synchronisation (voir sync.py) :
+    
+    GET  /sync/state?device_id=...      -> {"last_seq": n}
+    POST /sync/transactions?device_id=... (gzip)
+                                        -> {"last_seq": n, "accepted": k, "duplicates": d}
+
+API de consultation (tous agents confondus) :
+    
+    GET  /api/operators                 -> get_operator_summary
+    GET  /api/daily?days=7              -> get_daily_summary
+    GET  /api/periods?start=&end=&points=60
+                                        -> get_period_summary (dates AAAA-MM-JJ)
+    GET  /api/balances                  -> soldes de tous les agents
+    GET  /api/balances/<device_id>/<agent>
+                                        -> get_agent_balance
+    GET  /api/health                    (sans jeton)
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import sys
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from database import DatabaseManager, GroupCommitWriter
+
+logger = logging.getLogger('mobile_money.server')
+
+# Colonnes attendues dans un lot, dans l'ordre de ingest_transactions
+SYNC_COLUMNS = ('seq', 'timestamp', 'agent', 'operator', 'type', 'amount')
+
+def device_token(secret, device_id):
+    """Jeton d'un appareil (HMAC-SHA256 du device_id)"""
+    return hmac.new(secret.encode(), f'device:{device_id}'.encode(), hashlib.sha256).hexdigest()
+
+def admin_token(secret):
+    """Jeton de l'API de consultation"""
+    return hmac.new(secret.encode(), b'admin', hashlib.sha256).hexdigest()
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or HTTPStatus(status).phrase)
+        self.status = status
+
+class IngestServer:
+    """Serveur HTTP/1.1 minimal (asyncio) devant DatabaseManager
+    
+    La boucle asyncio ne fait que les entrées/sorties : décompression,
+    décodage JSON et lectures SQLite passent par un pool de threads,
+    les écritures par le GroupCommitWriter. secret : clé des jetons
+    (voir device_token).
+    """
+    
+    MAX_BODY = 32 * 1024 * 1024     # octets, après décompression
+    MAX_ROWS = 50000                # lignes par lot
+    IDLE_TIMEOUT = 30               # secondes sans requête sur une connexion
+    WORKERS = 4
+    WRITE_BATCH = 64                # lots d'appareils par transaction
+    
+    def __init__(self, secret, host='127.0.0.1', port=8765, workers=None):
+        if not secret:
+            raise ValueError('Secret des jetons manquant')
+        self.secret = secret
+        self.host = host
+        self.port = port
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or self.WORKERS, thread_name_prefix='ingest'
+        )
+        self._writer = None
+        self._server = None
+        self.uploads = 0
+        self.rows = 0
+        self.started_at = time.time()
+        self._routes = {
+            ('GET', '/sync/state'): self.sync_state,
+            ('POST', '/sync/transactions'): self.sync_transactions,
+            ('GET', '/api/operators'): self.operators,
+            ('GET', '/api/daily'): self.daily,
+            ('GET', '/api/periods'): self.periods,
+            ('GET', '/api/balances'): self.balances,
+            ('GET', '/api/health'): self.health,
+        }
+    
+    # -------------------------------------------------------------------------
+    # Cycle de vie
+    # -------------------------------------------------------------------------
+    
+    async def start(self):
+        DatabaseManager.init_database()
+        offset = DatabaseManager.pending_utc_offset()
+        if offset is not None:
+            logger.info('Décalage UTC %+d min : reconstruction des journées', offset)
+            await self._run(DatabaseManager.set_utc_offset, offset)
+        self._writer = GroupCommitWriter(
+            DatabaseManager.ingest_transactions, max_batch=self.WRITE_BATCH
+        )
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+    
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+    
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._writer is not None:
+            # Termine les lots en cours avant de fermer la base
+            await asyncio.get_running_loop().run_in_executor(None, self._writer.close)
+        self._executor.shutdown(wait=True)
+        DatabaseManager.close()
+    
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}'
+    
+    def _run(self, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+    
+    # -------------------------------------------------------------------------
+    # HTTP
+    # -------------------------------------------------------------------------
+    
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), self.IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not line:
+                    break
+                method, target, version = line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                
+                length = int(headers.get('content-length', 0))
+                try:
+                    self._authorize_upload(method, target, headers)
+                except HTTPError as e:
+                    # Corps non lu : la connexion ne peut pas resservir
+                    await self._reply(writer, e.status, {'error': str(e)}, False)
+                    break
+                if length > self.MAX_BODY:
+                    await self._reply(writer, 413, {'error': 'Corps trop volumineux'}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                
+                keep_alive = (version == 'HTTP/1.1'
+                              and headers.get('connection', '').lower() != 'close')
+                status, payload = await self._dispatch(method, target, headers, body)
+                await self._reply(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass  # Client parti ou requête illisible : on ferme
+        finally:
+            writer.close()
+    
+    async def _dispatch(self, method, target, headers, body):
+        url = urlsplit(target)
+        path, argument = url.path.rstrip('/'), None
+        if path.startswith('/api/balances/'):
+            path, argument = '/api/balances', unquote(path[len('/api/balances/'):])
+        handler = self._routes.get((method, path))
+        if handler is None:
+            allowed = [m for m, p in self._routes if p == path]
+            status = 405 if allowed else 404
+            return status, {'error': HTTPStatus(status).phrase}
+        
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if argument is not None:
+                query['agent'] = argument
+            return 200, await handler(query, headers, body)
+        except HTTPError as e:
+            return e.status, {'error': str(e)}
+        except Exception:
+            logger.exception('%s %s', method, target)
+            return 500, {'error': 'Erreur interne'}
+    
+    @staticmethod
+    async def _reply(writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode()
+        head = (
+            f'HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n'
+            f'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'
+        )
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+    
+    @staticmethod
+    def _check_token(headers, expected):
+        scheme, _, token = headers.get('authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(token.strip(), expected):
+            raise HTTPError(401, 'Jeton invalide')
+    
+    def _authorize_device(self, headers, device):
+        self._check_token(headers, device_token(self.secret, device))
+    
+    def _authorize_admin(self, headers):
+        self._check_token(headers, admin_token(self.secret))
+    
+    def _query_device(self, query, headers):
+        """device_id de l'URL, authentifié ; sans « / » : il préfixe les
+        comptes centraux des agents (DatabaseManager.central_username)"""
+        device = query.get('device_id')
+        if not device:
+            raise HTTPError(400, 'device_id manquant')
+        if '/' in device:
+            raise HTTPError(400, 'device_id invalide')
+        self._authorize_device(headers, device)
+        return device
+    
+    def _authorize_upload(self, method, target, headers):
+        """Envoi d'un lot : jeton vérifié avant la lecture du corps"""
+        url = urlsplit(target)
+        if method != 'POST' or url.path.rstrip('/') != '/sync/transactions':
+            return
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        self._query_device(query, headers)
+    
+    # -------------------------------------------------------------------------
+    # Synchronisation
+    # -------------------------------------------------------------------------
+    
+    async def sync_state(self, query, headers, body):
+        device = self._query_device(query, headers)
+        return {'device_id': device, 'last_seq': await self._run(DatabaseManager.device_last_seq, device)}
+    
+    @staticmethod
+    def _timestamp(value):
+        """Epoch UTC ; texte 'AAAA-MM-JJ HH:MM:SS' des appareils pas encore
+        mis à jour"""
+        if isinstance(value, str):
+            return DatabaseManager.parse_utc(value)
+        return int(value)
+    
+    def _decompress(self, body):
+        """gzip, par morceaux : une bombe de décompression s'arrête à
+        MAX_BODY octets au lieu de remplir la mémoire"""
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        data = inflater.decompress(body, self.MAX_BODY + 1)
+        if len(data) > self.MAX_BODY or inflater.unconsumed_tail:
+            raise HTTPError(413)
+        if not inflater.eof:
+            raise ValueError('gzip tronqué')
+        return data
+    
+    def _parse_upload(self, headers, body):
+        """Corps d'un POST /sync/transactions -> (device_id, rows)"""
+        try:
+            if headers.get('content-encoding') == 'gzip':
+                body = self._decompress(body)
+            if len(body) > self.MAX_BODY:
+                raise HTTPError(413)
+            payload = json.loads(body)
+            device = str(payload['device_id'])
+            columns = list(payload['columns'])
+            rows = payload['rows']
+            seq, ts, agent, op, kind, amount = (columns.index(name) for name in SYNC_COLUMNS)
+            if len(rows) > self.MAX_ROWS:
+                raise HTTPError(413, f'Plus de {self.MAX_ROWS} lignes')
+            rows = [
+                (int(row[seq]), self._timestamp(row[ts]), row[agent], str(row[op]),
+                 str(row[kind]), DatabaseManager.round_xof(row[amount]))
+                for row in rows
+            ]
+        except HTTPError:
+            raise
+        except (OSError, EOFError, zlib.error, ValueError, KeyError, TypeError, IndexError) as e:
+            raise HTTPError(400, f'Lot invalide : {e}') from e
+        if not device:
+            raise HTTPError(400, 'device_id manquant')
+        return device, rows
+    
+    async def sync_transactions(self, query, headers, body):
+        device = self._query_device(query, headers)
+        uploaded, rows = await self._run(self._parse_upload, headers, body)
+        if uploaded != device:
+            raise HTTPError(403, "device_id du lot différent de celui de l'URL")
+        accepted, duplicates, last_seq = await asyncio.wrap_future(
+            self._writer.submit((device, rows))
+        )
+        self.uploads += 1
+        self.rows += accepted
+        return {'last_seq': last_seq, 'accepted': accepted, 'duplicates': duplicates}
+    
+    # -------------------------------------------------------------------------
+    # Consultation
+    # -------------------------------------------------------------------------
+    
+    async def operators(self, query, headers, body):
+        self._authorize_admin(headers)
+        rows = await self._run(DatabaseManager.get_operator_summary)
+        return [
+            {'operator': operator, 'type': kind, 'total': total, 'count': count}
+            for operator, kind, total, count in rows
+        ]
+    
+    async def daily(self, query, headers, body):
+        self._authorize_admin(headers)
+        try:
+            days = int(query.get('days', 7))
+        except ValueError:
+            raise HTTPError(400, 'days doit être un entier')
+        rows = await self._run(DatabaseManager.get_daily_summary, days)
+        return [
+            {'date': day, 'operator': operator, 'type': kind, 'total': total, 'count': count}
+            for day, operator, kind, total, count in rows
+        ]
+    
+    async def periods(self, query, headers, body):
+        self._authorize_admin(headers)
+        try:
+            start, end = (
+                date.fromisoformat(query[name]) if query.get(name) else None
+                for name in ('start', 'end')
+            )
+            points = int(query.get('points', 60))
+        except ValueError:
+            raise HTTPError(400, 'start/end : AAAA-MM-JJ, points : entier')
+        resolution = query.get('resolution')
+        if resolution is not None and resolution not in DatabaseManager.RESOLUTIONS:
+            raise HTTPError(400, f'resolution : {", ".join(DatabaseManager.RESOLUTIONS)}')
+        summary = await self._run(
+            DatabaseManager.get_period_summary, start, end, max(1, points), resolution
+        )
+        return {
+            'resolution': summary['resolution'],
+            'periods': [key for key, _ in summary['periods']],
+            'rows': [
+                {'period': period, 'operator': operator, 'type': kind,
+                 'total': total, 'count': count}
+                for period, operator, kind, total, count in summary['rows']
+            ],
+        }
+    
+    async def balances(self, query, headers, body):
+        self._authorize_admin(headers)
+        agent = query.get('agent')
+        if agent is None:
+            rows = await self._run(DatabaseManager.get_agent_balances)
+            return [
+                {'agent': username, 'deposits': deposits, 'withdrawals': withdrawals,
+                 'balance': balance, 'count': count, 'last_tx_at': last_tx_at}
+                for username, deposits, withdrawals, balance, count, last_tx_at in rows
+            ]
+        
+        def lookup():
+            with DatabaseManager.connection() as conn:
+                row = conn.execute(
+                    "SELECT id FROM users WHERE username=?", (agent,)
+                ).fetchone()
+            return row and DatabaseManager.get_agent_balance(row[0])
+        
+        balance = await self._run(lookup)
+        if balance is None:
+            raise HTTPError(404, f'Agent inconnu : {agent}')
+        return dict(balance, agent=agent)
+    
+    async def health(self, query, headers, body):
+        return {
+            'status': 'ok',
+            'uploads': self.uploads,
+            'rows': self.rows,
+            'uptime_s': round(time.time() - self.started_at),
+            'data_version': DatabaseManager.data_version,
+        }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db', default='central.db', help='Base SQLite centrale')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=IngestServer.WORKERS,
+                        help='Threads de décodage et de lecture')
+    parser.add_argument('--utc-offset', type=int, default=0, metavar='MINUTES',
+                        help='Décalage des journées sur UTC (défaut : 0)')
+    parser.add_argument('--print-token', metavar='DEVICE_ID',
+                        help="Affiche le jeton d'un appareil et quitte")
+    parser.add_argument('--print-admin-token', action='store_true',
+                        help="Affiche le jeton de l'API de consultation et quitte")
+    args = parser.parse_args(argv)
+    
+    secret = os.environ.get('MM_SERVER_SECRET')
+    if not secret:
+        parser.error('MM_SERVER_SECRET (clé des jetons) doit être défini')
+    if args.print_token:
+        if '/' in args.print_token:
+            parser.error('device_id ne doit pas contenir « / »')
+        print(device_token(secret, args.print_token))
+        return 0
+    if args.print_admin_token:
+        print(admin_token(secret))
+        return 0
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    DatabaseManager.DB_NAME = args.db
+    DatabaseManager.UTC_OFFSET_MINUTES = args.utc_offset
+    
+    async def serve():
+        server = await IngestServer(secret, args.host, args.port, args.workers).start()
+        logger.info('Serveur central sur %s (base %s)', server.url, args.db)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.stop()
+    
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
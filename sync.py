@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synchronisation différée des transactions vers le siège
+
+L'identifiant AUTOINCREMENT de `transactions` sert de séquence propre à
+l'appareil (strictement croissante, jamais réutilisée). Seules les lignes
+au-delà du dernier point de reprise acquitté par le serveur sont envoyées,
+par lots JSON compressés (gzip) : des semaines de saisie hors ligne
+partent en quelques requêtes, même sur une liaison 2G.
+
+Protocole (voir LocalSyncServer) :
+    
+    GET  /sync/state?device_id=...   -> {"last_seq": n}
+    POST /sync/transactions?device_id=... (gzip)
+                                     -> {"last_seq": n, "accepted": k, "duplicates": d}
+
+Le serveur déduplique sur (device_id, seq) : renvoyer un lot déjà reçu
+(coupure réseau avant l'acquittement) est sans effet. Chaque requête
+porte le jeton de l'appareil (« Authorization: Bearer », réglage
+'sync_token', remis par le siège : voir server.py).
+    
+    python sync.py serve --port 8765
+    python sync.py push http://127.0.0.1:8765 --db mobile_money.db --token ...
+"""
+
+import argparse
+import gzip
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from database import DatabaseManager
+
+# Colonnes envoyées, dans l'ordre des lignes du lot (timestamp : epoch UTC)
+COLUMNS = ('seq', 'timestamp', 'agent', 'operator', 'type', 'amount')
+
+class SyncError(Exception):
+    """Échec de synchronisation après toutes les tentatives"""
+
+class SyncClient:
+    """Envoi des transactions non synchronisées, avec reprise et backoff
+    
+    Le point de reprise (dernier seq acquitté) est enregistré dans la
+    table settings après chaque lot : hors ligne, il donne le nombre de
+    lignes en attente. Au début de chaque passage, l'état du serveur fait
+    foi : une synchronisation interrompue (ou un acquittement perdu)
+    reprend exactement après la dernière ligne reçue.
+    """
+    
+    BATCH_SIZE = 5000
+    TIMEOUT = 60
+    MAX_ATTEMPTS = 5
+    BACKOFF_BASE = 2.0      # secondes, doublé à chaque échec
+    BACKOFF_MAX = 120.0
+    
+    def __init__(self, url, token=None, batch_size=None, timeout=None, max_attempts=None,
+                 sleep=time.sleep):
+        self.url = url.rstrip('/')
+        self.token = token
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.timeout = timeout or self.TIMEOUT
+        self.max_attempts = max_attempts or self.MAX_ATTEMPTS
+        self._sleep = sleep
+    
+    # -------------------------------------------------------------------------
+    # État local
+    # -------------------------------------------------------------------------
+    
+    @staticmethod
+    def device_id():
+        """Identifiant de l'appareil, créé au premier appel"""
+        device = DatabaseManager.get_setting('device_id')
+        if device is None:
+            device = uuid.uuid4().hex
+            DatabaseManager.set_setting('device_id', device)
+        return device
+    
+    @staticmethod
+    def checkpoint():
+        return int(DatabaseManager.get_setting('sync_last_seq', 0))
+    
+    @staticmethod
+    def _save_checkpoint(seq):
+        DatabaseManager.set_setting('sync_last_seq', seq)
+        DatabaseManager.set_setting(
+            'sync_last_at', time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        )
+    
+    @staticmethod
+    def pending_count(after=None):
+        after = SyncClient.checkpoint() if after is None else after
+        with DatabaseManager.connection() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM transactions WHERE id > ?", (after,)
+            ).fetchone()[0]
+    
+    def _read_batch(self, after):
+        with DatabaseManager.connection() as conn:
+            return conn.execute('''
+                SELECT t.id, t.timestamp, u.username, o.name, y.name, t.amount
+                FROM transactions t
+                LEFT JOIN users u ON t.agent_id = u.id
+                JOIN operators o ON o.id = t.operator_id
+                JOIN tx_types y ON y.id = t.type_id
+                WHERE t.id > ?
+                ORDER BY t.id
+                LIMIT ?
+            ''', (after, self.batch_size)).fetchall()
+    
+    # -------------------------------------------------------------------------
+    # HTTP
+    # -------------------------------------------------------------------------
+    
+    def _request(self, method, path, payload=None, cancel_event=None):
+        """Requête JSON ; retente les erreurs réseau et 5xx avec backoff
+        
+        cancel_event est vérifié avant chaque tentative : une annulation
+        n'attend pas la fin des nouvelles tentatives."""
+        data = None
+        headers = {'Accept': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        if payload is not None:
+            data = gzip.compress(
+                json.dumps(payload, separators=(',', ':')).encode(), compresslevel=6
+            )
+            headers['Content-Type'] = 'application/json'
+            headers['Content-Encoding'] = 'gzip'
+        
+        for attempt in range(1, self.max_attempts + 1):
+            if cancel_event is not None and cancel_event.is_set():
+                raise SyncError(f'{path}: annulée')
+            request = urllib.request.Request(
+                self.url + path, data=data, headers=headers, method=method
+            )
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    return json.loads(response.read().decode())
+            except urllib.error.HTTPError as e:
+                # 4xx : requête refusée, inutile d'insister
+                if e.code < 500:
+                    raise SyncError(f'HTTP {e.code} sur {path}') from e
+                error = e
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                error = e
+            
+            if attempt < self.max_attempts:
+                delay = min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2 ** (attempt - 1))
+                self._sleep(delay * random.uniform(0.5, 1.0))
+        raise SyncError(f'{path}: {error}')
+    
+    def server_state(self, device, cancel_event=None):
+        query = urllib.parse.urlencode({'device_id': device})
+        return self._request('GET', f'/sync/state?{query}', cancel_event=cancel_event)
+    
+    # -------------------------------------------------------------------------
+    # Synchronisation
+    # -------------------------------------------------------------------------
+    
+    def run(self, cancel_event=None, progress=None):
+        """Envoie tout l'arriéré ; retourne un résumé (sent, batches, last_seq)"""
+        device = self.device_id()
+        # device_id aussi dans l'URL : le serveur vérifie le jeton avant le corps
+        upload = '/sync/transactions?' + urllib.parse.urlencode({'device_id': device})
+        last_seq = int(self.server_state(device, cancel_event).get('last_seq', 0))
+        total = self.pending_count(last_seq)
+        sent = batches = 0
+        
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            rows = self._read_batch(last_seq)
+            if not rows:
+                break
+            result = self._request('POST', upload, {
+                'device_id': device,
+                'columns': COLUMNS,
+                'rows': rows,
+            }, cancel_event)
+            acked = int(result['last_seq'])
+            if acked < rows[-1][0]:
+                raise SyncError(f'Acquittement incomplet ({acked} < {rows[-1][0]})')
+            last_seq = acked
+            self._save_checkpoint(last_seq)
+            sent += len(rows)
+            batches += 1
+            if progress:
+                progress(sent, total)
+        
+        return {'sent': sent, 'batches': batches, 'last_seq': last_seq}
+
+# =============================================================================
+# SERVEUR LOCAL DE SUBSTITUTION (essais, développement)
+# =============================================================================
+
+class LocalSyncServer:
+    """Serveur HTTP minimal qui implémente le protocole de synchronisation
+    
+    Les lignes reçues sont gardées en mémoire, dédupliquées sur
+    (device_id, seq). fail_requests fait échouer les N prochaines
+    requêtes (503) pour simuler un réseau instable.
+    """
+    
+    def __init__(self, host='127.0.0.1', port=0):
+        self.rows = {}
+        self.requests = 0
+        self.fail_requests = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+    
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+    
+    def last_seq(self, device):
+        with self._lock:
+            return max((seq for d, seq in self.rows if d == device), default=0)
+    
+    def store(self, device, columns, rows):
+        index = list(columns).index('seq')
+        accepted = duplicates = 0
+        with self._lock:
+            for row in rows:
+                key = (device, row[index])
+                if key in self.rows:
+                    duplicates += 1
+                else:
+                    self.rows[key] = dict(zip(columns, row))
+                    accepted += 1
+        return accepted, duplicates
+    
+    def _handler(self):
+        server = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+            
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def _failing(self):
+                with server._lock:
+                    server.requests += 1
+                    if server.fail_requests > 0:
+                        server.fail_requests -= 1
+                        return True
+                return False
+            
+            def do_GET(self):
+                if self._failing():
+                    return self._reply(503, {'error': 'indisponible'})
+                url = urllib.parse.urlparse(self.path)
+                if url.path != '/sync/state':
+                    return self._reply(404, {'error': 'inconnu'})
+                device = urllib.parse.parse_qs(url.query).get('device_id', [''])[0]
+                self._reply(200, {'device_id': device, 'last_seq': server.last_seq(device)})
+            
+            def do_POST(self):
+                if self._failing():
+                    return self._reply(503, {'error': 'indisponible'})
+                if urllib.parse.urlparse(self.path).path != '/sync/transactions':
+                    return self._reply(404, {'error': 'inconnu'})
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if self.headers.get('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(body)
+                try:
+                    payload = json.loads(body)
+                    device = payload['device_id']
+                    accepted, duplicates = server.store(device, payload['columns'], payload['rows'])
+                except (ValueError, KeyError) as e:
+                    return self._reply(400, {'error': str(e)})
+                self._reply(200, {
+                    'last_seq': server.last_seq(device),
+                    'accepted': accepted,
+                    'duplicates': duplicates,
+                })
+        
+        return Handler
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+    
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    serve = commands.add_parser('serve', help='Serveur local de substitution')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    
+    push = commands.add_parser('push', help='Synchroniser une base')
+    push.add_argument('url')
+    push.add_argument('--db', default=DatabaseManager.DB_NAME)
+    push.add_argument('--token', help="Jeton de l'appareil (défaut : réglage sync_token)")
+    push.add_argument('--batch-size', type=int)
+    
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        server = LocalSyncServer(args.host, args.port)
+        print(f'Serveur de synchronisation sur {server.url}', file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+    
+    DatabaseManager.DB_NAME = args.db
+    DatabaseManager.init_database()
+    try:
+        token = args.token or DatabaseManager.get_setting('sync_token')
+        result = SyncClient(args.url, token, batch_size=args.batch_size).run(
+            progress=lambda sent, total: print(f'\r{sent:,} / {total:,}', end='', file=sys.stderr)
+        )
+    except SyncError as e:
+        print(f'\nÉchec : {e}', file=sys.stderr)
+        return 1
+    finally:
+        DatabaseManager.close()
+    print(f"\n{result['sent']:,} lignes en {result['batches']} lot(s), seq {result['last_seq']}",
+          file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
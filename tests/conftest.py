@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Base vide, journées en UTC"""
+    monkeypatch.setattr(DatabaseManager, 'DB_NAME', str(tmp_path / 'test.db'))
+    monkeypatch.setattr(DatabaseManager, 'UTC_OFFSET_MINUTES', 0)
+    DatabaseManager.init_database()
+    yield DatabaseManager
+    DatabaseManager.close()
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+
+import pytest
+
+from database import DatabaseManager
+
+
+@pytest.mark.parametrize('amount', [250.5, 1000.25, 0.5, float('inf'), float('nan')])
+def test_fractional_amounts_are_rejected(db, amount):
+    db.add_user('ali', 'pass', 'agent')
+    with pytest.raises(ValueError):
+        db.record_transaction(2, 'Wave', 'Dépôt', amount)
+    with pytest.raises(ValueError):
+        db.record_transactions([(2, 'Wave', 'Dépôt', amount, db._now())])
+    assert db.get_all_transactions() == []
+
+
+def test_integral_amounts_are_stored_as_int(db):
+    db.add_user('ali', 'pass', 'agent')
+    db.record_transaction(2, 'Wave', 'Dépôt', 1500.0)
+    amount = db.get_all_transactions()[0][2]
+    assert amount == 1500 and isinstance(amount, int)
+
+
+@pytest.mark.parametrize('amount, expected', [(250.5, 251), (1000.5, 1001), (1000.49, 1000), (7, 7)])
+def test_round_xof_matches_migration(amount, expected):
+    assert DatabaseManager.round_xof(amount) == expected
+    conn = sqlite3.connect(':memory:')
+    conn.create_function('round_xof', 1, DatabaseManager.round_xof, deterministic=True)
+    assert conn.execute('SELECT round_xof(?)', (amount,)).fetchone()[0] == expected
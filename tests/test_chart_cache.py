@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+os.environ.setdefault('KIVY_GL_BACKEND', 'mock')
+main = pytest.importorskip('main')
+
+
+def test_relative_period_misses_after_midnight(db, monkeypatch):
+    cache = main.ChartCache()
+    key = cache.key('periods', (('days', 7),))
+    cache.put(key, {'kind': 'bar'})
+    assert cache.get(cache.key('periods', (('days', 7),))) is not None
+    
+    now = db._now()
+    monkeypatch.setattr(db, '_now', staticmethod(lambda: now + 86400))
+    assert cache.get(cache.key('periods', (('days', 7),))) is None
+
+
+def test_utc_offset_change_misses(db, monkeypatch):
+    cache = main.ChartCache()
+    cache.put(cache.key('operators'), {'kind': 'pie'})
+    monkeypatch.setattr(db, '_utc_offset', 3600)
+    assert cache.get(cache.key('operators')) is None
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+from database import TransactionImporter
+
+
+@pytest.mark.parametrize('text', ['31/02/2026', '30/02/2026', '2026-02-30', '2026-04-31 10:00'])
+def test_impossible_dates_are_rejected(db, text):
+    with pytest.raises(ValueError):
+        TransactionImporter('x.csv')._parse_timestamp(text)
+
+
+def test_valid_dates(db):
+    importer = TransactionImporter('x.csv')
+    assert db.local_day(importer._parse_timestamp('29/02/2024 23:59')) == '2024-02-29'
+    assert db.local_day(importer._parse_timestamp('2026-03-01')) == '2026-03-01'
+
+
+def test_impossible_date_rows_are_counted_as_rejected(db, tmp_path):
+    db.add_user('ali', 'pass', 'agent')
+    path = tmp_path / 'releve.csv'
+    path.write_text(
+        'agent,operateur,type,montant,date\n'
+        'ali,Wave,Dépôt,1000,28/02/2026 10:00\n'
+        'ali,Wave,Dépôt,2000,31/02/2026 10:00\n'
+        'ali,Wave,Retrait,3000,30/02/2026\n',
+        encoding='utf-8'
+    )
+    result = TransactionImporter(str(path)).run()
+    assert (result['imported'], result['rejected']) == (1, 2)
+    assert [row[0] for row in db.get_daily_summary(100000)] == ['2026-02-28']
+
+
+def test_cancel_and_progress_do_not_wait_for_a_full_batch(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(TransactionImporter, 'CHECK_EVERY', 10)
+    db.add_user('ali', 'pass', 'agent')
+    path = tmp_path / 'releve.csv'
+    lines = ['agent,operateur,type,montant,date']
+    # Surtout des lignes rejetées, dont un montant infini
+    lines += ['ali,Wave,Dépôt,1e400,01/03/2026' if i % 10 == 0 else 'ali,Inconnu,Dépôt,1000,'
+              for i in range(100)]
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    
+    cancel = threading.Event()
+    reports = []
+    
+    def progress(fraction, imported, rejected):
+        reports.append(rejected)
+        if rejected >= 20:
+            cancel.set()
+    
+    result = TransactionImporter(str(path), progress=progress, cancel_event=cancel).run()
+    assert result['cancelled'] and result['imported'] == 0
+    assert reports[0] < 100 and result['rejected'] < 100
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+from database import DatabaseManager
+
+
+def test_unknown_user_costs_a_full_verification(db, monkeypatch):
+    db.add_user('ali', 'pass', 'agent')
+    verified = []
+    verify = DatabaseManager.verify_password.__func__
+    
+    def spy(cls, password, stored):
+        verified.append(int(stored.split('$')[1]))
+        return verify(cls, password, stored)
+    
+    monkeypatch.setattr(DatabaseManager, 'verify_password', classmethod(spy))
+    assert db.get_user('inconnu', 'pass') is None
+    assert db.get_user('ali', 'mauvais') is None
+    assert verified == [db.password_iterations()] * 2
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+
+def test_reversed_bounds_give_an_empty_summary(db):
+    summary = db.get_period_summary(date(2026, 3, 1), date(2026, 2, 1))
+    assert summary['periods'] == [] and summary['rows'] == []
+
+
+def test_future_dated_rows_only(db):
+    db.add_user('ali', 'pass', 'agent')
+    db.record_transactions([(2, 'Wave', 'Dépôt', 1000, db._now() + 10 * 86400)])
+    summary = db.get_period_summary()
+    assert summary['periods'] == [] and summary['rows'] == []
+
+
+def test_year_reads_pre_aggregated_rows(db):
+    db.add_user('ali', 'pass', 'agent')
+    now = db._now()
+    db.record_transactions([
+        (2, 'Wave', 'Dépôt', 1000, now - day * 86400) for day in range(0, 365, 3)
+    ])
+    today = db.local_today()
+    summary = db.get_period_summary(today - timedelta(days=364), today, max_points=20)
+    assert summary['resolution'] == 'month'
+    assert len(summary['rows']) <= 13
+    assert sum(row[3] for row in summary['rows']) == 1000 * len(range(0, 365, 3))
+
+
+@pytest.mark.parametrize('resolution', ['day', 'week', 'month', 'year'])
+def test_bars_stop_at_the_window_like_the_pie(db, resolution):
+    db.add_user('ali', 'pass', 'agent')
+    db.record_transactions([
+        (2, 'Wave' if day % 2 else 'Orange Money', 'Dépôt', 1000 + day,
+         db.local_epoch(2025, 1, 1) + day * 86400)
+        for day in range(0, 800, 2)
+    ])
+    # Mercredi 12 mars 2025 .. samedi 18 avril 2026 : périodes partielles
+    # aux deux bouts, quelle que soit la résolution
+    start, end = date(2025, 3, 12), date(2026, 4, 18)
+    pie = db.get_period_summary(start, end, resolution='day')
+    bars = db.get_period_summary(start, end, resolution=resolution)
+    assert sum(row[3] for row in bars['rows']) == sum(row[3] for row in pie['rows'])
+    assert sum(row[4] for row in bars['rows']) == sum(row[4] for row in pie['rows'])
+    assert {row[0] for row in bars['rows']} <= {key for key, _ in bars['periods']}
+    assert bars['periods'][0][1] == start
+
+
+def test_per_agent_daily_totals(db):
+    db.add_user('ali', 'pass', 'agent')
+    db.add_user('awa', 'pass', 'agent')
+    now = db._now()
+    db.record_transactions([
+        (2, 'Wave', 'Dépôt', 1000, now),
+        (3, 'Wave', 'Dépôt', 700, now),
+        (3, 'Wave', 'Dépôt', 300, now - 86400),
+        (None, 'Wave', 'Dépôt', 50, now),
+    ])
+    today = db.local_day(now)
+    assert db.get_daily_summary(7, agent_id=3) == [
+        (today, 'Wave', 'Dépôt', 700, 1), (db.local_day(now - 86400), 'Wave', 'Dépôt', 300, 1)
+    ]
+    assert db.get_daily_summary(0) == [(today, 'Wave', 'Dépôt', 1750, 3)]
+    summary = db.get_period_summary(resolution='year', agent_id=2)
+    assert [row[3] for row in summary['rows']] == [1000]
+
+
+def test_rollup_without_agent_dimension_is_rebuilt(db):
+    db.add_user('ali', 'pass', 'agent')
+    db.record_transactions([(2, 'Wave', 'Dépôt', 1000, db._now())])
+    db.close()
+    with sqlite3.connect(db.DB_NAME) as conn:
+        conn.executescript('''
+            DROP TABLE period_rollup;
+            CREATE TABLE period_rollup (
+                resolution TEXT NOT NULL, period TEXT NOT NULL,
+                operator_id INTEGER NOT NULL, type_id INTEGER NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0, count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (resolution, period, operator_id, type_id)
+            ) WITHOUT ROWID;
+            DELETE FROM schema_version WHERE version = 10;
+        ''')
+    db.init_database()
+    assert db.get_daily_summary(0, agent_id=2)[0][3:] == (1000, 1)
+
+
+def test_sql_grouping_matches_the_detailed_rows(db):
+    db.add_user('ali', 'pass', 'agent')
+    now = db._now()
+    db.record_transactions([
+        (2, operator, trans_type, 100 * (i + 1), now - i * 86400)
+        for i, (operator, trans_type) in enumerate(
+            [('Wave', 'Dépôt'), ('Orange Money', 'Dépôt'), ('Wave', 'Retrait')] * 10)
+    ])
+    today = db.local_today()
+    start = today - timedelta(days=20)
+    detailed = db.get_period_summary(start, today, resolution='week')
+    grouped = db.get_period_summary(start, today, resolution='week', by_operator=False)
+    expected = {}
+    for period, _operator, trans_type, total, count in detailed['rows']:
+        previous = expected.get((period, trans_type), (0, 0))
+        expected[period, trans_type] = (previous[0] + total, previous[1] + count)
+    assert {row[:2]: row[2:] for row in grouped['rows']} == expected
+    
+    pie = db.get_operator_summary(start, today, by_type=False)
+    assert [operator for operator, _, _ in pie] == ['Orange Money', 'Wave']
+    assert sum(total for _, total, _ in pie) == sum(total for total, _ in expected.values())
+    assert db.get_operator_summary(by_type=False) == [('Orange Money', 15500, 10), ('Wave', 31000, 20)]
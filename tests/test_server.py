@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import gzip
+import json
+
+import pytest
+
+from server import HTTPError, IngestServer, admin_token, device_token
+
+
+@pytest.fixture
+def server():
+    server = IngestServer('secret', workers=1)
+    yield server
+    server._executor.shutdown()
+
+
+def test_gzip_bomb_is_refused(server, monkeypatch):
+    monkeypatch.setattr(IngestServer, 'MAX_BODY', 1024 * 1024)
+    bomb = gzip.compress(b'0' * (64 * 1024 * 1024))
+    assert len(bomb) < 100 * 1024
+    with pytest.raises(HTTPError) as error:
+        server._parse_upload({'content-encoding': 'gzip'}, bomb)
+    assert error.value.status == 413
+
+
+def test_gzip_upload(server):
+    body = gzip.compress(json.dumps({
+        'device_id': 'd1',
+        'columns': ['seq', 'timestamp', 'agent', 'operator', 'type', 'amount'],
+        'rows': [[1, 1760000000, 'ali', 'Wave', 'Dépôt', 1000]],
+    }).encode())
+    device, rows = server._parse_upload({'content-encoding': 'gzip'}, body)
+    assert device == 'd1' and rows[0][:2] == (1, 1760000000)
+
+
+def test_truncated_gzip_is_rejected(server):
+    with pytest.raises(HTTPError) as error:
+        server._parse_upload({'content-encoding': 'gzip'}, gzip.compress(b'{}' * 1000)[:-12])
+    assert error.value.status == 400
+
+
+def test_device_token_only_covers_its_device(server):
+    headers = {'authorization': f"Bearer {device_token('secret', 'd1')}"}
+    server._authorize_device(headers, 'd1')
+    for device in ('d2', 'admin'):
+        with pytest.raises(HTTPError):
+            server._authorize_device(headers, device)
+    with pytest.raises(HTTPError):
+        server._authorize_admin(headers)
+    server._authorize_admin({'authorization': f"Bearer {admin_token('secret')}"})
+    with pytest.raises(HTTPError):
+        server._authorize_device({}, 'd1')
+
+
+def test_upload_is_authorized_before_the_body_is_read(server, monkeypatch):
+    def parse(*args):
+        raise AssertionError('corps décodé sans jeton valide')
+    monkeypatch.setattr(server, '_parse_upload', parse)
+    bad = {'authorization': f"Bearer {device_token('secret', 'd2')}"}
+    for target in ('/sync/transactions', '/sync/transactions?device_id=d1'):
+        with pytest.raises(HTTPError) as error:
+            server._authorize_upload('POST', target, bad)
+        assert error.value.status in (400, 401)
+    status, _ = asyncio.run(server._dispatch('POST', '/sync/transactions?device_id=d1', bad, b'x'))
+    assert status == 401
+    server._authorize_upload('GET', '/api/health', {})
+
+
+def test_upload_for_another_device_is_refused(server):
+    headers = {'authorization': f"Bearer {device_token('secret', 'd1')}"}
+    body = json.dumps({
+        'device_id': 'd2',
+        'columns': ['seq', 'timestamp', 'agent', 'operator', 'type', 'amount'],
+        'rows': [],
+    }).encode()
+    status, _ = asyncio.run(server._dispatch('POST', '/sync/transactions?device_id=d1', headers, body))
+    assert status == 403
+
+
+def test_same_username_on_two_devices_stays_distinct(db):
+    row = (1, 1760000000, 'admin', 'Wave', 'Dépôt', 1000)
+    db.ingest_transactions([('d1', [row]), ('d2', [row[:5] + (2500,)])])
+    balances = {name: balance for name, _, _, balance, _, _ in db.get_agent_balances()}
+    assert balances == {'d1/admin': 1000, 'd2/admin': 2500}
+    assert db.get_user('admin', 'admin123')[1] == 'admin'
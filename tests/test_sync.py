@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import pytest
+
+from sync import COLUMNS, LocalSyncServer, SyncClient, SyncError
+
+
+@pytest.fixture
+def server():
+    server = LocalSyncServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def ledger(db):
+    db.add_user('ali', 'pass', 'agent')
+    db.record_transactions([(2, 'Wave', 'Dépôt', 1000 + i, 1760000000 + i) for i in range(25)])
+    return db
+
+
+def client(server, delays=None, **options):
+    sleep = delays.append if delays is not None else (lambda delay: None)
+    return SyncClient(server.url, batch_size=10, sleep=sleep, **options)
+
+
+def test_backlog_is_sent_in_batches(ledger, server):
+    progress = []
+    result = client(server).run(progress=lambda sent, total: progress.append((sent, total)))
+    assert result == {'sent': 25, 'batches': 3, 'last_seq': 25}
+    assert progress == [(10, 25), (20, 25), (25, 25)]
+    assert len(server.rows) == 25
+    assert SyncClient.checkpoint() == 25 and SyncClient.pending_count() == 0
+
+
+def test_unavailable_server_is_retried_with_backoff(ledger, server):
+    server.fail_requests = 3
+    delays = []
+    result = client(server, delays).run()
+    assert result['sent'] == 25 and len(server.rows) == 25
+    # Délais doublés à chaque échec, avec une part aléatoire
+    assert len(delays) == 3
+    for attempt, delay in enumerate(delays):
+        assert SyncClient.BACKOFF_BASE * 2 ** attempt / 2 <= delay <= SyncClient.BACKOFF_BASE * 2 ** attempt
+
+
+def test_gives_up_after_max_attempts(ledger, server):
+    server.fail_requests = 10
+    delays = []
+    with pytest.raises(SyncError):
+        client(server, delays, max_attempts=3).run()
+    assert len(delays) == 2 and not server.rows
+    assert SyncClient.checkpoint() == 0
+
+
+def test_interrupted_run_resumes_from_the_server_state(ledger, server):
+    cancel = threading.Event()
+    result = client(server).run(cancel_event=cancel,
+                                progress=lambda sent, total: cancel.set())
+    assert result == {'sent': 10, 'batches': 1, 'last_seq': 10}
+    assert SyncClient.checkpoint() == 10
+
+    # Point de reprise local perdu : l'état du serveur fait foi
+    ledger.set_setting('sync_last_seq', 0)
+    result = client(server).run()
+    assert result == {'sent': 15, 'batches': 2, 'last_seq': 25}
+    assert sorted(seq for _, seq in server.rows) == list(range(1, 26))
+
+
+def test_lost_acknowledgement_is_resent_as_duplicates(ledger, server):
+    device = SyncClient.device_id()
+    client(server).run()
+    # Acquittement perdu : l'appareil croit le lot non reçu et le renvoie
+    rows = client(server)._read_batch(0)
+    response = client(server)._request('POST', f'/sync/transactions?device_id={device}', {
+        'device_id': device,
+        'columns': COLUMNS,
+        'rows': rows,
+    })
+    assert response == {'last_seq': 25, 'accepted': 0, 'duplicates': 10}
+    assert len(server.rows) == 25
+
+    # Nouvelle ligne : seule elle part au passage suivant
+    ledger.record_transactions([(2, 'Wave', 'Retrait', 500, 1760000100)])
+    assert client(server).run() == {'sent': 1, 'batches': 1, 'last_seq': 26}
+
+
+def test_cancel_stops_the_retries(ledger, server):
+    server.fail_requests = 10
+    cancel = threading.Event()
+    sync = SyncClient(server.url, batch_size=10, sleep=lambda delay: cancel.set())
+    with pytest.raises(SyncError):
+        sync.run(cancel_event=cancel)
+    assert server.requests == 1
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+
+import pytest
+
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+os.environ.setdefault('KIVY_GL_BACKEND', 'mock')
+main = pytest.importorskip('main')
+
+
+def test_shutdown_stops_and_waits_for_running_tasks():
+    runner = main.TaskRunner(max_workers=1)
+    started, cancel, finished = threading.Event(), threading.Event(), []
+
+    def work():
+        started.set()
+        cancel.wait(5)
+        finished.append(cancel.is_set())
+
+    runner.submit(work, cancel_event=cancel)
+    queued = runner.submit(lambda: finished.append('queued'))
+    started.wait(5)
+    assert runner.shutdown(timeout=5)
+    # La tâche en cours a vu cancel_event et fini avant le retour
+    assert finished == [True] and queued.future.cancelled()
+
+
+def test_shutdown_timeout_reports_unfinished_tasks():
+    runner = main.TaskRunner(max_workers=1)
+    release = threading.Event()
+    runner.submit(release.wait, 5)
+    assert not runner.shutdown(timeout=0.05)
+    release.set()
+
+
+def test_failing_callback_is_logged_not_raised():
+    runner = main.TaskRunner(max_workers=1)
+    task = runner.submit(lambda: 42)
+    task.future.result(5)
+
+    def on_success(result):
+        raise RuntimeError('callback')
+
+    runner._deliver(task, on_success, None)
+    runner._deliver(task, None, on_success)
+    runner.shutdown()
+
+
+def test_long_jobs_leave_the_ui_workers_free():
+    release = threading.Event()
+    running = [main.jobs.submit(release.wait, 5) for _ in range(3)]
+    try:
+        assert main.tasks.submit(lambda: 'connexion').future.result(timeout=1) == 'connexion'
+    finally:
+        release.set()
+    for task in running:
+        task.future.result(timeout=5)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+import threading
+import time
+
+from database import DatabaseManager
+
+
+def local_days(db):
+    with sqlite3.connect(db.DB_NAME) as conn:
+        return conn.execute("SELECT local_day FROM transactions ORDER BY id").fetchall()
+
+
+def reopen(db):
+    db.close()
+    db.init_database()
+
+
+def test_offset_is_fixed_at_creation(db, monkeypatch):
+    db.add_user('ali', 'pass', 'agent')
+    # 23:30 UTC
+    db.record_transactions([(2, 'Wave', 'Dépôt', 1000, 1790000000 - 1790000000 % 86400 + 84600)])
+    before = local_days(db)
+    
+    # Nouveau fuseau de l'appareil : rien n'est reconstruit
+    monkeypatch.setattr(DatabaseManager, 'UTC_OFFSET_MINUTES', None)
+    monkeypatch.setattr(DatabaseManager, 'utc_offset_minutes', classmethod(lambda cls: 60))
+    reopen(db)
+    assert db.active_utc_offset() == 0
+    assert db.pending_utc_offset() is None
+    assert local_days(db) == before
+
+
+def test_explicit_offset_is_applied_by_set_utc_offset(db, monkeypatch):
+    db.add_user('ali', 'pass', 'agent')
+    timestamp = 1790000000 - 1790000000 % 86400 + 84600
+    db.record_transactions([(2, 'Wave', 'Dépôt', 1000, timestamp)])
+    day = db.local_day(timestamp)
+    
+    monkeypatch.setattr(DatabaseManager, 'UTC_OFFSET_MINUTES', 60)
+    reopen(db)
+    # init_database ne reconstruit pas : c'est au thread de travail de le faire
+    assert db.pending_utc_offset() == 60
+    assert local_days(db) == [(day,)]
+    
+    steps = []
+    db.set_utc_offset(60, progress=steps.append)
+    assert steps[-1] == 1
+    assert db.pending_utc_offset() is None
+    next_day = db.local_day(timestamp)
+    assert next_day > day and local_days(db) == [(next_day,)]
+    assert [row[0] for row in db.get_daily_summary(100000)] == [next_day]
+    reopen(db)
+    assert db.active_utc_offset() == 60
+
+
+def test_unreadable_legacy_timestamps_are_set_aside(db, monkeypatch, caplog):
+    db.close()
+    monkeypatch.setattr(DatabaseManager, 'DB_NAME', db.DB_NAME + '.v6')
+    monkeypatch.setattr(DatabaseManager, 'SCHEMA_VERSION', 6)
+    db.init_database()
+    db.close()
+    with sqlite3.connect(db.DB_NAME) as conn:
+        conn.executemany(
+            "INSERT INTO transactions (agent_id, operator_id, type_id, amount, timestamp) "
+            "VALUES (1, 1, 1, ?, ?)",
+            [(1000, '2026-03-01 10:00:00'), (2000, 'hier soir'), (3000, '')]
+        )
+    
+    monkeypatch.setattr(DatabaseManager, 'SCHEMA_VERSION', 9)
+    db.init_database()
+    assert 'transactions_unreadable' in caplog.text
+    with sqlite3.connect(db.DB_NAME) as conn:
+        assert conn.execute("SELECT amount, timestamp FROM transactions_unreadable").fetchall() == \
+            [(2000, 'hier soir'), (3000, '')]
+        assert conn.execute("SELECT MIN(timestamp) FROM transactions").fetchone()[0] > 0
+    assert db.get_agent_balance(1)['deposits'] == 1000
+
+
+def test_save_during_rebuild_waits_for_it(db, monkeypatch):
+    db.add_user('ali', 'pass', 'agent')
+    timestamp = 1790000000 - 1790000000 % 86400 + 84600
+    db.record_transactions([(2, 'Wave', 'Dépôt', 1000, timestamp)])
+    # Reconstruction plus longue que busy_timeout
+    monkeypatch.setattr(DatabaseManager, 'STORAGE_PROFILE',
+                        {**DatabaseManager.STORAGE_PROFILE, 'busy_timeout': 50})
+    db.close()
+    started = threading.Event()
+    rebuild = DatabaseManager._rebuild_period_rollup.__func__
+    
+    def slow_rebuild(cls, c):
+        started.set()
+        time.sleep(0.5)
+        rebuild(cls, c)
+    
+    monkeypatch.setattr(DatabaseManager, '_rebuild_period_rollup', classmethod(slow_rebuild))
+    thread = threading.Thread(target=db.set_utc_offset, args=(60,))
+    thread.start()
+    started.wait(5)
+    assert db.rebuilding()
+    db.record_transactions([(2, 'Wave', 'Retrait', 400, timestamp)])
+    thread.join(5)
+    
+    assert not db.rebuilding()
+    assert local_days(db) == [(db.local_day(timestamp),)] * 2
+    assert db.get_agent_balance(2)['balance'] == 600
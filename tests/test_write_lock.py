@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+import threading
+
+
+def test_read_then_write_survives_a_concurrent_commit(db):
+    has_read, other_started = threading.Event(), threading.Event()
+    errors = []
+
+    def other():
+        has_read.wait(5)
+        other_started.set()
+        try:
+            # Attend le verrou d'écriture (busy_timeout) au lieu d'échouer
+            db.set_setting('concurrent', 1)
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=other)
+    thread.start()
+    with db.transaction(write=True) as conn:
+        conn.execute("SELECT COUNT(*) FROM settings").fetchone()
+        has_read.set()
+        other_started.wait(5)
+        thread.join(0.2)  # Laisse l'autre thread tenter son commit
+        conn.execute("INSERT INTO settings (key, value) VALUES ('first', '1')")
+    thread.join(5)
+    assert not errors
+    assert db.get_setting('first') == '1' and db.get_setting('concurrent') == '1'